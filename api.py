@@ -1,9 +1,20 @@
+import json
 import time
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from typing import Any, Dict, List, Optional, Union
-from config import API_BASE, WP_API_TOKEN
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from metrics import API_RESPONSES, API_STALE, api_timed, register_collector
+from resilience import CircuitBreaker, CircuitOpen, LastGood, budget, time_left, stale, stale_like
+from config import (
+    API_BASE, WP_API_TOKEN, WP_DELTA_PARAM, WP_BATCH_PARAM,
+    ENTITY_CACHE_TTL, ENTITY_CACHE_SIZE, API_FANOUT,
+    API_BREAKER_FAILURES, API_BREAKER_RESET,
+)
 
 # Централизованный api_url только здесь
 def api_url(path: str) -> str:
@@ -15,15 +26,103 @@ def _auth_headers() -> Dict[str, str]:
         headers["Authorization"] = f"Bearer {WP_API_TOKEN}"
     return headers
 
+# Ответы API по эндпоинту (первый сегмент пути) и коду; сетевые ошибки — code="error"
+def _endpoint(url: str) -> str:
+    path = url[len(API_BASE):] if url.startswith(API_BASE) else url
+    return path.split("?", 1)[0].strip("/").split("/", 1)[0] or "/"
+
+class _MeteredAdapter(HTTPAdapter):
+    def send(self, request, **kwargs):
+        endpoint = _endpoint(request.url)
+        try:
+            resp = super().send(request, **kwargs)
+        except Exception:
+            API_RESPONSES.inc(endpoint=endpoint, code="error")
+            raise
+        API_RESPONSES.inc(endpoint=endpoint, code=resp.status_code)
+        return resp
+
+# Ретраи и паузы между ними не выходят за дедлайн обрабатываемого апдейта
+class _DeadlineRetry(Retry):
+    def is_exhausted(self) -> bool:
+        left = time_left()
+        return super().is_exhausted() or (left is not None and left <= 0)
+
+    def get_backoff_time(self) -> float:
+        left = time_left()
+        backoff = super().get_backoff_time()
+        return backoff if left is None else max(0.0, min(backoff, left))
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        left = time_left()
+        return retry_after if retry_after is None or left is None else max(0.0, min(retry_after, left))
+
 # Общая Session с ретраями для API-запросов
 SESSION = requests.Session()
-_retry = Retry(
+_retry = _DeadlineRetry(
     total=3, connect=3, read=3, backoff_factor=0.5,
     status_forcelist=(429, 500, 502, 503, 504),
     allowed_methods=frozenset(["GET", "POST"])
 )
-SESSION.mount("https://", HTTPAdapter(max_retries=_retry))
-SESSION.mount("http://", HTTPAdapter(max_retries=_retry))
+# Пул соединений не меньше веера параллельных запросов (get_students и т.п.)
+SESSION.mount("https://", _MeteredAdapter(max_retries=_retry, pool_maxsize=max(10, API_FANOUT)))
+SESSION.mount("http://", _MeteredAdapter(max_retries=_retry, pool_maxsize=max(10, API_FANOUT)))
+FETCH_POOL = ThreadPoolExecutor(max_workers=API_FANOUT, thread_name_prefix="api-fetch")
+
+# Автоматы по эндпоинтам (общие с api_async)
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    with _BREAKERS_LOCK:
+        br = _BREAKERS.get(endpoint)
+        if br is None:
+            br = _BREAKERS[endpoint] = CircuitBreaker(endpoint, API_BREAKER_FAILURES, API_BREAKER_RESET)
+        return br
+
+# Все запросы к API идут через автомат эндпоинта и с таймаутом не больше остатка дедлайна.
+# Сеть, 5xx и 429 (уже после ретраев адаптера) — неудача автомата, остальное — успех
+def _call(method: str, path: str, timeout: float, **kw) -> requests.Response:
+    timeout = budget(timeout)
+    endpoint = _endpoint(path)
+    br = breaker_for(endpoint)
+    if not br.allow():
+        raise CircuitOpen(f"{endpoint}: circuit open")
+    try:
+        r = SESSION.request(method, api_url(path), timeout=timeout, **kw)
+    except Exception:
+        br.failure()
+        raise
+    if r.status_code >= 500 or r.status_code == 429:
+        br.failure()
+    else:
+        br.success()
+    return r
+
+# Последние удачные ответы списков (teachers, courseworks) на случай отказа API
+_LAST_GOOD = LastGood(maxsize=64)
+
+# GET -> (код, json). При отказе (сеть, 5xx/429, открытый автомат, дедлайн) —
+# (None, последний удачный ответ с пометкой stale), если keep и он есть, иначе (None, None)
+def _read(path: str, timeout: float = 15, keep: bool = False, **kw) -> Tuple[Optional[int], Any]:
+    try:
+        r = _call("GET", path, timeout, headers=kw.pop("headers", None) or _auth_headers(), **kw)
+        if r.status_code < 500 and r.status_code != 429:
+            js = _safe_json(r) if r.status_code == 200 else None
+            if keep and js is not None:
+                _LAST_GOOD.put(path, js)
+            return r.status_code, js
+        error: Any = f"http {r.status_code}"
+    except Exception as e:
+        error = e
+    last = _LAST_GOOD.get(path) if keep else None
+    if last is not None:
+        API_STALE.inc(endpoint=_endpoint(path))
+        print(f"{path} error: {error}, serving last good response")
+        return None, last
+    print(f"{path} error: {error}")
+    return None, None
 
 def _safe_json(resp: requests.Response) -> Union[Dict[str, Any], List[Any], None]:
     try:
@@ -31,7 +130,8 @@ def _safe_json(resp: requests.Response) -> Union[Dict[str, Any], List[Any], None
     except Exception:
         return None
 
-def _as_list(data: Any) -> List[Dict[str, Any]]:
+# Список записей из ответа (голый список или обёртка {"data": [...]}); None — ответ не список
+def _list_or_none(data: Any) -> Optional[List[Dict[str, Any]]]:
     if isinstance(data, dict):
         for k in ("data", "items", "results", "courseworks", "teachers", "students"):
             v = data.get(k)
@@ -39,65 +139,391 @@ def _as_list(data: Any) -> List[Dict[str, Any]]:
                 data = v
                 break
     if not isinstance(data, list):
-        return []
+        return None
     return [x for x in data if isinstance(x, dict)]
 
+def _as_list(data: Any) -> List[Dict[str, Any]]:
+    return _list_or_none(data) or []
+
+@api_timed
 def get_teachers() -> List[Dict[str, Any]]:
-    try:
-        r = SESSION.get(api_url("teachers"), headers=_auth_headers(), timeout=15)
-        return _as_list(_safe_json(r)) if r.status_code == 200 else []
-    except Exception as e:
-        print(f"teachers error: {e}")
-        return []
+    _, js = _read("teachers", keep=True)
+    return stale_like(js, _as_list(js))
+
+# Ограниченный TTL/LRU-кеш сущностей с single-flight: параллельные промахи
+# по одному ключу ждут единственный запрос лидера. Неудачи (None) не кешируются:
+# если загрузка не удалась, а в кеше есть истёкшая запись, отдаётся она с пометкой stale.
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+
+class EntityCache:
+    def __init__(self, name: str, maxsize: int = 2048, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self.inflight: Dict[str, _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_load(self, key: str, loader, wait_timeout: float = 30.0) -> Any:
+        with self.lock:
+            ent = self.data.get(key)
+            if ent is not None and ent[0] > time.monotonic():
+                self.data.move_to_end(key)
+                self.hits += 1
+                return ent[1]
+            expired = ent[1] if ent is not None else None
+            self.misses += 1
+            flight = self.inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait(wait_timeout)
+            return flight.value
+        value = None
+        try:
+            value = loader()
+        finally:
+            with self.lock:
+                if value is not None:
+                    self.data[key] = (time.monotonic() + self.ttl, value)
+                    self.data.move_to_end(key)
+                    while len(self.data) > self.maxsize:
+                        self.data.popitem(last=False)
+                self.inflight.pop(key, None)
+            if value is None and expired is not None:
+                API_STALE.inc(endpoint=self.name)
+                value = stale(expired)
+            flight.value = value
+            flight.event.set()
+        return value
+
+    # Последнее известное значение, даже истёкшее, с пометкой stale
+    def last(self, key: str) -> Any:
+        with self.lock:
+            ent = self.data.get(key)
+        if ent is None:
+            return None
+        API_STALE.inc(endpoint=self.name)
+        return stale(ent[1])
+
+    # Только кеш, без загрузки: (найденные, промахи)
+    def get_many(self, keys: List[str]) -> tuple[Dict[str, Any], List[str]]:
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        now = time.monotonic()
+        with self.lock:
+            for key in keys:
+                ent = self.data.get(key)
+                if ent is not None and ent[0] > now:
+                    self.data.move_to_end(key)
+                    self.hits += 1
+                    found[key] = ent[1]
+                else:
+                    missing.append(key)
+        return found, missing
+
+    # Промахи, загруженные в обход get_or_load (пакетные запросы, async-клиент)
+    def count_miss(self, n: int = 1, coalesced: bool = False) -> None:
+        with self.lock:
+            self.misses += n
+            if coalesced:
+                self.coalesced += n
 
+    def put(self, key: str, value: Any) -> None:
+        if value is None:
+            return
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self.lock:
+            if key is None:
+                self.data.clear()
+            else:
+                self.data.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+TEACHER_CACHE = EntityCache("teacher", maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+STUDENT_CACHE = EntityCache("student", maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+
+def _fetch_teacher(teacher_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+    status, js = _read(f"teacher/{teacher_id}")
+    return js if status == 200 else None
+
+def _fetch_student(student_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+    status, js = _read(f"student/{student_id}")
+    return js if status == 200 else None
+
+@api_timed
 def get_teacher(teacher_id: Union[str, int]) -> Optional[Dict[str, Any]]:
     if not teacher_id:
         return None
-    try:
-        r = SESSION.get(api_url(f"teacher/{teacher_id}"), headers=_auth_headers(), timeout=15)
-        return _safe_json(r) if r.status_code == 200 else None
-    except Exception as e:
-        print(f"teacher {teacher_id} error: {e}")
-        return None
+    return TEACHER_CACHE.get_or_load(str(teacher_id), lambda: _fetch_teacher(teacher_id))
 
+@api_timed
 def get_student(student_id: Union[str, int]) -> Optional[Dict[str, Any]]:
     if not student_id:
         return None
+    return STUDENT_CACHE.get_or_load(str(student_id), lambda: _fetch_student(student_id))
+
+def invalidate_teacher(teacher_id: Union[str, int, None] = None) -> None:
+    TEACHER_CACHE.invalidate(None if teacher_id is None else str(teacher_id))
+
+def invalidate_student(student_id: Union[str, int, None] = None) -> None:
+    STUDENT_CACHE.invalidate(None if student_id is None else str(student_id))
+
+# Пакетное разрешение id -> сущность. Сначала кеш, затем batch-эндпоинт
+# (`students?include=1,2,3`), если плагин его поддерживает; иначе — веер
+# одиночных запросов на FETCH_POOL. Отсутствующие id отображаются в None.
+_BATCH_SUPPORTED: Dict[str, bool] = {}
+
+def _fetch_batch(collection: str, ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    if not WP_BATCH_PARAM or _BATCH_SUPPORTED.get(collection) is False:
+        return None
     try:
-        r = SESSION.get(api_url(f"student/{student_id}"), headers=_auth_headers(), timeout=15)
-        return _safe_json(r) if r.status_code == 200 else None
+        r = _call("GET", collection, 15, headers=_auth_headers(), params={WP_BATCH_PARAM: ",".join(ids)})
     except Exception as e:
-        print(f"student {student_id} error: {e}")
+        print(f"{collection} batch error: {e}")
         return None
+    if r.status_code in (400, 404, 405):
+        _BATCH_SUPPORTED[collection] = False
+        return None
+    js = _safe_json(r) if r.status_code == 200 else None
+    if js is None:
+        return None
+    rows = {str(x.get("id")): x for x in _as_list(js)}
+    # роут молча игнорирует фильтр и отдаёт всю коллекцию — одиночные запросы дешевле
+    if set(rows) - set(ids):
+        _BATCH_SUPPORTED[collection] = False
+        print(f"{collection} ignores {WP_BATCH_PARAM}=, batch disabled")
+        return None
+    _BATCH_SUPPORTED[collection] = True
+    return rows
+
+def _resolve_many(ids, cache: EntityCache, collection: str, fetch_one) -> Dict[str, Optional[Dict[str, Any]]]:
+    keys = list(dict.fromkeys(str(i) for i in ids if i))
+    out, missing = cache.get_many(keys)
+    if not missing:
+        return out
+    if len(missing) > 1:
+        batch = _fetch_batch(collection, missing)
+        if batch is not None:
+            cache.count_miss(len(batch))
+            for k, v in batch.items():
+                cache.put(k, v)
+                out[k] = v
+            missing = [k for k in missing if k not in batch]
+    # веер наследует дедлайн апдейта: у каждой задачи своя копия контекста
+    futures = {
+        k: FETCH_POOL.submit(contextvars.copy_context().run, cache.get_or_load, k, lambda k=k: fetch_one(k))
+        for k in missing
+    }
+    for k, fut in futures.items():
+        try:
+            out[k] = fut.result()
+        except Exception as e:
+            print(f"{collection} {k} fan-out error: {e}")
+            out[k] = None
+    return out
 
+@api_timed
+def get_students(ids) -> Dict[str, Optional[Dict[str, Any]]]:
+    return _resolve_many(ids, STUDENT_CACHE, "students", _fetch_student)
+
+@api_timed
+def get_teachers_by_ids(ids) -> Dict[str, Optional[Dict[str, Any]]]:
+    return _resolve_many(ids, TEACHER_CACHE, "teachers", _fetch_teacher)
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {c.name: c.stats() for c in (TEACHER_CACHE, STUDENT_CACHE)}
+
+def _cache_samples() -> List[tuple]:
+    out = []
+    for name, st in cache_stats().items():
+        lbl = {"cache": name}
+        out.append(("startfit_cache_hits_total", "counter", "Entity cache hits", lbl, st["hits"]))
+        out.append(("startfit_cache_misses_total", "counter", "Entity cache misses", lbl, st["misses"]))
+        out.append(("startfit_cache_coalesced_total", "counter", "Cache misses that waited for an in-flight load", lbl, st["coalesced"]))
+        out.append(("startfit_cache_entries", "gauge", "Entity cache size", lbl, st["size"]))
+    out.append(("startfit_executor_queue_depth", "gauge", "Queued tasks per thread pool", {"pool": "api-fetch"}, FETCH_POOL._work_queue.qsize()))
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    for br in breakers:
+        lbl = {"endpoint": br.name}
+        out.append(("startfit_api_breaker_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open)", lbl, br.state))
+        out.append(("startfit_api_breaker_trips_total", "counter", "Times the circuit breaker opened", lbl, br.trips))
+    return out
+
+register_collector(_cache_samples)
+
+@api_timed
 def get_courseworks() -> List[Dict[str, Any]]:
-    try:
-        r = SESSION.get(api_url("courseworks"), headers=_auth_headers(), timeout=20)
-        js = _safe_json(r) if r.status_code == 200 else []
-        return _as_list(js)
-    except Exception as e:
-        print(f"courseworks error: {e}")
-        return []
+    _, js = _read("courseworks", timeout=20, keep=True)
+    return stale_like(js, _as_list(js))
 
+@api_timed
 def get_coursework(cw_id: Union[str, int]) -> Optional[Dict[str, Any]]:
     if not cw_id:
         return None
-    try:
-        r = SESSION.get(api_url(f"coursework/{cw_id}"), headers=_auth_headers(), timeout=15)
-        return _safe_json(r) if r.status_code == 200 else None
-    except Exception as e:
-        print(f"coursework {cw_id} error: {e}")
-        return None
+    status, js = _read(f"coursework/{cw_id}")
+    return js if status == 200 else None
 
-def update_coursework(cw_id: Union[str, int], status: str, grade: Optional[int] = None, comment: Optional[str] = None) -> bool:
+# HTTP-код ответа или None, если запрос не дошёл (сеть, открытый автомат, дедлайн)
+@api_timed
+def update_coursework_status(cw_id: Union[str, int], status: str, grade: Optional[int] = None,
+                             comment: Optional[str] = None) -> Optional[int]:
     payload = {"id": cw_id, "status": status}
     if grade is not None:
         payload["grade"] = grade
     if comment:
         payload["comment"] = comment
     try:
-        r = SESSION.post(api_url("coursework/edit"), json=payload, headers=_auth_headers(), timeout=15)
-        return r.status_code == 200
+        r = _call("POST", "coursework/edit", 15, json=payload, headers=_auth_headers())
+        return r.status_code
     except Exception as e:
         print(f"edit coursework {cw_id} error: {e}")
-        return False
+        return None
+
+def update_coursework(cw_id: Union[str, int], status: str, grade: Optional[int] = None, comment: Optional[str] = None) -> bool:
+    return update_coursework_status(cw_id, status, grade, comment) == 200
+
+# =========================
+# Инкрементальная синхронизация курсовых
+# =========================
+
+_MODIFIED_FIELDS = ("modified", "date_modified", "modified_gmt", "updated_at")
+
+def _cw_modified(cw: Dict[str, Any]) -> str:
+    for fld in _MODIFIED_FIELDS:
+        val = cw.get(fld)
+        if val:
+            return str(val)
+    return ""
+
+def _cw_fingerprint(cw: Dict[str, Any]) -> str:
+    return json.dumps(cw, sort_keys=True, ensure_ascii=False, default=str)
+
+# Снимок /courseworks, обновляемый условными GET (If-None-Match / If-Modified-Since).
+# poll() отдаёт дельту {"added", "changed", "removed", "full", "snapshot"} или None
+# при ошибке; на 304 дельта пустая. snapshot — получен и разобран полный список
+# (200 на полном цикле): только по нему можно судить об удалённых курсовых. Если задан WP_DELTA_PARAM, между полными циклами запрос
+# уходит с high-water mark (max modified) и ответ считается частичным — удаления
+# видны только на полной синхронизации раз в full_every циклов.
+class CourseworkSync:
+    def __init__(self, full_every: int = 30):
+        self.full_every = max(1, full_every)
+        self.lock = threading.Lock()
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.high_water = ""
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._prints: Dict[str, str] = {}
+        self._cycle = 0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.items.values())
+
+    def ids(self) -> List[str]:
+        with self.lock:
+            return list(self.items)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.etag = self.last_modified = None
+            self.high_water = ""
+            self.items.clear()
+            self._prints.clear()
+            self._cycle = 0
+
+    # Заголовки и параметры очередного запроса: (полный ли цикл, headers, params)
+    def prepare(self) -> tuple[bool, Dict[str, str], Dict[str, str]]:
+        with self.lock:
+            full = not self.items or not WP_DELTA_PARAM or self._cycle % self.full_every == 0
+            self._cycle += 1
+            headers = _auth_headers()
+            params: Dict[str, str] = {}
+            if full:
+                if self.etag:
+                    headers["If-None-Match"] = self.etag
+                if self.last_modified:
+                    headers["If-Modified-Since"] = self.last_modified
+            elif self.high_water:
+                params[WP_DELTA_PARAM] = self.high_water
+        return full, headers, params
+
+    # Ответ на запрос из prepare() -> дельта (None при ошибке). Общая часть для
+    # синхронного poll() и асинхронного клиента (api_async)
+    def absorb(self, full: bool, status: int, resp_headers, js: Any) -> Optional[Dict[str, Any]]:
+        delta: Dict[str, Any] = {"added": [], "changed": [], "removed": [], "full": full, "snapshot": False}
+        if status == 304:
+            return delta
+        if status != 200 or js is None:
+            print(f"courseworks sync failed: http {status}")
+            return None
+        # объект ошибки WP или {} вместо списка — сбой, а не пустой снимок
+        # (иначе полная синхронизация объявит удалёнными все курсовые)
+        rows = _list_or_none(js)
+        if rows is None:
+            print(f"courseworks sync failed: not a list ({type(js).__name__})")
+            return None
+        delta["snapshot"] = full
+        with self.lock:
+            if full:
+                self.etag = resp_headers.get("ETag") or None
+                self.last_modified = resp_headers.get("Last-Modified") or None
+            seen: Set[str] = set()
+            for cw in rows:
+                cw_id = str(cw.get("id") or "")
+                if not cw_id:
+                    continue
+                seen.add(cw_id)
+                fp = _cw_fingerprint(cw)
+                prev = self._prints.get(cw_id)
+                if prev == fp:
+                    continue
+                self._prints[cw_id] = fp
+                self.items[cw_id] = cw
+                delta["changed" if prev is not None else "added"].append(cw)
+                mod = _cw_modified(cw)
+                if mod > self.high_water:
+                    self.high_water = mod
+            if full:
+                for cw_id in [k for k in self.items if k not in seen]:
+                    self._prints.pop(cw_id, None)
+                    delta["removed"].append(self.items.pop(cw_id))
+        return delta
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        full, headers, params = self.prepare()
+        try:
+            r = _call("GET", "courseworks", 20, headers=headers, params=params or None)
+        except Exception as e:
+            print(f"courseworks sync error: {e}")
+            return None
+        js = _safe_json(r) if r.status_code == 200 else None
+        return self.absorb(full, r.status_code, r.headers, js)
+
+COURSEWORK_SYNC = CourseworkSync()
@@ -0,0 +1,243 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Union
+
+import aiohttp
+
+from metrics import API_RESPONSES, API_STALE, api_timed
+from resilience import CircuitOpen, budget, time_left, stale_like
+from config import API_FANOUT, API_CONCURRENCY, WP_BATCH_PARAM
+from api import (
+    api_url, _auth_headers, _endpoint, _as_list, _BATCH_SUPPORTED, _LAST_GOOD, breaker_for,
+    EntityCache, TEACHER_CACHE, STUDENT_CACHE, COURSEWORK_SYNC,
+)
+
+# Асинхронный клиент WP API для движка на asyncio (bot_async). Одна ClientSession
+# на цикл событий: общий пул соединений (TCPConnector), общее число запросов
+# ограничено API_CONCURRENCY, веер по id — API_FANOUT. Кеши сущностей и снимок
+# курсовых — те же, что у синхронного api, так что оба движка видят одни данные.
+_SESSION: Optional[aiohttp.ClientSession] = None
+_LIMIT: Optional[asyncio.Semaphore] = None
+_FANOUT: Optional[asyncio.Semaphore] = None
+# single-flight для промахов кеша: (коллекция, id) -> задача загрузки
+_INFLIGHT: Dict[tuple, "asyncio.Task"] = {}
+
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+_RETRIES = 3
+
+def _session() -> aiohttp.ClientSession:
+    global _SESSION, _LIMIT, _FANOUT
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(limit=API_CONCURRENCY, limit_per_host=API_CONCURRENCY, ttl_dns_cache=300)
+        _SESSION = aiohttp.ClientSession(connector=connector)
+        _LIMIT = asyncio.Semaphore(API_CONCURRENCY)
+        _FANOUT = asyncio.Semaphore(API_FANOUT)
+    return _SESSION
+
+async def close() -> None:
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+# Запрос с ретраями как у синхронной Session: (status, headers, json|None).
+# Тот же автомат эндпоинта и дедлайн апдейта, что у api._call: ретраи и паузы
+# не выходят за остаток, открытый автомат — CircuitOpen без запроса
+async def _request(method: str, path: str, timeout: float = 15, **kw) -> tuple[int, Any, Any]:
+    session = _session()
+    headers = kw.pop("headers", None) or _auth_headers()
+    endpoint = _endpoint(path)
+    budget(timeout)
+    br = breaker_for(endpoint)
+    if not br.allow():
+        raise CircuitOpen(f"{endpoint}: circuit open")
+    for attempt in range(_RETRIES + 1):
+        try:
+            async with _LIMIT:
+                async with session.request(
+                    method, api_url(path), headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=budget(timeout)), **kw,
+                ) as r:
+                    API_RESPONSES.inc(endpoint=endpoint, code=r.status)
+                    left = time_left()
+                    if r.status in _RETRY_STATUS and attempt < _RETRIES and (left is None or left > 0):
+                        raise aiohttp.ClientResponseError(r.request_info, r.history, status=r.status)
+                    js = None
+                    if r.status == 200:
+                        try:
+                            js = await r.json(content_type=None)
+                        except Exception:
+                            js = None
+                    if r.status in _RETRY_STATUS:
+                        br.failure()
+                    else:
+                        br.success()
+                    return r.status, r.headers, js
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not isinstance(e, aiohttp.ClientResponseError):
+                API_RESPONSES.inc(endpoint=endpoint, code="error")
+            left = time_left()
+            if attempt >= _RETRIES or (left is not None and left <= 0):
+                br.failure()
+                raise
+        except Exception:
+            br.failure()  # DeadlineExceeded из budget() между попытками
+            raise
+        pause = 0.5 * (2 ** attempt)
+        left = time_left()
+        await asyncio.sleep(pause if left is None else max(0.0, min(pause, left)))
+    raise RuntimeError("unreachable")
+
+# Чтение списка с откатом на последний удачный ответ (общий с api._read)
+async def _read_list(path: str, timeout: float = 15) -> List[Dict[str, Any]]:
+    try:
+        status, _, js = await _request("GET", path, timeout=timeout)
+        if status < 500 and status != 429:
+            if js is not None:
+                _LAST_GOOD.put(path, js)
+            return _as_list(js)
+        error: Any = f"http {status}"
+    except Exception as e:
+        error = e
+    last = _LAST_GOOD.get(path)
+    if last is not None:
+        API_STALE.inc(endpoint=_endpoint(path))
+        print(f"{path} error: {error}, serving last good response")
+    else:
+        print(f"{path} error: {error}")
+    return stale_like(last, _as_list(last))
+
+@api_timed
+async def get_teachers() -> List[Dict[str, Any]]:
+    return await _read_list("teachers")
+
+async def _fetch_one(kind: str, entity_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+    try:
+        status, _, js = await _request("GET", f"{kind}/{entity_id}")
+        return js if status == 200 else None
+    except Exception as e:
+        print(f"{kind} {entity_id} error: {e}")
+        return None
+
+async def _cached(cache: EntityCache, kind: str, entity_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+    key = str(entity_id)
+    found, _ = cache.get_many([key])
+    if key in found:
+        return found[key]
+    task = _INFLIGHT.get((kind, key))
+    cache.count_miss(coalesced=task is not None)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_one(kind, key))
+        _INFLIGHT[(kind, key)] = task
+        task.add_done_callback(lambda _t, k=(kind, key): _INFLIGHT.pop(k, None))
+    value = await asyncio.shield(task)
+    if value is None:
+        return cache.last(key)
+    cache.put(key, value)
+    return value
+
+@api_timed
+async def get_teacher(teacher_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+    if not teacher_id:
+        return None
+    return await _cached(TEACHER_CACHE, "teacher", teacher_id)
+
+@api_timed
+async def get_student(student_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+    if not student_id:
+        return None
+    return await _cached(STUDENT_CACHE, "student", student_id)
+
+async def _fetch_batch(collection: str, ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    if not WP_BATCH_PARAM or _BATCH_SUPPORTED.get(collection) is False:
+        return None
+    try:
+        status, _, js = await _request("GET", collection, params={WP_BATCH_PARAM: ",".join(ids)})
+    except Exception as e:
+        print(f"{collection} batch error: {e}")
+        return None
+    if status in (400, 404, 405):
+        _BATCH_SUPPORTED[collection] = False
+        return None
+    if status != 200 or js is None:
+        return None
+    rows = {str(x.get("id")): x for x in _as_list(js)}
+    # роут молча игнорирует фильтр и отдаёт всю коллекцию — одиночные запросы дешевле
+    if set(rows) - set(ids):
+        _BATCH_SUPPORTED[collection] = False
+        print(f"{collection} ignores {WP_BATCH_PARAM}=, batch disabled")
+        return None
+    _BATCH_SUPPORTED[collection] = True
+    return rows
+
+async def _resolve_many(ids, cache: EntityCache, collection: str, kind: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    keys = list(dict.fromkeys(str(i) for i in ids if i))
+    out, missing = cache.get_many(keys)
+    if not missing:
+        return out
+    if len(missing) > 1:
+        batch = await _fetch_batch(collection, missing)
+        if batch is not None:
+            cache.count_miss(len(batch))
+            for k, v in batch.items():
+                cache.put(k, v)
+                out[k] = v
+            missing = [k for k in missing if k not in batch]
+
+    async def one(k: str):
+        async with _FANOUT:
+            return await _cached(cache, kind, k)
+
+    results = await asyncio.gather(*(one(k) for k in missing), return_exceptions=True)
+    for k, res in zip(missing, results):
+        if isinstance(res, BaseException):
+            print(f"{collection} {k} fan-out error: {res}")
+            res = None
+        out[k] = res
+    return out
+
+@api_timed
+async def get_students(ids) -> Dict[str, Optional[Dict[str, Any]]]:
+    return await _resolve_many(ids, STUDENT_CACHE, "students", "student")
+
+@api_timed
+async def get_teachers_by_ids(ids) -> Dict[str, Optional[Dict[str, Any]]]:
+    return await _resolve_many(ids, TEACHER_CACHE, "teachers", "teacher")
+
+@api_timed
+async def get_courseworks() -> List[Dict[str, Any]]:
+    return await _read_list("courseworks", timeout=20)
+
+@api_timed
+async def get_coursework(cw_id: Union[str, int]) -> Optional[Dict[str, Any]]:
+    if not cw_id:
+        return None
+    return await _fetch_one("coursework", cw_id)
+
+# HTTP-код ответа или None, если запрос не дошёл (сеть, открытый автомат, дедлайн)
+@api_timed
+async def update_coursework_status(cw_id: Union[str, int], status: str, grade: Optional[int] = None,
+                                   comment: Optional[str] = None) -> Optional[int]:
+    payload = {"id": cw_id, "status": status}
+    if grade is not None:
+        payload["grade"] = grade
+    if comment:
+        payload["comment"] = comment
+    try:
+        code, _, _ = await _request("POST", "coursework/edit", json=payload)
+        return code
+    except Exception as e:
+        print(f"edit coursework {cw_id} error: {e}")
+        return None
+
+async def update_coursework(cw_id: Union[str, int], status: str, grade: Optional[int] = None, comment: Optional[str] = None) -> bool:
+    return await update_coursework_status(cw_id, status, grade, comment) == 200
+
+# Цикл инкрементальной синхронизации: тот же CourseworkSync, запрос — через aiohttp
+async def poll_courseworks() -> Optional[Dict[str, Any]]:
+    full, headers, params = COURSEWORK_SYNC.prepare()
+    try:
+        status, resp_headers, js = await _request("GET", "courseworks", timeout=20, headers=headers, params=params or None)
+    except Exception as e:
+        print(f"courseworks sync error: {e}")
+        return None
+    return COURSEWORK_SYNC.absorb(full, status, resp_headers, js)
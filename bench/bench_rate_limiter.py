@@ -0,0 +1,149 @@
+# Микробенчмарк антифлуда: вызовы/с и память на 100k разных пользователей.
+# Запуск из корня репозитория: python bench/bench_rate_limiter.py [--users N] [--calls N] [--threads N]
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import tracemalloc
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ratelimit import RateLimiter  # noqa: E402
+
+LIMITS = {
+    'msg': {'short': (5, 10), 'long': (20, 60), 'cooldown': 30},
+    'cb':  {'short': (10, 10), 'long': (60, 60), 'cooldown': 20},
+}
+
+# Прежняя реализация (список меток под одной RLock) — для сравнения
+class LegacyRateLimiter:
+    def __init__(self, limits: dict):
+        self.limits = limits
+        self.state: Dict[tuple, Dict[str, Any]] = {}
+        self.dups: Dict[int, Dict[str, Any]] = {}
+        self.lock = threading.RLock()
+
+    def _now(self) -> float:
+        return time.time()
+
+    def allow(self, uid: int, kind: str) -> tuple:
+        with self.lock:
+            now = self._now()
+            key = (int(uid), kind)
+            st = self.state.get(key)
+            if not st:
+                st = {'ts': [], 'blocked_until': 0.0}
+                self.state[key] = st
+            if now < st['blocked_until']:
+                return False, int(st['blocked_until'] - now) + 1
+            long_n, long_win = self.limits[kind]['long']
+            st['ts'] = [t for t in st['ts'] if now - t <= long_win]
+            short_n, short_win = self.limits[kind]['short']
+            cnt_short = sum(1 for t in st['ts'] if now - t <= short_win)
+            if cnt_short >= short_n or len(st['ts']) >= long_n:
+                st['blocked_until'] = now + self.limits[kind]['cooldown']
+                return False, int(st['blocked_until'] - now) + 1
+            st['ts'].append(now)
+            return True, 0
+
+    def is_duplicate(self, uid: int, text: Optional[str], window_sec: float = 2.0) -> bool:
+        if not text:
+            return False
+        with self.lock:
+            now = self._now()
+            h = hash(text)
+            prev = self.dups.get(uid)
+            if prev and prev.get('last_hash') == h and (now - prev.get('last_at', 0)) < window_sec:
+                return True
+            self.dups[uid] = {'last_hash': h, 'last_at': now}
+            return False
+
+def _drive(limiter, users: int, calls: int, offset: int = 0) -> None:
+    for i in range(calls):
+        uid = (i * 7919 + offset) % users
+        limiter.is_duplicate(uid, "hi" if i & 1 else "/start")
+        limiter.allow(uid, 'cb' if i & 1 else 'msg')
+
+def throughput(limiter, users: int, calls: int, threads: int) -> float:
+    per = calls // threads
+    workers = [threading.Thread(target=_drive, args=(limiter, users, per, t)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per * threads / (time.perf_counter() - t0)
+
+def memory(factory, users: int) -> int:
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    limiter = factory()
+    for uid in range(users):
+        limiter.is_duplicate(uid, "/start")
+        limiter.allow(uid, 'msg')
+        limiter.allow(uid, 'cb')
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return used
+
+# Вытеснение: после простоя дольше окон ключи уходят при очередном проходе полосы
+def eviction(users: int) -> tuple:
+    clock = [1000.0]
+    limiter = RateLimiter(LIMITS, sweep_every=30.0)
+    limiter._now = lambda: clock[0]
+    for uid in range(users):
+        limiter.is_duplicate(uid, "/start")
+        limiter.allow(uid, 'msg')
+    before = limiter.stats()
+    clock[0] += 120.0
+    for stripe_uid in range(len(limiter.stripes)):
+        limiter.allow(users + stripe_uid, 'cb')  # по одному обращению на полосу
+    return before, limiter.stats()
+
+# Сверка решений со старой реализацией на случайных потоках одного пользователя
+# (оба вида лимитов, паузы от всплесков до редких событий). Сравнивается каждое
+# событие, без остановки на первом расхождении: (событий, новый пропустил
+# лишнее, новый отказал там, где старый пропускал)
+def semantics(streams: int, events: int = 120, seed: int = 1) -> tuple:
+    rnd = random.Random(seed)
+    compared = looser = stricter = 0
+    for _ in range(streams):
+        clock = [0.0]
+        legacy, current = LegacyRateLimiter(LIMITS), RateLimiter(LIMITS, sweep_every=5.0)
+        legacy._now = current._now = lambda: clock[0]
+        kind = rnd.choice(('msg', 'cb'))
+        rate = rnd.choice((0.1, 0.3, 1.0, 3.0, 10.0))
+        for _ in range(events):
+            clock[0] += rnd.expovariate(rate)
+            a, b = legacy.allow(1, kind), current.allow(1, kind)
+            compared += 1
+            if a[0] != b[0]:
+                looser += b[0]
+                stricter += a[0]
+    return compared, looser, stricter
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--calls", type=int, default=400_000)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+
+    # один "вызов" = is_duplicate + allow, как в screens.flood_guard
+    print(f"users={args.users} calls={args.calls} (call = is_duplicate + allow)")
+    for name, factory in (("legacy", lambda: LegacyRateLimiter(LIMITS)), ("striped", lambda: RateLimiter(LIMITS))):
+        one = throughput(factory(), args.users, args.calls, 1)
+        many = throughput(factory(), args.users, args.calls, args.threads)
+        hot = throughput(factory(), 50, args.calls, args.threads)
+        mem = memory(factory, args.users)
+        print(f"{name:7s} 1 thread: {one:10,.0f}/s  {args.threads} threads: {many:10,.0f}/s  "
+              f"50 hot users: {hot:10,.0f}/s  memory: {mem / 1024 / 1024:6.1f} MiB ({mem / args.users:.0f} B/user)")
+    before, after = eviction(args.users)
+    print(f"eviction: keys {before['keys']} -> {after['keys']}, dups {before['dups']} -> {after['dups']}")
+    compared, looser, stricter = semantics(2000)
+    print(f"vs legacy on {compared} events in 2000 random streams: allowed more in {looser}, less in {stricter}")
+
+if __name__ == "__main__":
+    main()
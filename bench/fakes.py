@@ -0,0 +1,330 @@
+# Локальные заглушки для нагрузочных прогонов: WordPress API плагина и Telegram Bot API.
+# Оба сервера — ThreadingHTTPServer в фоновом потоке на 127.0.0.1 и случайном порту.
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+STATUSES = ("Новая", "На проверке", "Проверено", "Отклонено")
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # клиент (дочерний процесс сценария) уходит, не закрывая keep-alive — это не ошибка
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+class _Server:
+    def __init__(self, handler_cls):
+        handler = type(handler_cls.__name__, (handler_cls,), {"fake": self})
+        self.httpd = _QuietHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name=handler_cls.__name__)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящих серверов
+    fake: Any = None
+
+    def _body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _send(self, code: int, payload: Any = None, headers: Optional[Dict[str, str]] = None, raw: Optional[bytes] = None):
+        body = raw if raw is not None else (b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json" if raw is None else "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# =========================
+# WordPress API плагина
+# =========================
+
+class _WPHandler(_Handler):
+    def do_GET(self):
+        self.fake.serve(self, "GET")
+
+    def do_HEAD(self):
+        self.fake.serve(self, "HEAD")
+
+    def do_POST(self):
+        self.fake.serve(self, "POST")
+
+class FakeWordPress(_Server):
+    # teachers/students/courseworks — размер набора; latency — задержка ответа (с);
+    # files — вложений на курсовую (отдаются с /files/, file_size байт каждое)
+    def __init__(self, teachers: int = 50, students: int = 1000, courseworks: int = 2000,
+                 latency: float = 0.0, files: int = 0, file_size: int = 64 * 1024, seed: int = 1):
+        super().__init__(_WPHandler)
+        self.latency = latency
+        self.file_size = file_size
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.rnd = random.Random(seed)
+        self.clock = 0
+        self.teachers = [
+            {"id": t, "name": f"Teacher {t}", "telegram_chat_id": self.teacher_chat(t), "students": []}
+            for t in range(1, teachers + 1)
+        ]
+        self.students = {s: {"id": s, "name": f"Student {s}"} for s in range(1, students + 1)}
+        for s in self.students:
+            self.teachers[(s - 1) % teachers]["students"].append(s)
+        self.courseworks: Dict[int, Dict[str, Any]] = {}
+        for c in range(1, courseworks + 1):
+            sid = self.rnd.randint(1, students)
+            cw = {
+                "id": c, "title": f"Курсовая {c}", "student_id": sid,
+                "teacher_id": self.teachers[(sid - 1) % teachers]["id"],
+                "status": self.rnd.choice(STATUSES), "grade": None, "modified": self._tick(),
+            }
+            if files:
+                cw["files"] = [{"url": f"{{base}}/files/{c}-{i}.pdf", "name": f"{c}-{i}.pdf"} for i in range(files)]
+            self.courseworks[c] = cw
+        self.etag = ""
+        self._touch()
+
+    @staticmethod
+    def teacher_chat(tid: int) -> int:
+        return 100000 + tid
+
+    def _tick(self) -> str:
+        self.clock += 1
+        return f"2025-01-01T00:00:00.{self.clock:09d}"
+
+    def _touch(self) -> None:
+        self.etag = '"' + hashlib.md5(str(self.clock).encode()).hexdigest() + '"'
+        self.last_modified = formatdate(usegmt=True)
+
+    # Изменить долю курсовых (статус/modified) — для прогонов синхронизации
+    def churn(self, fraction: float) -> int:
+        with self.lock:
+            ids = self.rnd.sample(list(self.courseworks), max(1, int(len(self.courseworks) * fraction)))
+            for c in ids:
+                cw = self.courseworks[c]
+                cw["status"] = self.rnd.choice(STATUSES[:2])
+                cw["modified"] = self._tick()
+            self._touch()
+        return len(ids)
+
+    def _cw_out(self, cw: Dict[str, Any]) -> Dict[str, Any]:
+        out = dict(cw)
+        if "files" in cw:
+            out["files"] = [dict(f, url=f["url"].format(base=self.url)) for f in cw["files"]]
+        return out
+
+    def _count(self, key: str) -> None:
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def serve(self, h: _Handler, method: str) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(h.path)
+        q = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        path = parts.path.strip("/").split("/")
+        root = path[0] if path else ""
+        self._count(f"{method} {root}")
+        if root == "_churn":  # служебный: /_churn?fraction=0.02
+            return h._send(200, {"changed": self.churn(float(q.get("fraction", "0.01")))})
+        if method == "POST" and path == ["coursework", "edit"]:
+            return self._edit(h)
+        if root == "files":
+            return h._send(200, raw=b"%PDF" + b"\0" * max(0, self.file_size - 4), headers={"ETag": '"' + path[-1] + '"'})
+        include = [int(x) for x in q.get("include", "").split(",") if x.isdigit()]
+        with self.lock:
+            if root == "teachers":
+                rows = [t for t in self.teachers if not include or t["id"] in include]
+                return h._send(200, rows)
+            if root == "students":
+                return h._send(200, [self.students[i] for i in include if i in self.students])
+            if root in ("teacher", "student", "coursework") and len(path) == 2 and path[1].isdigit():
+                i = int(path[1])
+                if root == "teacher":
+                    row = self.teachers[i - 1] if 0 < i <= len(self.teachers) else None
+                elif root == "student":
+                    row = self.students.get(i)
+                else:
+                    row = self._cw_out(self.courseworks[i]) if i in self.courseworks else None
+                return h._send(200, row) if row else h._send(404, {"code": "not_found"})
+            if root == "courseworks":
+                after = q.get("modified_after")
+                if not after and h.headers.get("If-None-Match") == self.etag:
+                    return h._send(304)
+                rows = [self._cw_out(cw) for cw in self.courseworks.values() if not after or cw["modified"] > after]
+                return h._send(200, rows, headers={"ETag": self.etag, "Last-Modified": self.last_modified})
+        h._send(404, {"code": "rest_no_route"})
+
+    def _edit(self, h: _Handler) -> None:
+        try:
+            js = json.loads(h._body() or b"{}")
+            c = int(js.get("id"))
+        except Exception:
+            return h._send(400, {"code": "bad_request"})
+        with self.lock:
+            cw = self.courseworks.get(c)
+            if cw is None:
+                return h._send(404, {"code": "not_found"})
+            cw["status"] = js.get("status", cw["status"])
+            if "grade" in js:
+                cw["grade"] = js["grade"]
+            cw["modified"] = self._tick()
+            self._touch()
+        h._send(200, {"success": True})
+
+# WP API из записи recorder.py: ответы на (метод, путь с query) отдаются в порядке
+# записи, после последнего повторяется последний. Незаписанный query — первый
+# ответ на тот же путь без query; совсем незаписанные запросы — 404 и счётчик misses.
+class RecordedWordPress(_Server):
+    def __init__(self, records: List[Dict[str, Any]], latency: float = 0.0):
+        super().__init__(_WPHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.responses: Dict[tuple, List[Dict[str, Any]]] = {}
+        self.cursor: Dict[tuple, int] = {}
+        self.requests: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        for rec in records:
+            self.responses.setdefault((rec["method"], rec["path"]), []).append(rec)
+
+    def _pick(self, key: tuple, conditional: bool) -> Optional[Dict[str, Any]]:
+        seq = self.responses.get(key)
+        if not seq:
+            return None
+        i = self.cursor.get(key, 0)
+        self.cursor[key] = i + 1
+        rec = seq[min(i, len(seq) - 1)]
+        if rec["status"] == 304 and not conditional:
+            # безусловный запрос не может получить 304 — отдаём ближайший полный ответ
+            full = [r for r in seq if r["status"] == 200]
+            rec = full[-1] if full else rec
+        return rec
+
+    def serve(self, h: _Handler, method: str) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        h._body()
+        path = h.path.lstrip("/")
+        bare = path.split("?", 1)[0]
+        conditional = bool(h.headers.get("If-None-Match") or h.headers.get("If-Modified-Since"))
+        with self.lock:
+            self.requests[f"{method} {bare}"] = self.requests.get(f"{method} {bare}", 0) + 1
+            rec = self._pick((method, path), conditional) or self._pick((method, bare), conditional)
+            if rec is None:
+                self.misses[f"{method} {path}"] = self.misses.get(f"{method} {path}", 0) + 1
+        if rec is None:
+            return h._send(404, {"code": "not_recorded"})
+        h._send(rec["status"], rec.get("body"), headers={k: v for k, v in rec.get("headers", {}).items() if k != "Content-Type"})
+
+# =========================
+# Telegram Bot API
+# =========================
+
+class _TGHandler(_Handler):
+    def do_GET(self):
+        self.fake.serve(self)
+
+    do_POST = do_GET
+
+class FakeBotAPI(_Server):
+    # latency — задержка ответа (с); rate_429 — доля вызовов, отвечающих 429 с retry_after
+    def __init__(self, latency: float = 0.0, rate_429: float = 0.0, retry_after: int = 1, seed: int = 2):
+        super().__init__(_TGHandler)
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls: List[tuple] = []  # (время, метод, chat_id)
+        self.throttled = 0
+        self.message_id = 0
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls.clear()
+            self.throttled = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            by_method: Dict[str, int] = {}
+            for _, m, _ in self.calls:
+                by_method[m] = by_method.get(m, 0) + 1
+            return {"calls": len(self.calls), "throttled": self.throttled, "by_method": by_method}
+
+    def _params(self, h: _Handler) -> Dict[str, str]:
+        parts = urlsplit(h.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        body = h._body()
+        ctype = h.headers.get("Content-Type", "")
+        if body and "x-www-form-urlencoded" in ctype:
+            params.update({k: v[-1] for k, v in parse_qs(body.decode("utf-8", "replace")).items()})
+        elif body and "json" in ctype:
+            try:
+                params.update(json.loads(body))
+            except ValueError:
+                pass
+        return params
+
+    def serve(self, h: _Handler) -> None:
+        method = urlsplit(h.path).path.rsplit("/", 1)[-1]
+        params = self._params(h)
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if method != "getMe" and self.rate_429 and self.rnd.random() < self.rate_429:
+                self.throttled += 1
+                throttled = True
+            else:
+                throttled = False
+                self.calls.append((time.monotonic(), method, params.get("chat_id")))
+                self.message_id += 1
+                mid = self.message_id
+        if throttled:
+            return h._send(429, {
+                "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+        h._send(200, {"ok": True, "result": self._result(method, params, mid)})
+
+    @staticmethod
+    def _result(method: str, params: Dict[str, Any], mid: int) -> Any:
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        if method == "getUpdates":
+            return []
+        if method in ("sendMessage", "sendDocument", "editMessageText", "editMessageReplyMarkup"):
+            try:
+                chat_id = int(params.get("chat_id") or 0)
+            except (TypeError, ValueError):
+                chat_id = 0
+            msg = {"message_id": mid, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+            if method == "sendDocument":
+                msg["document"] = {"file_id": f"doc{mid}", "file_unique_id": f"u{mid}"}
+            else:
+                msg["text"] = params.get("text") or ""
+            return msg
+        return True
@@ -0,0 +1,255 @@
+# Нагрузочный прогон бота против локальных заглушек (bench/fakes.py).
+# Родитель поднимает FakeWordPress и FakeBotAPI, каждый сценарий идёт в отдельном
+# процессе (чистые кеши/состояние и честный RSS), синтетические апдейты подаются
+# в bot.process_new_updates с --concurrency потоков, как это делает webhook-пул.
+# Запуск из корня репозитория:
+#   python bench/load_test.py [--scenarios start,view_teacher,...] [--updates N] [--tg-429 0.05]
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import resource
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("start", "admin_pending", "view_teacher", "teacher_menu", "set_grade", "mixed", "poll")
+ADMIN_BASE = 500000  # uid синтетических админов; у преподавателей — FakeWordPress.teacher_chat
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def _rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # Linux: КиБ
+
+# =========================
+# Дочерний процесс: один сценарий
+# =========================
+
+class _Updates:
+    def __init__(self):
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def _next(self) -> int:
+        with self.lock:
+            self.seq += 1
+            return self.seq
+
+    def _user(self, uid: int) -> Dict[str, Any]:
+        return {"id": uid, "is_bot": False, "first_name": f"u{uid}"}
+
+    def message(self, uid: int, text: str) -> Dict[str, Any]:
+        n = self._next()
+        msg = {"message_id": n, "date": int(time.time()), "chat": {"id": uid, "type": "private"},
+               "from": self._user(uid), "text": text}
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": n, "message": msg}
+
+    def callback(self, uid: int, data: str) -> Dict[str, Any]:
+        n = self._next()
+        return {"update_id": n, "callback_query": {
+            "id": str(n), "from": self._user(uid), "chat_instance": "bench", "data": data,
+            "message": {"message_id": n, "date": int(time.time()), "chat": {"id": uid, "type": "private"},
+                        "from": self._user(1), "text": "card"},
+        }}
+
+def _child(args) -> Dict[str, Any]:
+    from telebot import apihelper, types
+    apihelper.API_URL = os.environ["BENCH_TG_URL"] + "/bot{0}/{1}"
+    import core
+    import handlers  # noqa: F401  регистрирует хендлеры
+    import poller
+    from api import COURSEWORK_SYNC
+    from store import COURSEWORK_STORE
+    from outbox import OUTBOX
+    from fakes import FakeWordPress
+
+    core.bot.threaded = False
+    OUTBOX.start()  # оценки уходят в WP фоном, как в боте
+    rnd = random.Random(args.seed)
+    gen = _Updates()
+    teachers, courseworks = args.teachers, args.courseworks
+    admins = [ADMIN_BASE + i for i in range(args.users)]
+    for uid in admins:
+        core.ADMIN_USERS.add(uid)
+    chats = [FakeWordPress.teacher_chat(t) for t in range(1, teachers + 1)]
+
+    if args.scenario == "poll":
+        return _child_poll(args, core, poller)
+
+    # Снимок курсовых без рассылки — хендлерам нужен готовый COURSEWORK_STORE
+    delta = COURSEWORK_SYNC.poll()
+    if delta is None:
+        raise RuntimeError("fake WordPress is not reachable")
+    COURSEWORK_STORE.apply(delta)
+
+    # Генераторы по сценариям: i -> dict апдейта. Пользователи идут по кругу,
+    # чтобы не упираться в антифлуд одного uid
+    def start(i):
+        return gen.message(admins[i % len(admins)] + 10 ** 6, "/start")
+
+    def admin_pending(i):
+        return gen.callback(admins[i % len(admins)], "admin_pending")
+
+    def view_teacher(i):
+        return gen.callback(admins[i % len(admins)], f"view_{rnd.randint(1, teachers)}")
+
+    def teacher_menu(i):
+        return gen.callback(chats[i % len(chats)], "teacher_main" if i % 2 else "manual_review_list")
+
+    def set_grade(i):
+        return gen.callback(chats[i % len(chats)], f"set_grade_{rnd.randint(1, courseworks)}_{rnd.randint(2, 5)}")
+
+    mix: List[Callable[[int], Dict[str, Any]]] = [start, admin_pending, view_teacher, view_teacher, teacher_menu, teacher_menu, set_grade]
+
+    def mixed(i):
+        return mix[i % len(mix)](i)
+
+    make = locals()[args.scenario]
+    updates = [types.Update.de_json(make(i)) for i in range(args.updates)]
+    latencies: List[float] = []
+    errors = [0]
+    lat_lock = threading.Lock()
+
+    def one(u):
+        t0 = time.perf_counter()
+        failed = False
+        try:
+            core.bot.process_new_updates([u])
+        except Exception:
+            failed = True
+        dt = time.perf_counter() - t0
+        with lat_lock:
+            latencies.append(dt)
+            errors[0] += failed
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, updates))
+    elapsed = time.perf_counter() - t0
+    return {
+        "updates": len(updates), "seconds": elapsed, "rate": len(updates) / elapsed if elapsed else 0.0,
+        "p50_ms": _pct(latencies, 50) * 1000, "p99_ms": _pct(latencies, 99) * 1000,
+        "errors": errors[0], "rss_mib": _rss_mib(),
+    }
+
+# Сценарий poll: _poll_loop крутится без паузы, между циклами заглушка меняет
+# --churn долю курсовых; латентность — длительность цикла (метрика POLL_SECONDS)
+def _child_poll(args, core, poller) -> Dict[str, Any]:
+    import urllib.request
+    from metrics import POLL_SECONDS
+
+    poller.POLL_INTERVAL = 0
+    cycles: List[float] = []
+    orig_observe = POLL_SECONDS.observe
+
+    def observe(value, **labels):
+        cycles.append(value)
+        orig_observe(value, **labels)
+        if len(cycles) >= args.cycles:
+            core.SHUTDOWN_EVENT.set()
+        elif args.churn > 0:
+            urllib.request.urlopen(os.environ["BENCH_WP_URL"] + f"/_churn?fraction={args.churn}").read()
+
+    POLL_SECONDS.observe = observe
+    t0 = time.perf_counter()
+    poller._poll_loop()
+    elapsed = time.perf_counter() - t0
+    core.SEND_SCHEDULER.stop(timeout=30)
+    return {
+        "updates": len(cycles), "seconds": elapsed, "rate": len(cycles) / elapsed if elapsed else 0.0,
+        "p50_ms": _pct(cycles, 50) * 1000, "p99_ms": _pct(cycles, 99) * 1000,
+        "errors": 0, "rss_mib": _rss_mib(),
+    }
+
+# =========================
+# Родитель: заглушки и отчёт
+# =========================
+
+def _run_scenario(args, scenario: str, wp, tg, workdir: str) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "1:bench", "API_BASE": wp.url, "WP_API_TOKEN": "", "WP_DELTA_PARAM": "modified_after",
+        "BENCH_TG_URL": tg.url, "BENCH_WP_URL": wp.url, "METRICS_PORT": "0",
+        "STATE_FILE": os.path.join(workdir, f"{scenario}.json"), "STATE_DB": os.path.join(workdir, f"{scenario}.db"),
+        "TG_GLOBAL_RATE": str(args.tg_rate), "TG_CHAT_RATE": str(args.tg_chat_rate),
+    })
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario] + [
+        f"--{k.replace('_', '-')}={v}" for k, v in vars(args).items()
+        if k in ("updates", "users", "concurrency", "teachers", "courseworks", "cycles", "churn", "seed")
+    ]
+    tg.reset()
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("RESULT ")]
+    if proc.returncode != 0 or not lines:
+        tail = "\n".join((proc.stderr or proc.stdout).splitlines()[-15:])
+        raise RuntimeError(f"scenario {scenario} failed:\n{tail}")
+    res = json.loads(lines[-1][len("RESULT "):])
+    res["tg"] = tg.stats()
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--updates", type=int, default=2000)
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--teachers", type=int, default=50)
+    ap.add_argument("--students", type=int, default=1000)
+    ap.add_argument("--courseworks", type=int, default=2000)
+    ap.add_argument("--files", type=int, default=0, help="вложений на курсовую")
+    ap.add_argument("--wp-latency", type=float, default=0.01)
+    ap.add_argument("--tg-latency", type=float, default=0.005)
+    ap.add_argument("--tg-429", type=float, default=0.0, help="доля вызовов Bot API с ответом 429")
+    ap.add_argument("--tg-rate", type=float, default=1000.0, help="TG_GLOBAL_RATE для бота (по умолчанию без упора в лимит)")
+    ap.add_argument("--tg-chat-rate", type=float, default=1000.0)
+    ap.add_argument("--cycles", type=int, default=20, help="циклов синхронизации в сценарии poll")
+    ap.add_argument("--churn", type=float, default=0.02, help="доля курсовых, меняющихся между циклами")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--child")
+    args = ap.parse_args()
+
+    if args.child:
+        args.scenario = args.child
+        print("RESULT " + json.dumps(_child(args)), flush=True)
+        os._exit(0)  # не ждать фоновые потоки бота
+
+    from fakes import FakeWordPress, FakeBotAPI
+    wp = FakeWordPress(args.teachers, args.students, args.courseworks, latency=args.wp_latency, files=args.files)
+    tg = FakeBotAPI(latency=args.tg_latency, rate_429=args.tg_429)
+    wp.start()
+    tg.start()
+    print(f"teachers={args.teachers} students={args.students} courseworks={args.courseworks} "
+          f"updates={args.updates} concurrency={args.concurrency} wp_latency={args.wp_latency}s "
+          f"tg_latency={args.tg_latency}s tg_429={args.tg_429}")
+    print(f"{'scenario':14s} {'n':>6s} {'rate/s':>9s} {'p50 ms':>8s} {'p99 ms':>8s} {'err':>4s} {'RSS MiB':>8s} {'tg calls':>9s} {'429':>5s}")
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        for scenario in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if scenario not in SCENARIOS:
+                print(f"{scenario:14s} unknown scenario")
+                continue
+            try:
+                r = _run_scenario(args, scenario, wp, tg, workdir)
+            except Exception as e:
+                print(f"{scenario:14s} {e}")
+                continue
+            print(f"{scenario:14s} {r['updates']:6d} {r['rate']:9.1f} {r['p50_ms']:8.1f} {r['p99_ms']:8.1f} "
+                  f"{r['errors']:4d} {r['rss_mib']:8.1f} {r['tg']['calls']:9d} {r['tg']['throttled']:5d}")
+    wp.stop()
+    tg.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# Прогон записанного трафика (RECORD_FILE, recorder.py) через хендлеры текущей версии.
+# WP API отвечает записанными ответами (fakes.RecordedWordPress), Bot API — заглушка,
+# считающая исходящие вызовы. Апдейты подаются в bot.process_new_updates в исходном
+# темпе (--speed 1), быстрее (--speed 10) или без пауз (--speed 0). Фоновая рассылка
+# не запускается: снимок курсовых берётся из первого записанного ответа.
+# Запуск из корня репозитория:
+#   python bench/replay.py traffic.jsonl --speed 0 --out new.json [--baseline old.json]
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeBotAPI, RecordedWordPress  # noqa: E402
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def load(path: str):
+    meta: Dict[str, Any] = {}
+    updates: List[Dict[str, Any]] = []
+    api: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            kind = rec.get("kind")
+            if kind == "meta":
+                meta.setdefault("admins", []).extend(rec.get("admins", []))
+            elif kind == "update":
+                updates.append(rec)
+            elif kind == "api":
+                api.append(rec)
+    updates.sort(key=lambda r: r["t"])
+    return meta, updates, api
+
+# Группа апдейта для отчёта: команда, "text" или callback_data с числами -> N
+def group_of(update: Dict[str, Any]) -> str:
+    cb = update.get("callback_query")
+    if cb:
+        return "cb:" + re.sub(r"-?\d+", "N", cb.get("data") or "")
+    msg = update.get("message") or update.get("edited_message")
+    if msg:
+        text = msg.get("text") or ""
+        return "msg:" + (text.split()[0] if text.startswith("/") else "text")
+    return "other"
+
+def replay(args) -> Dict[str, Any]:
+    meta, records, api = load(args.file)
+    wp = RecordedWordPress(api, latency=args.wp_latency).start()
+    tg = FakeBotAPI(latency=args.tg_latency).start()
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    os.environ.update({
+        "BOT_TOKEN": "1:replay", "API_BASE": wp.url, "WP_API_TOKEN": "", "METRICS_PORT": "0", "RECORD_FILE": "",
+        "STATE_FILE": os.path.join(workdir, "state.json"), "STATE_DB": os.path.join(workdir, "state.db"),
+        "ADMIN_PASSWORD": "<ADMIN_PASSWORD>",  # recorder.ADMIN_PASSWORD_MARK
+    })
+    if args.tg_rate:
+        os.environ["TG_GLOBAL_RATE"] = os.environ["TG_CHAT_RATE"] = str(args.tg_rate)
+
+    from telebot import apihelper, types
+    apihelper.API_URL = tg.url + "/bot{0}/{1}"
+    import core
+    import handlers  # noqa: F401  регистрирует хендлеры
+    from api import get_courseworks
+    from store import COURSEWORK_STORE
+    from outbox import OUTBOX
+
+    core.bot.threaded = False
+    OUTBOX.start()
+    for uid in meta.get("admins", []):
+        core.ADMIN_USERS.add(int(uid))
+    COURSEWORK_STORE.prime(get_courseworks())
+    tg.reset()
+
+    groups: Dict[str, List[float]] = {}
+    lock = threading.Lock()
+    errors = [0]
+
+    def one(rec: Dict[str, Any], due: float):
+        failed = False
+        try:
+            core.bot.process_new_updates([types.Update.de_json(rec["update"])])
+        except Exception as e:
+            failed = True
+            print(f"replay update error: {e}")
+        dt = time.perf_counter() - due  # включая ожидание свободного воркера
+        with lock:
+            groups.setdefault(group_of(rec["update"]), []).append(dt)
+            errors[0] += failed
+
+    t0 = time.perf_counter()
+    base = records[0]["t"] if records else 0.0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for rec in records:
+            if args.speed > 0:
+                due = t0 + (rec["t"] - base) / args.speed
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            else:
+                due = time.perf_counter()
+            pool.submit(one, rec, due)
+    wall = time.perf_counter() - t0
+    core.SEND_SCHEDULER.stop(timeout=30)
+    drain_until = time.monotonic() + 30  # дождаться отложенной записи оценок в WP
+    while OUTBOX.stats()["pending"] and time.monotonic() < drain_until:
+        time.sleep(0.05)
+    OUTBOX.stop()
+
+    everything = [x for v in groups.values() for x in v]
+    report = {
+        "file": os.path.basename(args.file), "updates": len(records), "wall_s": round(wall, 3),
+        "speed": args.speed, "errors": errors[0],
+        "overall": {"n": len(everything), "p50_ms": _pct(everything, 50) * 1000, "p99_ms": _pct(everything, 99) * 1000},
+        "groups": {
+            g: {"n": len(v), "p50_ms": _pct(v, 50) * 1000, "p99_ms": _pct(v, 99) * 1000}
+            for g, v in sorted(groups.items())
+        },
+        "bot_api": tg.stats()["by_method"],
+        "upstream": dict(sorted(wp.requests.items())),
+        "unrecorded": wp.misses,
+    }
+    wp.stop()
+    tg.stop()
+    return report
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "   new" if new else "     ="
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+def print_report(rep: Dict[str, Any], base: Dict[str, Any] = None) -> None:
+    print(f"{rep['file']}: {rep['updates']} updates in {rep['wall_s']}s (speed {rep['speed']}), errors {rep['errors']}")
+    rows = [("overall", rep["overall"])] + list(rep["groups"].items())
+    old_groups = dict([("overall", base["overall"])] + list(base["groups"].items())) if base else {}
+    print(f"{'group':32s} {'n':>6s} {'p50 ms':>9s} {'p99 ms':>9s}" + ("  p50 vs base  p99 vs base" if base else ""))
+    for g, st in rows:
+        line = f"{g[:32]:32s} {st['n']:6d} {st['p50_ms']:9.1f} {st['p99_ms']:9.1f}"
+        old = old_groups.get(g)
+        if old:
+            line += f"  {_delta(old['p50_ms'], st['p50_ms']):>11s}  {_delta(old['p99_ms'], st['p99_ms']):>11s}"
+        print(line)
+    print("Bot API calls:")
+    methods = sorted(set(rep["bot_api"]) | set((base or {}).get("bot_api", {})))
+    for m in methods:
+        n = rep["bot_api"].get(m, 0)
+        line = f"  {m:28s} {n:7d}"
+        if base:
+            line += f"  (base {base['bot_api'].get(m, 0)})"
+        print(line)
+    if rep["unrecorded"]:
+        print(f"unrecorded upstream requests: {sum(rep['unrecorded'].values())} "
+              f"(e.g. {', '.join(list(rep['unrecorded'])[:3])})")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("file", help="JSONL, записанный с RECORD_FILE")
+    ap.add_argument("--speed", type=float, default=1.0, help="1 — исходный темп, N — в N раз быстрее, 0 — без пауз")
+    ap.add_argument("--concurrency", type=int, default=8, help="воркеров, как WEBHOOK_WORKERS")
+    ap.add_argument("--wp-latency", type=float, default=0.0, help="задержка записанных ответов WP API (с)")
+    ap.add_argument("--tg-latency", type=float, default=0.0)
+    ap.add_argument("--tg-rate", type=float, default=0.0, help="TG_GLOBAL_RATE/TG_CHAT_RATE; 0 — значения бота")
+    ap.add_argument("--out", help="сохранить отчёт в JSON")
+    ap.add_argument("--baseline", help="отчёт прошлой версии для сравнения")
+    args = ap.parse_args()
+
+    rep = replay(args)
+    base = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            base = json.load(fh)
+    print_report(rep, base)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(rep, fh, ensure_ascii=False, indent=2)
+    os._exit(0)  # не ждать фоновые потоки бота
+
+if __name__ == "__main__":
+    main()
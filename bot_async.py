@@ -0,0 +1,198 @@
+import time
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot import asyncio_helper
+from telebot.asyncio_helper import ApiTelegramException
+
+import config as cfg
+import api_async
+import screens
+import views
+from metrics import POLL_SECONDS, metered_bot_api
+from core import SHUTDOWN_EVENT, CallbackRouter
+from store import COURSEWORK_STORE, TEACHER_INDEX, cached_teacher_for_chat, settle_teacher_for_chat
+from poller import process_delta, poll_backoff
+from lanes import AsyncUpdateLanes
+
+# Движок на asyncio (BOT_ENGINE=async): AsyncTeleBot + aiohttp-клиент api_async.
+# Все хендлеры — корутины в одном цикле событий, запросы к API и Telegram не
+# занимают потоков. Логика экранов, состояние, кеши, снимок курсовых и тексты —
+# общие с потоковым движком (screens, core, store, views); здесь только порт
+# ввода-вывода для screens. Рассылка вложений по-прежнему идёт
+# через SEND_SCHEDULER и пул загрузок: process_delta уводится в поток.
+abot = AsyncTeleBot(cfg.BOT_TOKEN)
+asyncio_helper._process_request = metered_bot_api(asyncio_helper._process_request)
+CALLBACKS = CallbackRouter()
+CALLBACKS.install(abot)
+
+# Фоновые задачи цикла событий — держим ссылки, пока не завершатся
+_TASKS: Set["asyncio.Task"] = set()
+
+def _spawn(coro) -> "asyncio.Task":
+    task = asyncio.ensure_future(coro)
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
+    return task
+
+# Вызов Bot API с повтором после 429 (retry_after из ответа)
+async def tg_call(fn, *args, attempts: int = 3, **kwargs):
+    for attempt in range(attempts):
+        try:
+            return await fn(*args, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code != 429 or attempt + 1 >= attempts:
+                raise
+            retry = ((e.result_json or {}).get("parameters") or {}).get("retry_after", 1)
+            await asyncio.sleep(min(float(retry), 30.0))
+
+async def send_message(chat_id: int, text: str, **kwargs):
+    return await tg_call(abot.send_message, chat_id, text, **kwargs)
+
+# Перестройки индекса преподавателей из корутин идут по одной
+_INDEX_REBUILD: Optional[asyncio.Lock] = None
+
+async def teacher_from_chat(chat_id: int) -> Optional[Dict[str, Any]]:
+    global _INDEX_REBUILD
+    fresh, cached = cached_teacher_for_chat(chat_id)
+    if fresh:
+        return cached
+    hit = TEACHER_INDEX.cached(chat_id)
+    if hit is None:
+        if _INDEX_REBUILD is None:
+            _INDEX_REBUILD = asyncio.Lock()
+        seen = TEACHER_INDEX.built_at
+        async with _INDEX_REBUILD:
+            if TEACHER_INDEX.built_at == seen and not TEACHER_INDEX.rebuild_from(await api_async.get_teachers()):
+                hit = (False, None)
+        if hit is None:
+            hit = TEACHER_INDEX.settle(chat_id)
+    resolved, teacher = hit
+    return settle_teacher_for_chat(chat_id, resolved, teacher, cached)
+
+async def ensure_store_ready(timeout: float = 3.0) -> bool:
+    # Поллер наполняет снимок первым циклом; если он ещё не успел — грузим список сами
+    for _ in range(int(timeout / 0.05)):
+        if COURSEWORK_STORE.ready.is_set():
+            return True
+        await asyncio.sleep(0.05)
+    if COURSEWORK_STORE.ready.is_set():
+        return True
+    cws = await api_async.get_courseworks()
+    if not cws:
+        return False
+    COURSEWORK_STORE.prime(cws)
+    return True
+
+# Ввод-вывод экранов из screens: Bot API — корутины AsyncTeleBot (отправка с
+# повтором после 429), данные — api_async
+class Port:
+    # Bot API
+    async def send(self, chat_id, text, **kwargs):
+        return await send_message(chat_id, text, **kwargs)
+
+    async def reply(self, msg, text, **kwargs):
+        return await tg_call(abot.reply_to, msg, text, **kwargs)
+
+    async def edit(self, call, text, **kwargs):
+        return await abot.edit_message_text(text, call.message.chat.id, call.message.message_id, **kwargs)
+
+    async def answer(self, call, text=None, **kwargs):
+        return await abot.answer_callback_query(call.id, text, **kwargs)
+
+    async def clear_markup(self, call):
+        try:
+            await abot.edit_message_reply_markup(call.message.chat.id, call.message.message_id)
+        except Exception:
+            pass
+
+    async def delete(self, chat_id, message_id):
+        try:
+            await abot.delete_message(chat_id, message_id)
+        except Exception:
+            pass
+
+    # Данные
+    async def teachers(self):
+        return await api_async.get_teachers()
+
+    async def teacher(self, tid):
+        return await api_async.get_teacher(tid)
+
+    async def student(self, sid):
+        return await api_async.get_student(sid)
+
+    async def coursework(self, cw_id):
+        return await api_async.get_coursework(cw_id)
+
+    async def teacher_with_students(self, tid, student_ids):
+        return tuple(await asyncio.gather(api_async.get_teacher(tid), api_async.get_students(student_ids)))
+
+    async def teacher_for_chat(self, chat_id):
+        return await teacher_from_chat(chat_id)
+
+    async def store_ready(self):
+        return await ensure_store_ready()
+
+screens.install(abot, CALLBACKS, Port(), screens.async_handler)
+
+# =========================
+# Фоновый поллер и запуск
+# =========================
+
+async def _sleep_unless_shutdown(seconds: float) -> None:
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    while not SHUTDOWN_EVENT.is_set() and loop.time() < end:
+        await asyncio.sleep(min(0.5, end - loop.time()))
+
+# Синхронизация через aiohttp; рассылка (загрузки, планировщик отправок) — в потоке
+async def poll_task() -> None:
+    err = 0
+    while not SHUTDOWN_EVENT.is_set():
+        t0 = time.perf_counter()
+        try:
+            delta = await api_async.poll_courseworks()
+            if delta is None:
+                raise RuntimeError("courseworks sync failed")
+            await asyncio.to_thread(process_delta, delta)
+            err = 0
+        except Exception as e:
+            err += 1
+            print(f"[poll] error (#{err}): {e}")
+        POLL_SECONDS.observe(time.perf_counter() - t0, result="error" if err else "ok")
+        await _sleep_unless_shutdown(poll_backoff(err))
+
+def _reject_update(update, reason: str) -> None:
+    cb, chat_id, text = views.shed_reply(update, reason)
+    if cb is not None:
+        _spawn(_quiet(abot.answer_callback_query(cb.id, text)))
+    elif chat_id is not None:
+        _spawn(_quiet(send_message(chat_id, text)))
+
+async def _quiet(coro) -> None:
+    try:
+        await coro
+    except Exception as e:
+        print(f"reject reply error: {e}")
+
+async def run() -> None:
+    lanes = AsyncUpdateLanes(
+        cfg.UPDATE_LANES, name="updates", max_depth=cfg.UPDATE_QUEUE_MAX,
+        cb_deadline=cfg.UPDATE_DEADLINE_CB, msg_deadline=cfg.UPDATE_DEADLINE_MSG, on_reject=_reject_update,
+    )
+    lanes.install(abot)
+    poller = _spawn(poll_task())
+    polling = _spawn(abot.infinity_polling(timeout=10, request_timeout=70))
+    shutdown = _spawn(_sleep_unless_shutdown(float("inf")))
+    try:
+        await asyncio.wait({polling, shutdown}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        SHUTDOWN_EVENT.set()
+        for task in (poller, polling, shutdown):
+            task.cancel()
+        await asyncio.gather(poller, polling, shutdown, return_exceptions=True)
+        await lanes.stop()
+        await api_async.close()
+        await abot.close_session()
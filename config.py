@@ -13,6 +13,67 @@ BOT_TOKEN = _env("BOT_TOKEN")
 WP_API_TOKEN = _env("WP_API_TOKEN")
 ADMIN_PASSWORD = _env("ADMIN_PASSWORD", "StartFitAdmin2025")
 API_BASE = _env("API_BASE", "https://dev.start-fit.online/app/wp-json/startfitonline/v1").rstrip("/")
+# Имя query-параметра "изменено после" у /courseworks (пусто — плагин его не поддерживает)
+WP_DELTA_PARAM = _env("WP_DELTA_PARAM")
+# Кеш преподавателей/студентов: время жизни записи (с) и максимум записей
+ENTITY_CACHE_TTL = float(_env("ENTITY_CACHE_TTL", "300"))
+ENTITY_CACHE_SIZE = int(_env("ENTITY_CACHE_SIZE", "2048"))
+# Кеш Telegram file_id вложений (LRU): сколько записей держать в памяти и в хранилище состояния
+FILE_ID_CACHE_SIZE = int(_env("FILE_ID_CACHE_SIZE", "5000"))
+# Индекс chat_id -> преподаватель: период перестройки и время жизни негативного кеша (с)
+TEACHER_INDEX_TTL = float(_env("TEACHER_INDEX_TTL", "300"))
+TEACHER_NEGATIVE_TTL = float(_env("TEACHER_NEGATIVE_TTL", "120"))
+# Вложения: сколько держать в RAM до сброса на диск, общий бюджет байт на все загрузки и ожидание бюджета (с)
+DL_SPOOL_BYTES = int(_env("DL_SPOOL_BYTES", str(1024 * 1024)))
+DL_BUDGET_BYTES = int(_env("DL_BUDGET_BYTES", str(64 * 1024 * 1024)))
+DL_BUDGET_WAIT = float(_env("DL_BUDGET_WAIT", "120"))
+# Пул загрузок вложений: потоков, соединений на хост, время жизни кеша HEAD (с)
+DL_WORKERS = int(_env("DL_WORKERS", "6"))
+DL_PER_HOST = int(_env("DL_PER_HOST", "4"))
+DL_HEAD_TTL = float(_env("DL_HEAD_TTL", "300"))
+# Параметр batch-выборки по id (`students?include=1,2`), включается явно; пусто — только
+# веер одиночных запросов. Эндпоинт, вернувший незапрошенные id, считается неподдерживающим
+WP_BATCH_PARAM = _env("WP_BATCH_PARAM", "")
+# Сколько одиночных запросов к API выполнять параллельно
+API_FANOUT = int(_env("API_FANOUT", "8"))
+# Асинхронный движок: общий лимит одновременных запросов к API (размер пула aiohttp)
+API_CONCURRENCY = int(_env("API_CONCURRENCY", "32"))
+# Бюджет времени на запросы к API при обработке одного апдейта (с, 0 — без ограничения)
+API_DEADLINE = float(_env("API_DEADLINE", "8"))
+# Автомат на эндпоинт API: неудач подряд до размыкания и пауза до пробного запроса (с)
+API_BREAKER_FAILURES = int(_env("API_BREAKER_FAILURES", "5"))
+API_BREAKER_RESET = float(_env("API_BREAKER_RESET", "30"))
+# Отложенная запись статусов/оценок: максимальная пауза между повторами (с) и
+# число попыток, после которого правка отбрасывается, а преподаватель получает уведомление
+OUTBOX_RETRY_MAX = float(_env("OUTBOX_RETRY_MAX", "300"))
+OUTBOX_MAX_ATTEMPTS = int(_env("OUTBOX_MAX_ATTEMPTS", "12"))
+
+# Приём апдейтов: polling (long polling) или webhook (локальный HTTP-сервер за обратным прокси)
+BOT_MODE = _env("BOT_MODE", "polling").lower()
+# Движок обработки: threaded (TeleBot + пулы потоков) или async (AsyncTeleBot + aiohttp)
+BOT_ENGINE = _env("BOT_ENGINE", "threaded").lower()
+WEBHOOK_URL = _env("WEBHOOK_URL").rstrip("/")  # публичный https-адрес, без пути
+WEBHOOK_PATH = "/" + _env("WEBHOOK_PATH", "telegram/webhook").lstrip("/")
+WEBHOOK_LISTEN = _env("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(_env("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = _env("WEBHOOK_SECRET")  # пусто — случайный на каждый запуск
+WEBHOOK_WORKERS = int(_env("WEBHOOK_WORKERS", "8"))
+# Полос обработки апдейтов: апдейты одного чата — по очереди, разных чатов — параллельно
+UPDATE_LANES = max(1, int(_env("UPDATE_LANES", "8")))
+# Допуск апдейтов: глубина полосы, сверх которой новый апдейт сразу получает "занято" (0 — без предела),
+# и сколько апдейт может прождать в полосе (с): callback — меньше, Telegram ждёт ответа ~15 с
+UPDATE_QUEUE_MAX = int(_env("UPDATE_QUEUE_MAX", "50"))
+UPDATE_DEADLINE_CB = float(_env("UPDATE_DEADLINE_CB", "10"))
+UPDATE_DEADLINE_MSG = float(_env("UPDATE_DEADLINE_MSG", "60"))
+WEBHOOK_SSL_CERT = _env("WEBHOOK_SSL_CERT")
+WEBHOOK_SSL_KEY = _env("WEBHOOK_SSL_KEY")
+# Курсовых на странице в списках преподавателя и ручной проверки
+PAGE_SIZE = max(1, int(_env("PAGE_SIZE", "10")))
+# Запись входящих апдейтов и ответов WP API в обезличенный JSONL (для bench/replay.py); пусто — выключено
+RECORD_FILE = _env("RECORD_FILE")
+# Эндпоинт метрик Prometheus (GET /metrics); порт 0 — выключен
+METRICS_LISTEN = _env("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(_env("METRICS_PORT", "9108"))
 
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN is not set in .env")
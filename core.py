@@ -1,18 +1,27 @@
 from __future__ import annotations
 
 import os
-import json
+import re
 import time
-import tempfile
+import heapq
+import inspect
 import threading
-from typing import Dict, Any, Set, List, Optional
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Any, Set, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from telebot import TeleBot, types
+import requests
+from telebot import TeleBot, types, apihelper
+from telebot.apihelper import ApiTelegramException
 import config as cfg  # исправленный импорт модуля целиком
+from storage import CompactIdSet, make_backend
+from ratelimit import RateLimiter
+from metrics import metered_bot_api, register_collector
 
 # Экспортируемые объекты и синхронизация
 bot = TeleBot(cfg.BOT_TOKEN)
+# Все вызовы Bot API синхронного бота проходят через apihelper._make_request — там и замеряем
+apihelper._make_request = metered_bot_api(apihelper._make_request)
 STATE_FILE = os.getenv("STATE_FILE", "state.json")
 STATE_LOCK = threading.RLock()
 SHUTDOWN_EVENT = threading.Event()
@@ -26,135 +35,475 @@ STATUS_CHECKED = "Проверено"
 STATUS_REJECTED = "Отклонено"
 POSSIBLE_CHAT_FIELDS = ["telegram_chat_id", "tg_chat_id", "chat_id", "telegram_id", "tg_id"]
 
-# Состояние (с подкачкой из файла)
-SENT_COURSEWORK_IDS: Set[str] = set()
+# Состояние (с подкачкой из хранилища)
+SENT_COURSEWORK_IDS = CompactIdSet()
 TEACHER_CACHE_BY_CHAT: Dict[str, Dict[str, Any]] = {}
 ADMIN_USERS: Set[int] = set()
 
+# journal — state.json + журнал изменений, sqlite — state.db в режиме WAL
+STATE_BACKEND = make_backend(
+    os.getenv("STATE_BACKEND", "journal"), STATE_FILE, os.getenv("STATE_DB", "state.db"),
+)
+# Прочие модули регистрируют свои коллекции для снимка при компакции
+_STATE_COLLECTIONS: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_LOADED_COLLECTIONS: Dict[str, Dict[str, Any]] = {}
+
+def register_state_collection(name: str, snapshot_fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    _STATE_COLLECTIONS[name] = snapshot_fn
+    return _LOADED_COLLECTIONS.get(name, {})
+
+def _state_snapshot() -> Dict[str, Dict[str, Any]]:
+    with STATE_LOCK:
+        data = {name: items for name, items in _LOADED_COLLECTIONS.items() if name not in _STATE_COLLECTIONS}
+        data.update({name: fn() for name, fn in _STATE_COLLECTIONS.items()})
+    return data
+
 def _load_state() -> None:
     global SENT_COURSEWORK_IDS, TEACHER_CACHE_BY_CHAT, ADMIN_USERS
     try:
-        if not os.path.exists(STATE_FILE):
-            return
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = STATE_BACKEND.load()
+        _LOADED_COLLECTIONS.update(data)
         with STATE_LOCK:
-            SENT_COURSEWORK_IDS = set(map(str, data.get("sent_coursework_ids", [])))
-            TEACHER_CACHE_BY_CHAT = {
-                str(k): v for k, v in (data.get("teacher_cache_by_chat") or {}).items() if isinstance(v, dict)
-            }
-            ADMIN_USERS = set(int(x) for x in data.get("admin_users", []))
+            # упакованный снимок + изменения из журнала (False — id вычищен)
+            SENT_COURSEWORK_IDS = CompactIdSet.unpack(data.get("sent_packed", {}).get("v"))
+            for cw_id, present in data.get("sent", {}).items():
+                if present:
+                    SENT_COURSEWORK_IDS.add(cw_id)
+                else:
+                    SENT_COURSEWORK_IDS.discard(cw_id)
+            TEACHER_CACHE_BY_CHAT = {k: v for k, v in data.get("teachers", {}).items() if isinstance(v, dict)}
+            ADMIN_USERS = set(int(x) for x in data.get("admins", {}))
     except Exception as e:
         print(f"state load error: {e}")
 
+def _persist(op: str, collection: str, key: str, value: Any = True) -> None:
+    # Вызывать без STATE_LOCK: компакция берёт его внутри блокировки хранилища
+    try:
+        if op == "put":
+            STATE_BACKEND.put(collection, key, value)
+        else:
+            STATE_BACKEND.delete(collection, key)
+    except Exception as e:
+        print(f"state {op} {collection} error: {e}")
+
+def mark_sent(cw_id: str) -> None:
+    with STATE_LOCK:
+        if cw_id in SENT_COURSEWORK_IDS:
+            return
+        SENT_COURSEWORK_IDS.add(cw_id)
+    _persist("put", "sent", cw_id)
+
+# Сколько полных синхронизаций подряд отправленного id не было в API
+_SENT_MISSING: Dict[str, int] = {}
+
+# Вычистить id, которых нет в API prune_after полных снимков подряд (вызывать
+# только на полученном полном списке, не на 304). Пустой или намного меньший
+# отправленного список (меньше min_alive от него) — сбой выдачи, а не удаление:
+# такой снимок не учитывается, иначе следующий разошлёт все карточки заново
+def prune_sent(alive_ids, prune_after: int = 3, min_alive: float = 0.5) -> int:
+    alive = set(map(str, alive_ids))
+    with STATE_LOCK:
+        if not alive or len(alive) < len(SENT_COURSEWORK_IDS) * min_alive:
+            print(f"sent prune skipped: {len(alive)} alive vs {len(SENT_COURSEWORK_IDS)} sent")
+            return 0
+        counts = {x: _SENT_MISSING.get(x, 0) + 1 for x in SENT_COURSEWORK_IDS if x not in alive}
+        _SENT_MISSING.clear()
+        removed = []
+        for cw_id, n in counts.items():
+            if n >= prune_after:
+                SENT_COURSEWORK_IDS.discard(cw_id)
+                removed.append(cw_id)
+            else:
+                _SENT_MISSING[cw_id] = n
+    for cw_id in removed:
+        _persist("put", "sent", cw_id, False)
+    return len(removed)
+
+# Без блокировки: проверка членства в set атомарна, add_admin меняет его под STATE_LOCK
+def is_admin(uid: int) -> bool:
+    return uid in ADMIN_USERS
+
+def add_admin(uid: int) -> None:
+    with STATE_LOCK:
+        if uid in ADMIN_USERS:
+            return
+        ADMIN_USERS.add(uid)
+    _persist("put", "admins", str(uid))
+
+def cache_teacher(chat_key: str, teacher: Optional[Dict[str, Any]]) -> None:
+    with STATE_LOCK:
+        if teacher is None:
+            if TEACHER_CACHE_BY_CHAT.pop(chat_key, None) is None:
+                return
+        elif TEACHER_CACHE_BY_CHAT.get(chat_key) == teacher:
+            return
+        else:
+            TEACHER_CACHE_BY_CHAT[chat_key] = teacher
+    if teacher is None:
+        _persist("delete", "teachers", chat_key)
+    else:
+        _persist("put", "teachers", chat_key, teacher)
+
+# Кеш Telegram file_id загруженных вложений: "url|валидатор|размер" -> file_id.
+# LRU на FILE_ID_CACHE_SIZE записей; вытесненные удаляются и из хранилища
+FILE_ID_CACHE: "OrderedDict[str, str]" = OrderedDict()
+
+def cached_file_id(key: str) -> Optional[str]:
+    with STATE_LOCK:
+        file_id = FILE_ID_CACHE.get(key)
+        if file_id is not None:
+            FILE_ID_CACHE.move_to_end(key)
+        return file_id
+
+def _trim_file_ids() -> List[str]:
+    evicted = []
+    while len(FILE_ID_CACHE) > cfg.FILE_ID_CACHE_SIZE:
+        evicted.append(FILE_ID_CACHE.popitem(last=False)[0])
+    return evicted
+
+def remember_file_id(key: str, file_id: str) -> None:
+    with STATE_LOCK:
+        if FILE_ID_CACHE.get(key) == file_id:
+            FILE_ID_CACHE.move_to_end(key)
+            return
+        FILE_ID_CACHE[key] = file_id
+        FILE_ID_CACHE.move_to_end(key)
+        evicted = _trim_file_ids()
+    _persist("put", "file_ids", key, file_id)
+    for old in evicted:
+        _persist("delete", "file_ids", old)
+
+def forget_file_id(key: str) -> None:
+    with STATE_LOCK:
+        if FILE_ID_CACHE.pop(key, None) is None:
+            return
+    _persist("delete", "file_ids", key)
+
+# Полный снимок (компакция журнала / checkpoint WAL) — при остановке
 def save_state() -> None:
     try:
-        with STATE_LOCK:
-            data = {
-                "sent_coursework_ids": list(SENT_COURSEWORK_IDS),
-                "teacher_cache_by_chat": TEACHER_CACHE_BY_CHAT,
-                "admin_users": list(ADMIN_USERS),
-            }
-        fd, tmp_path = tempfile.mkstemp(prefix="state.", suffix=".json", dir=os.path.dirname(STATE_FILE) or ".")
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, STATE_FILE)
+        STATE_BACKEND.compact()
     except Exception as e:
         print(f"state save error: {e}")
 
 _load_state()
-
-# Антифлуд
-class RateLimiter:
-    def __init__(self, limits: dict):
-        self.limits = limits
-        self.state: Dict[tuple[int, str], Dict[str, Any]] = {}
-        self.dups: Dict[int, Dict[str, Any]] = {}
-        self.lock = threading.RLock()
-
-    def _now(self) -> float:
-        return time.time()
-
-    def allow(self, uid: int, kind: str) -> tuple[bool, int]:
-        with self.lock:
-            now = self._now()
-            key = (int(uid), kind)
-            st = self.state.get(key)
-            if not st:
-                st = {'ts': [], 'blocked_until': 0.0}
-                self.state[key] = st
-
-            if now < st['blocked_until']:
-                return False, int(st['blocked_until'] - now) + 1
-
-            long_n, long_win = self.limits[kind]['long']
-            st['ts'] = [t for t in st['ts'] if now - t <= long_win]
-
-            short_n, short_win = self.limits[kind]['short']
-            cnt_short = sum(1 for t in st['ts'] if now - t <= short_win)
-            cnt_long = len(st['ts'])
-
-            if cnt_short >= short_n or cnt_long >= long_n:
-                st['blocked_until'] = now + self.limits[kind]['cooldown']
-                return False, int(st['blocked_until'] - now) + 1
-
-            st['ts'].append(now)
-            return True, 0
-
-    def is_duplicate(self, uid: int, text: Optional[str], window_sec: float = 2.0) -> bool:
-        if not text:
-            return False
-        with self.lock:
-            now = self._now()
-            h = hash(text)
-            prev = self.dups.get(uid)
-            if prev and prev.get('last_hash') == h and (now - prev.get('last_at', 0)) < window_sec:
-                return True
-            self.dups[uid] = {'last_hash': h, 'last_at': now}
-            return False
-
+register_state_collection("sent_packed", lambda: {"v": SENT_COURSEWORK_IDS.pack()})
+register_state_collection("sent", dict)
+register_state_collection("teachers", lambda: dict(TEACHER_CACHE_BY_CHAT))
+register_state_collection("admins", lambda: {str(u): True for u in ADMIN_USERS})
+FILE_ID_CACHE.update(register_state_collection("file_ids", lambda: dict(FILE_ID_CACHE)))
+with STATE_LOCK:
+    _evicted = _trim_file_ids()  # лимит уменьшили с прошлого запуска
+for _key in _evicted:
+    _persist("delete", "file_ids", _key)
+STATE_BACKEND.bind(_state_snapshot)
+
+# Исходящая отправка в Telegram: глобальный и поканальный token bucket,
+# полосы приоритета (интерактивные ответы раньше массовых рассылок) и повтор
+# с учётом retry_after на 429. Сообщения одного чата уходят строго по очереди.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+class _SendJob:
+    __slots__ = ("chat_id", "priority", "fn", "args", "kwargs", "future", "attempts")
+
+    def __init__(self, chat_id, priority, fn, args, kwargs):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.attempts = 0
+
+class SendScheduler:
+    SCAN_LIMIT = 256
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 workers: int = 8, max_attempts: int = 5):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.cond = threading.Condition()
+        self.lanes: List[deque] = [deque(), deque()]
+        self.chat_buckets: Dict[Any, TokenBucket] = {}
+        self.paused_until: Dict[Any, float] = {}
+        self.global_paused_until = 0.0
+        self.inflight: Set[Any] = set()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tg-send")
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = False
+        self.closed = False
+
+    def submit(self, chat_id, fn, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Future:
+        job = _SendJob(chat_id, priority, fn, args, kwargs)
+        with self.cond:
+            if self.closed:
+                job.future.set_exception(RuntimeError("send scheduler stopped"))
+                return job.future
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="tg-send-dispatch")
+                self.thread.start()
+            self.lanes[priority].append(job)
+            self.cond.notify()
+        return job.future
+
+    def call(self, chat_id, fn, *args, priority: int = PRIORITY_INTERACTIVE, timeout: float = 120, **kwargs):
+        return self.submit(chat_id, fn, *args, priority=priority, **kwargs).result(timeout)
+
+    def queue_depth(self) -> Dict[str, int]:
+        with self.cond:
+            return {"interactive": len(self.lanes[0]), "bulk": len(self.lanes[1]), "inflight": len(self.inflight)}
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        b = self.chat_buckets.get(chat_id)
+        if b is None:
+            if len(self.chat_buckets) > 10000:
+                now = time.monotonic()
+                for k in [k for k, v in self.chat_buckets.items() if now - v.last > 60]:
+                    del self.chat_buckets[k]
+            b = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return b
+
+    # Первая готовая задача по приоритету или (None, сколько ждать)
+    def _pick(self, now: float):
+        if not any(self.lanes):
+            return None, None
+        wait = max(self.global_bucket.wait_time(now), self.global_paused_until - now)
+        if wait > 0:
+            return None, wait
+        best_wait = None
+        for lane in self.lanes:
+            blocked: Set[Any] = set()
+            for i, job in enumerate(lane):
+                if i >= self.SCAN_LIMIT:
+                    break
+                chat = job.chat_id
+                if chat in blocked or chat in self.inflight:
+                    blocked.add(chat)
+                    continue
+                w = max(self._chat_bucket(chat).wait_time(now), self.paused_until.get(chat, 0.0) - now)
+                if w > 0:
+                    blocked.add(chat)
+                    best_wait = w if best_wait is None else min(best_wait, w)
+                    continue
+                del lane[i]
+                self.global_bucket.take(now)
+                self._chat_bucket(chat).take(now)
+                self.paused_until.pop(chat, None)
+                return job, None
+        return None, best_wait
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                if self.closed:
+                    return
+                job, wait = self._pick(time.monotonic())
+                if job is None:
+                    if self.stopping and not any(self.lanes):
+                        return
+                    self.cond.wait(timeout=wait if wait is not None else 1.0)
+                    continue
+                self.inflight.add(job.chat_id)
+            try:
+                self.pool.submit(self._execute, job)
+            except RuntimeError as e:  # пул уже закрыт в stop()
+                with self.cond:
+                    self.inflight.discard(job.chat_id)
+                job.future.set_exception(e)
+
+    def _execute(self, job: _SendJob) -> None:
+        requeue, delay = False, 0.0
+        job.attempts += 1
+        try:
+            job.future.set_result(job.fn(*job.args, **job.kwargs))
+        except ApiTelegramException as e:
+            if e.error_code == 429 or e.error_code >= 500:
+                params = (e.result_json or {}).get("parameters") or {}
+                delay = float(params.get("retry_after") or 2 ** job.attempts)
+                requeue = job.attempts < self.max_attempts
+            if not requeue:
+                job.future.set_exception(e)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            delay = float(2 ** job.attempts)
+            requeue = job.attempts < self.max_attempts
+            if not requeue:
+                job.future.set_exception(e)
+        except Exception as e:
+            job.future.set_exception(e)
+        if requeue and self.closed:
+            job.future.set_exception(RuntimeError("send scheduler stopped"))
+            requeue = False
+        with self.cond:
+            self.inflight.discard(job.chat_id)
+            if requeue:
+                until = time.monotonic() + delay
+                self.paused_until[job.chat_id] = until
+                if delay > 5:
+                    # долгий retry_after — это уже глобальный флуд-контроль
+                    self.global_paused_until = max(self.global_paused_until, until)
+                self.lanes[job.priority].appendleft(job)
+            self.cond.notify()
+
+    # Досылает очередь не дольше timeout; задачи, которые так и не ушли (в том
+    # числе отложенные по retry_after), завершаются ошибкой — ждущие их
+    # send_message/reply_to не висят до собственного таймаута
+    def stop(self, timeout: float = 10.0) -> None:
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+            t = self.thread
+        if t is not None:
+            t.join(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self._fail_queued()
+        self.pool.shutdown(wait=True)
+        self._fail_queued()  # вернувшиеся на повтор, пока дорабатывал пул
+
+    def _fail_queued(self) -> None:
+        with self.cond:
+            jobs = [job for lane in self.lanes for job in lane]
+            for lane in self.lanes:
+                lane.clear()
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("send scheduler stopped"))
+
+SEND_SCHEDULER = SendScheduler(
+    global_rate=float(os.getenv("TG_GLOBAL_RATE", "30")),
+    chat_rate=float(os.getenv("TG_CHAT_RATE", "1")),
+)
+
+def send_message(chat_id, text, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+    return SEND_SCHEDULER.call(chat_id, bot.send_message, chat_id, text, priority=priority, **kwargs)
+
+def send_document(chat_id, document, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+    return SEND_SCHEDULER.call(chat_id, bot.send_document, chat_id, document, priority=priority, **kwargs)
+
+def reply_to(message, text, **kwargs):
+    return SEND_SCHEDULER.call(message.chat.id, bot.reply_to, message, text, **kwargs)
+
+# Антифлуд (ratelimit.RateLimiter: скользящее окно, полосы блокировок по uid,
+# вытеснение простаивающих ключей). (n, win) — не больше n событий за последние
+# win секунд; превышение любого окна блокирует ключ на cooldown секунд
 LIMITS = {
     'msg': {'short': (5, 10), 'long': (20, 60), 'cooldown': 30},
     'cb':  {'short': (10, 10), 'long': (60, 60), 'cooldown': 20},
 }
 RATE_LIMITER = RateLimiter(LIMITS)
 
-def anti_flood(kind: str = 'msg'):
-    def deco(func):
-        def wrapper(obj, *args, **kwargs):
-            try:
-                uid = getattr(getattr(obj, "from_user", None), "id", None)
-                chat = getattr(obj, "chat", None) or getattr(getattr(obj, "message", None), "chat", None)
-                chat_id = getattr(chat, "id", None)
-            except Exception:
-                uid, chat_id = None, None
-
-            if kind == 'msg':
-                text = getattr(obj, 'text', None)
-                if uid is not None and RATE_LIMITER.is_duplicate(uid, text):
-                    try:
-                        m = bot.send_message(chat_id, "⚠️ Повтор того же сообщения. Подождите немного.")
-                        auto_delete_message(chat_id, m.message_id, delay=3)
-                    except Exception:
-                        pass
-                    return
-
-            if uid is not None:
-                allowed, retry = RATE_LIMITER.allow(uid, kind)
-                if not allowed:
-                    try:
-                        if hasattr(obj, 'id'):
-                            bot.answer_callback_query(obj.id, f"⏳ Слишком часто. Подождите {retry} с.")
-                        if chat_id is not None:
-                            m = bot.send_message(chat_id, f"⏳ Слишком часто. Повторите через {retry} с.")
-                            auto_delete_message(chat_id, m.message_id, delay=min(6, retry + 1))
-                    except Exception:
-                        pass
-                    return
+# Маршрутизация callback_data. Один обработчик callback'ов на бота; маршруты —
+# шаблоны вида "start", "view_{tid}", "set_grade_{cw}_{grade:int}". Шаблоны без
+# параметров лежат в словаре, с параметрами — в префиксном дереве по литеральной
+# части до первой "{": поиск идёт по символам callback_data (не дольше 64 байт)
+# и не зависит от числа экранов. Из совпавших префиксов берётся самый длинный,
+# при равных — маршрут, зарегистрированный раньше, чьи параметры разобрались.
+_ROUTE_PARAM = re.compile(r"\{(\w+)(?::(\w+))?\}")
+_ROUTE_TYPES = {
+    "str": (r"[^_]+", str),
+    "int": (r"-?\d+", int),
+    "rest": (r".+", str),
+}
 
-            return func(obj, *args, **kwargs)
-        return wrapper
-    return deco
+class CallbackRouter:
+    def __init__(self):
+        self.exact: Dict[str, Callable] = {}
+        self.trie: Dict[str, Any] = {}  # символ -> узел; узел["routes"] — маршруты с этим префиксом
+
+    @staticmethod
+    def _compile(pattern: str):
+        prefix = pattern.split("{", 1)[0]
+        regex, convs, pos = [], {}, len(prefix)
+        for m in _ROUTE_PARAM.finditer(pattern, pos):
+            regex.append(re.escape(pattern[pos:m.start()]))
+            name, kind = m.group(1), m.group(2) or "str"
+            rx, conv = _ROUTE_TYPES[kind]
+            regex.append(f"(?P<{name}>{rx})")
+            convs[name] = conv
+            pos = m.end()
+        regex.append(re.escape(pattern[pos:]))
+        return prefix, re.compile("".join(regex) + r"\Z"), convs
+
+    def route(self, pattern: str):
+        def deco(func):
+            if "{" not in pattern:
+                self.exact[pattern] = func
+                return func
+            prefix, rx, convs = self._compile(pattern)
+            node = self.trie
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            node.setdefault("routes", []).append((rx, convs, func))
+            return func
+        return deco
+
+    # (обработчик, аргументы) или (None, None)
+    def match(self, data: str):
+        func = self.exact.get(data)
+        if func is not None:
+            return func, {}
+        found = []
+        node = self.trie
+        for i, ch in enumerate(data):
+            node = node.get(ch)
+            if node is None:
+                break
+            if "routes" in node:
+                found.append((i + 1, node["routes"]))
+        for cut, routes in reversed(found):
+            rest = data[cut:]
+            for rx, convs, func in routes:
+                m = rx.match(rest)
+                if m is None:
+                    continue
+                try:
+                    return func, {k: convs[k](v) for k, v in m.groupdict().items()}
+                except ValueError:
+                    continue
+        return None, None
+
+    def dispatch(self, call):
+        func, kwargs = self.match(call.data or "")
+        if func is None:
+            return None
+        return func(call, **kwargs)
+
+    # Единственная точка входа callback'ов бота (TeleBot или AsyncTeleBot)
+    def install(self, tg_bot) -> None:
+        if inspect.iscoroutinefunction(tg_bot.process_new_updates):
+            async def entry(call):
+                res = self.dispatch(call)
+                if inspect.isawaitable(res):
+                    await res
+            tg_bot.register_callback_query_handler(entry, func=None)
+        else:
+            tg_bot.register_callback_query_handler(self.dispatch, func=None)
+
+CALLBACKS = CallbackRouter()
+CALLBACKS.install(bot)
 
 # Утилиты и клавиатуры
 def _norm_ext(url_or_name: str) -> str:
@@ -217,6 +566,7 @@ def admin_main_menu() -> types.InlineKeyboardMarkup:
     kb = types.InlineKeyboardMarkup(row_width=1)
     kb.add(
         types.InlineKeyboardButton("⏳ В ожидании", callback_data="admin_pending"),
+        types.InlineKeyboardButton("📊 Статистика", callback_data="admin_stats"),
         types.InlineKeyboardButton("🔍 Поиск преподавателя", callback_data="admin_search"),
         types.InlineKeyboardButton("🔙 Главное меню", callback_data="start"),
     )
@@ -260,16 +610,175 @@ def teacher_chat_id_from_teacher(teacher: Dict[str, Any] | None) -> Optional[int
                 pass
     return None
 
-# Сервис: автоудаление сообщений
-def _delete_task(chat_id: int, message_id: int, delay: int):
-    time.sleep(delay)
-    try:
-        bot.delete_message(chat_id, message_id)
-    except Exception:
-        pass
+# Сервис: автоудаление сообщений.
+# Один поток и куча дедлайнов вместо спящих потоков пула: тысячи отложенных
+# удалений стоят по записи в куче. Сроки (unix-время) пишутся в коллекцию
+# "deletions" и поднимаются после рестарта. Удаления одного чата, наступившие
+# вместе или пока чат ждёт очереди, уходят одним deleteMessages через SEND_SCHEDULER.
+class DeletionScheduler:
+    BATCH = 100  # предел deleteMessages
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.heap: List[tuple[float, int, int]] = []  # (срок, chat_id, message_id)
+        self.pending: Dict[str, float] = {}  # "chat:msg" -> срок, для снимка состояния
+        self.open: Dict[int, List[int]] = {}  # чат -> удаления, ждущие отправки
+        self.jobs: Dict[int, int] = {}  # чат -> задач в SEND_SCHEDULER, ещё не забравших пачку
+        self.thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(chat_id: int, message_id: int) -> str:
+        return f"{chat_id}:{message_id}"
+
+    def _ensure_thread(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True, name="auto-delete")
+            self.thread.start()
+
+    def schedule(self, chat_id: int, message_id: int, delay: float) -> None:
+        deadline = time.time() + delay
+        key = self._key(chat_id, message_id)
+        with self.cond:
+            if key in self.pending:
+                return
+            self.pending[key] = deadline
+            heapq.heappush(self.heap, (deadline, int(chat_id), int(message_id)))
+            self._ensure_thread()
+            self.cond.notify()
+        _persist("put", "deletions", key, deadline)
+
+    # Отложенные удаления из хранилища (после рестарта просроченные уйдут сразу)
+    def restore(self, items: Dict[str, Any]) -> None:
+        with self.cond:
+            for key, deadline in items.items():
+                try:
+                    chat, msg = key.split(":", 1)
+                    entry = (float(deadline), int(chat), int(msg))
+                except (TypeError, ValueError):
+                    continue
+                self.pending[key] = entry[0]
+                heapq.heappush(self.heap, entry)
+            if self.heap:
+                self._ensure_thread()
+                self.cond.notify()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.cond:
+            return dict(self.pending)
+
+    def _pop_due(self, now: float) -> Dict[int, List[int]]:
+        due: Dict[int, List[int]] = {}
+        while self.heap and self.heap[0][0] <= now:
+            _, chat, msg = heapq.heappop(self.heap)
+            due.setdefault(chat, []).append(msg)
+        return due
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while not SHUTDOWN_EVENT.is_set():
+                    wait = self.heap[0][0] - time.time() if self.heap else 1.0
+                    if self.heap and wait <= 0:
+                        break
+                    self.cond.wait(min(wait, 1.0))
+                stopping = SHUTDOWN_EVENT.is_set()
+                # при остановке досрочно удаляем всё, что ещё висит
+                due = self._pop_due(float("inf") if stopping else time.time())
+            for chat, msgs in due.items():
+                self._enqueue(chat, msgs)
+            if stopping:
+                return
+
+    # Наступившие удаления дописываются в очередь чата; задачи в SEND_SCHEDULER
+    # (по одной на каждые BATCH id) забирают до BATCH id в момент выполнения,
+    # так что пока чат ждёт своей очереди, удаления копятся в одном запросе
+    def _enqueue(self, chat_id: int, message_ids: List[int]) -> None:
+        with self.cond:
+            batch = self.open.setdefault(chat_id, [])
+            batch.extend(message_ids)
+            need = -(-len(batch) // self.BATCH) - self.jobs.get(chat_id, 0)
+            if need > 0:
+                self.jobs[chat_id] = self.jobs.get(chat_id, 0) + need
+        for _ in range(need):
+            fut = SEND_SCHEDULER.submit(chat_id, self._flush, chat_id, priority=PRIORITY_BULK)
+            fut.add_done_callback(lambda f, c=chat_id: self._gave_up(c) if f.exception() else None)
+
+    def _take(self, chat_id: int) -> List[int]:
+        with self.cond:
+            self.jobs[chat_id] = self.jobs.get(chat_id, 1) - 1
+            if self.jobs[chat_id] <= 0:
+                del self.jobs[chat_id]
+            batch = self.open.get(chat_id, [])
+            take = batch[:self.BATCH]
+            del batch[:self.BATCH]
+            if not batch:
+                self.open.pop(chat_id, None)
+            return take
+
+    def _flush(self, chat_id: int) -> None:
+        take = self._take(chat_id)
+        if not take:
+            return
+        try:
+            if len(take) == 1:
+                bot.delete_message(chat_id, take[0])
+            else:
+                bot.delete_messages(chat_id, take)
+        except ApiTelegramException as e:
+            if e.error_code == 429 or e.error_code >= 500:
+                # вернуть пачку и отдать повтор планировщику (задача выполнится снова)
+                with self.cond:
+                    self.open[chat_id] = take + self.open.get(chat_id, [])
+                    self.jobs[chat_id] = self.jobs.get(chat_id, 0) + 1
+                raise
+        except Exception:
+            pass
+        self._done(chat_id, take)
+
+    # Планировщик исчерпал повторы: пачка остаётся в очереди и в хранилище,
+    # уйдёт со следующими удалениями чата или после рестарта
+    def _gave_up(self, chat_id: int) -> None:
+        with self.cond:
+            self.jobs[chat_id] = self.jobs.get(chat_id, 1) - 1
+            if self.jobs[chat_id] <= 0:
+                del self.jobs[chat_id]
+
+    # Выполнено (или отвергнуто Telegram — сообщения уже нет): больше не повторяем
+    def _done(self, chat_id: int, message_ids: List[int]) -> None:
+        keys = [self._key(chat_id, m) for m in message_ids]
+        with self.cond:
+            keys = [k for k in keys if self.pending.pop(k, None) is not None]
+        for key in keys:
+            _persist("delete", "deletions", key)
+
+    # Дождаться отправки оставшихся удалений в SEND_SCHEDULER (SHUTDOWN_EVENT уже выставлен)
+    def stop(self, timeout: float = 5.0) -> None:
+        with self.cond:
+            self.cond.notify()
+            t = self.thread
+        if t is not None:
+            t.join(timeout)
+
+DELETION_SCHEDULER = DeletionScheduler()
+DELETION_SCHEDULER.restore(register_state_collection("deletions", DELETION_SCHEDULER.snapshot))
+
+# Глубины очередей для /metrics
+def _queue_samples() -> List[tuple]:
+    out = [
+        ("startfit_send_queue_depth", "gauge", "Outbound Telegram jobs waiting or in flight", {"lane": lane}, n)
+        for lane, n in SEND_SCHEDULER.queue_depth().items()
+    ]
+    with DELETION_SCHEDULER.cond:
+        pending = len(DELETION_SCHEDULER.pending)
+    out.append(("startfit_deletions_pending", "gauge", "Messages scheduled for auto-delete", {}, pending))
+    out.append(("startfit_rate_limiter_keys", "gauge", "Tracked anti-flood keys", {}, RATE_LIMITER.stats()["keys"]))
+    out.append(("startfit_executor_queue_depth", "gauge", "Queued tasks per thread pool", {"pool": "bot-util"}, EXECUTOR._work_queue.qsize()))
+    return out
+
+register_collector(_queue_samples)
 
 def auto_delete_message(chat_id: int, message_id: int, delay: int = 3) -> None:
     try:
-        EXECUTOR.submit(_delete_task, chat_id, message_id, delay)
+        DELETION_SCHEDULER.schedule(chat_id, message_id, delay)
     except Exception:
         pass
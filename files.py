@@ -0,0 +1,305 @@
+import time
+import uuid
+import threading
+import tempfile
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper, types
+from metrics import TG_SECONDS, TG_ERRORS, timed
+from telebot.apihelper import ApiTelegramException
+
+import config as cfg
+
+# Загрузка вложений с ограничением памяти: файл пишется в SpooledTemporaryFile
+# (в RAM до DL_SPOOL_BYTES, дальше — на диск), а все загрузки вместе не держат
+# больше DL_BUDGET_BYTES: перед скачиванием резервируется ожидаемый размер
+# (при неизвестном — DL_SPOOL_BYTES, резерв растёт по мере скачивания).
+# Не дождавшись бюджета, загрузка бросает DownloadPostponed — вызывающий
+# ставит файл в очередь на повтор, а не теряет его.
+MAX_FILE_BYTES = 20 * 1024 * 1024
+DL_TIMEOUT = (10, 30)  # connect, read
+DL_RETRIES = 2
+DL_CHUNK = 64 * 1024
+
+class DownloadPostponed(Exception):
+    pass
+
+# Резерв: acquire() открывает его, acquire(grow=True) наращивает, release()
+# закрывает целиком. Если все держатели ждут роста, бюджет сам не освободится —
+# уступает (TimeoutError) пришедший последним, остальные продолжают.
+class ByteBudget:
+    def __init__(self, total: int):
+        self.total = total
+        self.used = 0
+        self.holders = 0
+        self.growing = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, n: int, timeout: Optional[float] = None, grow: bool = False) -> int:
+        n = max(0, min(n, self.total))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            if grow:
+                self.growing += 1
+            try:
+                while self.used + n > self.total:
+                    if grow and self.growing >= self.holders:
+                        raise TimeoutError("download byte budget exhausted by growing downloads")
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is not None and left <= 0:
+                        raise TimeoutError("download byte budget exhausted")
+                    self.cond.wait(left)
+            finally:
+                if grow:
+                    self.growing -= 1
+            self.used += n
+            if not grow:
+                self.holders += 1
+        return n
+
+    def release(self, n: int) -> None:
+        with self.cond:
+            self.used = max(0, self.used - n)
+            self.holders = max(0, self.holders - 1)
+            self.cond.notify_all()
+
+DOWNLOAD_BUDGET = ByteBudget(cfg.DL_BUDGET_BYTES)
+
+# Отдельный пул соединений для вложений: keep-alive, не больше DL_PER_HOST
+# соединений на хост (pool_block — лишние запросы ждут свободное соединение)
+DL_SESSION = requests.Session()
+_dl_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=cfg.DL_PER_HOST, pool_block=True)
+DL_SESSION.mount("https://", _dl_adapter)
+DL_SESSION.mount("http://", _dl_adapter)
+DL_POOL = ThreadPoolExecutor(max_workers=cfg.DL_WORKERS, thread_name_prefix="dl")
+
+# Скачанный файл: держит резерв бюджета, пока не закрыты все владельцы.
+# Одну загрузку могут делить несколько отправок — каждая читает через reader()
+# со своей позицией.
+class SpooledDownload:
+    def __init__(self, fileobj, size: int, name: str, reserved: int, refs: int = 1):
+        self.file = fileobj
+        self.size = size
+        self.name = name
+        self._reserved = reserved
+        self._refs = refs
+        self.lock = threading.Lock()
+
+    def reader(self) -> "_SharedReader":
+        return _SharedReader(self)
+
+    def close(self) -> None:
+        with self.lock:
+            self._refs -= 1
+            if self._refs != 0:
+                return
+            reserved, self._reserved = self._reserved, 0
+            try:
+                self.file.close()
+            finally:
+                DOWNLOAD_BUDGET.release(reserved)
+
+class _SharedReader:
+    def __init__(self, dl: SpooledDownload):
+        self.dl = dl
+        self.pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        with self.dl.lock:
+            self.dl.file.seek(self.pos)
+            data = self.dl.file.read(n)
+        self.pos += len(data)
+        return data
+
+# HEAD: размер и валидаторы (ETag / Last-Modified) файла; None, если HEAD не сработал.
+# Удачные ответы кешируются на DL_HEAD_TTL секунд.
+_HEAD_CACHE: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+_HEAD_LOCK = threading.Lock()
+_HEAD_CACHE_SIZE = 1024
+
+def probe_file(url: str) -> Optional[Dict[str, Any]]:
+    with _HEAD_LOCK:
+        ent = _HEAD_CACHE.get(url)
+        if ent is not None and ent[0] > time.monotonic():
+            _HEAD_CACHE.move_to_end(url)
+            return ent[1]
+    try:
+        h = DL_SESSION.head(url, timeout=10, allow_redirects=True)
+        if not h.ok:
+            return None
+        probe = {
+            "length": int(h.headers.get("Content-Length") or 0),
+            "etag": h.headers.get("ETag") or "",
+            "last_modified": h.headers.get("Last-Modified") or "",
+        }
+    except Exception:
+        return None
+    with _HEAD_LOCK:
+        _HEAD_CACHE[url] = (time.monotonic() + cfg.DL_HEAD_TTL, probe)
+        _HEAD_CACHE.move_to_end(url)
+        while len(_HEAD_CACHE) > _HEAD_CACHE_SIZE:
+            _HEAD_CACHE.popitem(last=False)
+    return probe
+
+# Ключ кеша file_id: без валидатора и размера файл нельзя считать неизменным
+def file_cache_key(url: str, probe: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not probe:
+        return None
+    validator = probe["etag"] or probe["last_modified"]
+    if not validator and not probe["length"]:
+        return None
+    return f"{url}|{validator}|{probe['length']}"
+
+# Загрузки одного URL, идущие прямо сейчас: ведомые ждут результат лидера
+_INFLIGHT: Dict[str, Dict[str, Any]] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def download_file(url: str, name: str, max_bytes: int = MAX_FILE_BYTES,
+                  probe: Optional[Dict[str, Any]] = None) -> Optional[SpooledDownload]:
+    with _INFLIGHT_LOCK:
+        entry = _INFLIGHT.get(url)
+        leader = entry is None
+        if leader:
+            entry = _INFLIGHT[url] = {"future": Future(), "waiters": 0}
+        else:
+            entry["waiters"] += 1
+    if not leader:
+        return entry["future"].result()
+    try:
+        dl = _download(url, name, max_bytes, probe)
+    except BaseException as e:
+        # ведомые получают то же исключение (DownloadPostponed — повторят позже)
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(url, None)
+        entry["future"].set_exception(e)
+        raise
+    with _INFLIGHT_LOCK:
+        _INFLIGHT.pop(url, None)
+        if dl is not None:
+            dl._refs += entry["waiters"]
+    entry["future"].set_result(dl)
+    return dl
+
+def _download(url: str, name: str, max_bytes: int, probe: Optional[Dict[str, Any]]) -> Optional[SpooledDownload]:
+    # HEAD для оценки Content-Length (если не передан готовый)
+    if probe is None:
+        probe = probe_file(url)
+    clen = probe["length"] if probe else 0
+    if clen and clen > max_bytes:
+        print(f"skip large file: {clen} > {max_bytes} at {url}")
+        return None
+    step = max(cfg.DL_SPOOL_BYTES, DL_CHUNK)
+    try:
+        reserved = DOWNLOAD_BUDGET.acquire(clen or min(max_bytes, step), timeout=cfg.DL_BUDGET_WAIT)
+    except TimeoutError as e:
+        raise DownloadPostponed(f"{e}: {url}") from e
+
+    for attempt in range(DL_RETRIES + 1):
+        spool = tempfile.SpooledTemporaryFile(max_size=cfg.DL_SPOOL_BYTES)
+        try:
+            with DL_SESSION.get(url, timeout=DL_TIMEOUT, stream=True) as r:
+                r.raise_for_status()
+                total = 0
+                for chunk in r.iter_content(chunk_size=DL_CHUNK):
+                    if not chunk:
+                        continue
+                    spool.write(chunk)
+                    total += len(chunk)
+                    if total > max_bytes:
+                        print(f"download exceeded limit {total} > {max_bytes} at {url}")
+                        spool.close()
+                        DOWNLOAD_BUDGET.release(reserved)
+                        return None
+                    if total > reserved:
+                        try:
+                            reserved += DOWNLOAD_BUDGET.acquire(
+                                min(max(total - reserved, step), max_bytes - reserved),
+                                timeout=cfg.DL_BUDGET_WAIT, grow=True,
+                            )
+                        except TimeoutError as e:
+                            spool.close()
+                            DOWNLOAD_BUDGET.release(reserved)
+                            raise DownloadPostponed(f"{e}: {url}") from e
+                spool.seek(0)
+                return SpooledDownload(spool, total, name, reserved)
+        except DownloadPostponed:
+            raise
+        except Exception as e:
+            spool.close()
+            if attempt >= DL_RETRIES:
+                print(f"download failed: {e} url={url}")
+                DOWNLOAD_BUDGET.release(reserved)
+                return None
+            time.sleep(0.7 * (attempt + 1))
+    DOWNLOAD_BUDGET.release(reserved)
+    return None
+
+# multipart/form-data как поток: заголовки полей + файл кусками + хвост.
+# requests видит __len__ и шлёт тело с Content-Length, читая его через read(),
+# так что файл не склеивается в один буфер в памяти.
+class MultipartStream:
+    def __init__(self, fields: Dict[str, Any], file_field: str, filename: str, fileobj, size: int):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        head = BytesIO()
+        for key, val in fields.items():
+            if val is None:
+                continue
+            head.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n'.encode())
+            head.write(str(val).encode("utf-8") + b"\r\n")
+        safe_name = filename.replace('"', "")
+        head.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{safe_name}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode("utf-8")
+        )
+        tail = f"\r\n--{boundary}--\r\n".encode()
+        self._parts = [BytesIO(head.getvalue()), fileobj, BytesIO(tail)]
+        self._len = len(head.getvalue()) + size + len(tail)
+        self._idx = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self._len
+        out = b""
+        while self._idx < len(self._parts) and len(out) < n:
+            chunk = self._parts[self._idx].read(n - len(out))
+            if not chunk:
+                self._idx += 1
+                continue
+            out += chunk
+        return out
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(DL_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+_TG_SESSION = requests.Session()
+
+# sendDocument с потоковой выгрузкой файла; ошибки — как у telebot (ApiTelegramException)
+@timed(TG_SECONDS, TG_ERRORS, method="sendDocument")
+def send_document_stream(token: str, chat_id, dl: SpooledDownload, caption: Optional[str] = None,
+                         filename: Optional[str] = None) -> types.Message:
+    body = MultipartStream({"chat_id": chat_id, "caption": caption}, "document", filename or dl.name, dl.reader(), dl.size)
+    url = (apihelper.API_URL or "https://api.telegram.org/bot{0}/{1}").format(token, "sendDocument")
+    r = _TG_SESSION.post(
+        url, data=body, headers={"Content-Type": body.content_type},
+        timeout=(apihelper.CONNECT_TIMEOUT, max(apihelper.READ_TIMEOUT, 120)), proxies=apihelper.proxy,
+    )
+    try:
+        js = r.json()
+    except ValueError:
+        raise apihelper.ApiHTTPException("sendDocument", r)
+    if not js.get("ok"):
+        raise ApiTelegramException("sendDocument", r, js)
+    return types.Message.de_json(js["result"])
@@ -0,0 +1,282 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, List, Optional
+
+from metrics import UPDATE_WAIT_SECONDS, UPDATES_SHED, register_collector
+
+# Обработка апдейтов по полосам: апдейт уходит в полосу hash(chat_id) % N.
+# Внутри полосы — строго по очереди (апдейты одного чата не обгоняют друг друга
+# и не идут параллельно), разные полосы работают одновременно, так что медленный
+# экран одного админа держит только свою полосу. Потоковый движок — поток на
+# полосу (UpdateLanes), асинхронный — задача на полосу (AsyncUpdateLanes).
+# install() перехватывает bot.process_new_updates: туда приходят и long polling,
+# и webhook, и recorder.install.
+#
+# Допуск (admission): апдейт получает метку прихода при постановке в полосу.
+#  - callback-запрос обгоняет в полосе ждущие апдейты других чатов, но не своего:
+#    внутри чата порядок строго FIFO (нажатие не обработается раньше текста,
+#    отправленного до него);
+#  - полоса глубже max_depth — новый апдейт сразу отклоняется ("busy");
+#  - апдейт, дождавшийся очереди позже своего дедлайна (cb_deadline для
+#    callback, msg_deadline для прочих), не обрабатывается ("late"): пока
+#    пользователь смотрит на часики, ответ уже не нужен, а повторное нажатие
+#    не должно упираться в антифлуд.
+# В обоих случаях вызывается on_reject(update, причина) — короткий ответ
+# пользователю; он не должен блокировать (ставит отправку в очередь).
+
+# Поля Update с собственным чатом/пользователем, в порядке проверки
+_CHAT_FIELDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post", "business_message",
+    "edited_business_message", "my_chat_member", "chat_member", "chat_join_request",
+    "message_reaction", "chat_boost", "removed_chat_boost",
+)
+_USER_FIELDS = (
+    "callback_query", "inline_query", "chosen_inline_result", "shipping_query",
+    "pre_checkout_query", "poll_answer",
+)
+
+def update_chat_id(update) -> Any:
+    for field in _CHAT_FIELDS:
+        obj = getattr(update, field, None)
+        chat = getattr(obj, "chat", None)
+        if chat is not None:
+            return chat.id
+    for field in _USER_FIELDS:
+        obj = getattr(update, field, None)
+        if obj is None:
+            continue
+        chat = getattr(getattr(obj, "message", None), "chat", None)
+        if chat is not None:
+            return chat.id
+        user = getattr(obj, "from_user", None) or getattr(obj, "user", None)
+        if user is not None:
+            return user.id
+    return update.update_id  # без чата — порядок не важен, раскладываем по id
+
+# Сколько апдейтов полосы просматривать в поисках callback-запроса
+_SCAN_LIMIT = 256
+
+# Следующий апдейт полосы: первый callback, перед которым нет апдейтов его
+# чата, иначе голова очереди. Элементы — (когда поставлен, вид, чат, апдейт)
+def _pop(queue: deque) -> tuple:
+    seen = set()
+    for i, item in enumerate(queue):
+        if i >= _SCAN_LIMIT:
+            break
+        if item[1] == "callback" and item[2] not in seen:
+            del queue[i]
+            return item
+        seen.add(item[2])
+    return queue.popleft()
+
+def _kind(update) -> str:
+    if getattr(update, "callback_query", None) is not None:
+        return "callback"
+    if getattr(update, "message", None) is not None or getattr(update, "edited_message", None) is not None:
+        return "message"
+    return "other"
+
+class _Admission:
+    def _admission(self, max_depth: int, cb_deadline: float, msg_deadline: float,
+                   on_reject: Optional[Callable[[Any, str], None]]) -> None:
+        self.max_depth = max_depth
+        self.cb_deadline = cb_deadline
+        self.msg_deadline = msg_deadline
+        self.on_reject = on_reject
+
+    def _late(self, kind: str, queued_at: float, now: float) -> bool:
+        limit = self.cb_deadline if kind == "callback" else self.msg_deadline
+        return limit > 0 and now - queued_at > limit
+
+    def _reject(self, update, kind: str, reason: str) -> None:
+        UPDATES_SHED.inc(reason=reason, kind=kind)
+        if self.on_reject is None:
+            return
+        try:
+            self.on_reject(update, reason)
+        except Exception as e:
+            print(f"{self.name} reject {reason} error: {e}")
+
+class _Lane:
+    __slots__ = ("cond", "queue", "thread", "done")
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.queue: deque = deque()  # (когда поставлен, вид, чат, апдейт)
+        self.thread: Optional[threading.Thread] = None
+        self.done = 0
+
+    def depth(self) -> int:
+        return len(self.queue)
+
+class UpdateLanes(_Admission):
+    def __init__(self, lanes: int, handle: Optional[Callable[[Any], None]] = None, name: str = "lane",
+                 max_depth: int = 0, cb_deadline: float = 0.0, msg_deadline: float = 0.0,
+                 on_reject: Optional[Callable[[Any, str], None]] = None):
+        self.lanes = [_Lane() for _ in range(max(1, lanes))]
+        self.handle = handle
+        self.name = name
+        self.stopping = False
+        self._admission(max_depth, cb_deadline, msg_deadline, on_reject)
+
+    def _lane(self, key: Any) -> _Lane:
+        return self.lanes[hash(key) % len(self.lanes)]
+
+    def submit(self, update) -> bool:
+        chat = update_chat_id(update)
+        lane = self._lane(chat)
+        kind = _kind(update)
+        with lane.cond:
+            busy = self.max_depth > 0 and lane.depth() >= self.max_depth
+            if not busy:
+                lane.queue.append((time.monotonic(), kind, chat, update))
+                lane.cond.notify()
+        if busy:
+            self._reject(update, kind, "busy")
+        return not busy
+
+    def _run(self, lane: _Lane) -> None:
+        while True:
+            with lane.cond:
+                while not lane.depth() and not self.stopping:
+                    lane.cond.wait()
+                if not lane.depth():
+                    return
+                queued_at, kind, _, update = _pop(lane.queue)
+            now = time.monotonic()
+            UPDATE_WAIT_SECONDS.observe(now - queued_at)
+            if self._late(kind, queued_at, now):
+                self._reject(update, kind, "late")
+                continue
+            try:
+                self.handle(update)
+            except Exception as e:
+                print(f"{self.name} update {getattr(update, 'update_id', '?')} error: {e}")
+            lane.done += 1
+
+    def start(self) -> None:
+        self.stopping = False
+        for i, lane in enumerate(self.lanes):
+            if lane.thread is None or not lane.thread.is_alive():
+                lane.thread = threading.Thread(target=self._run, args=(lane,), daemon=True, name=f"{self.name}-{i}")
+                lane.thread.start()
+
+    # Дорабатывает уже принятые апдейты не дольше timeout
+    def stop(self, timeout: float = 5.0) -> None:
+        self.stopping = True
+        for lane in self.lanes:
+            with lane.cond:
+                lane.cond.notify_all()
+        end = time.monotonic() + timeout
+        for lane in self.lanes:
+            if lane.thread is not None:
+                lane.thread.join(timeout=max(0.0, end - time.monotonic()))
+
+    def depths(self) -> List[int]:
+        return [lane.depth() for lane in self.lanes]
+
+    # bot.threaded=False: хендлеры выполняются в потоке полосы. last_update_id
+    # двигаем сразу, иначе long polling снова получит ещё не обработанные апдейты
+    def install(self, tg_bot) -> None:
+        process = tg_bot.process_new_updates
+        self.handle = lambda update: process([update])
+        tg_bot.threaded = False
+
+        def process_new_updates(updates):
+            for update in updates:
+                if update.update_id > tg_bot.last_update_id:
+                    tg_bot.last_update_id = update.update_id
+                self.submit(update)
+
+        tg_bot.process_new_updates = process_new_updates
+        register_collector(self._samples)
+
+    def _samples(self) -> List[tuple]:
+        out = []
+        for i, lane in enumerate(self.lanes):
+            lbl = {"lane": str(i)}
+            out.append(("startfit_update_lane_depth", "gauge", "Updates queued per processing lane", lbl, lane.depth()))
+            out.append(("startfit_update_lane_done_total", "counter", "Updates processed per lane", lbl, lane.done))
+        return out
+
+# То же для AsyncTeleBot: задача-обработчик на полосу, пробуждение через asyncio.Event
+class _AsyncLane:
+    __slots__ = ("queue", "wake", "done")
+
+    def __init__(self):
+        self.queue: deque = deque()
+        self.wake = asyncio.Event()
+        self.done = 0
+
+    def depth(self) -> int:
+        return len(self.queue)
+
+class AsyncUpdateLanes(_Admission):
+    def __init__(self, lanes: int, name: str = "lane", max_depth: int = 0, cb_deadline: float = 0.0,
+                 msg_deadline: float = 0.0, on_reject: Optional[Callable[[Any, str], None]] = None):
+        self.size = max(1, lanes)
+        self.name = name
+        self.lanes: List[_AsyncLane] = []
+        self.tasks: List["asyncio.Task"] = []
+        self.handle = None
+        self._admission(max_depth, cb_deadline, msg_deadline, on_reject)
+
+    def submit(self, update) -> bool:
+        chat = update_chat_id(update)
+        lane = self.lanes[hash(chat) % self.size]
+        kind = _kind(update)
+        if self.max_depth > 0 and lane.depth() >= self.max_depth:
+            self._reject(update, kind, "busy")
+            return False
+        lane.queue.append((time.monotonic(), kind, chat, update))
+        lane.wake.set()
+        return True
+
+    async def _run(self, lane: _AsyncLane) -> None:
+        while True:
+            if not lane.depth():
+                lane.wake.clear()
+                await lane.wake.wait()
+                continue
+            queued_at, kind, _, update = _pop(lane.queue)
+            now = time.monotonic()
+            UPDATE_WAIT_SECONDS.observe(now - queued_at)
+            if self._late(kind, queued_at, now):
+                self._reject(update, kind, "late")
+                continue
+            try:
+                await self.handle([update])
+            except Exception as e:
+                print(f"{self.name} update {update.update_id} error: {e}")
+            lane.done += 1
+
+    # Вызывать из работающего цикла событий
+    def install(self, abot) -> None:
+        self.handle = abot.process_new_updates
+        self.lanes = [_AsyncLane() for _ in range(self.size)]
+        self.tasks = [asyncio.ensure_future(self._run(lane)) for lane in self.lanes]
+
+        async def process_new_updates(updates):
+            for update in updates:
+                self.submit(update)
+
+        abot.process_new_updates = process_new_updates
+        register_collector(self._samples)
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def depths(self) -> List[int]:
+        return [lane.depth() for lane in self.lanes]
+
+    def _samples(self) -> List[tuple]:
+        out = []
+        for i, lane in enumerate(self.lanes):
+            lbl = {"lane": str(i)}
+            out.append(("startfit_update_lane_depth", "gauge", "Updates queued per processing lane", lbl, lane.depth()))
+            out.append(("startfit_update_lane_done_total", "counter", "Updates processed per lane", lbl, lane.done))
+        return out
@@ -1,16 +1,49 @@
 # main.py
+import hmac
+import ssl
 import time
 import signal
-from core import bot, SHUTDOWN_EVENT, save_state
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import types
+import config as cfg
+from core import bot, SHUTDOWN_EVENT, SEND_SCHEDULER, DELETION_SCHEDULER, save_state
+import views
 import handlers  # регистрирует декораторы при импорте
-from handlers import start_background_poll, stop_background_poll
+from metrics import register_collector, start_metrics_server, stop_metrics_server
+from poller import start_background_poll, stop_background_poll
+from outbox import OUTBOX
+from lanes import UpdateLanes
+
+# Короткий ответ на апдейт, не прошедший допуск: через SEND_SCHEDULER без ожидания,
+# чтобы не держать поток long polling / webhook
+def _reject_update(update, reason: str) -> None:
+    cb, chat_id, text = views.shed_reply(update, reason)
+    if cb is not None:
+        chat_id = cb.message.chat.id if cb.message else cb.from_user.id
+        SEND_SCHEDULER.submit(chat_id, bot.answer_callback_query, cb.id, text)
+    elif chat_id is not None:
+        SEND_SCHEDULER.submit(chat_id, bot.send_message, chat_id, text)
+
+# Хендлеры потокового движка выполняются в полосах по chat_id (lanes.py)
+UPDATE_LANES = UpdateLanes(
+    cfg.UPDATE_LANES, name="updates", max_depth=cfg.UPDATE_QUEUE_MAX,
+    cb_deadline=cfg.UPDATE_DEADLINE_CB, msg_deadline=cfg.UPDATE_DEADLINE_MSG, on_reject=_reject_update,
+)
 
 def _handle_signal(sig, frame):
     print(f"got signal {sig}, shutting down...")
     try:
         SHUTDOWN_EVENT.set()
         stop_background_poll()
+        OUTBOX.stop()
         bot.stop_polling()
+        UPDATE_LANES.stop()
+        DELETION_SCHEDULER.stop()
+        SEND_SCHEDULER.stop()
+        stop_metrics_server()
     except Exception:
         pass
     finally:
@@ -32,11 +65,110 @@ def run_polling():
                 time.sleep(0.1)
             delay = min(delay * 2, 60)
 
+# Webhook: Telegram шлёт апдейты POST-ом; проверяем секрет, сразу отвечаем 200
+# и отдаём разбор пулу воркеров, а он — в полосы UPDATE_LANES
+MAX_UPDATE_BYTES = 1024 * 1024
+WEBHOOK_SECRET = cfg.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+_WEBHOOK_POOL = ThreadPoolExecutor(max_workers=cfg.WEBHOOK_WORKERS, thread_name_prefix="webhook")
+register_collector(lambda: [(
+    "startfit_executor_queue_depth", "gauge", "Queued tasks per thread pool", {"pool": "webhook"}, _WEBHOOK_POOL._work_queue.qsize(),
+)])
+
+def _process_raw_update(body: bytes):
+    try:
+        update = types.Update.de_json(body.decode("utf-8"))
+        bot.process_new_updates([update])
+    except Exception as e:
+        print(f"webhook update error: {e}")
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != cfg.WEBHOOK_PATH:
+            self.send_error(404)
+            return
+        token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            self.send_error(403)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_UPDATE_BYTES:
+            self.send_error(413 if length else 400)
+            return
+        body = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        _WEBHOOK_POOL.submit(_process_raw_update, body)
+
+    def log_message(self, format, *args):
+        pass
+
+def run_webhook():
+    if not cfg.WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL is not set for BOT_MODE=webhook")
+    server = ThreadingHTTPServer((cfg.WEBHOOK_LISTEN, cfg.WEBHOOK_PORT), _WebhookHandler)
+    if cfg.WEBHOOK_SSL_CERT and cfg.WEBHOOK_SSL_KEY:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(cfg.WEBHOOK_SSL_CERT, cfg.WEBHOOK_SSL_KEY)
+        server.socket = ctx.wrap_socket(server.socket, server_side=True)
+    t = threading.Thread(target=server.serve_forever, daemon=True, name="webhook-http")
+    t.start()
+    try:
+        bot.set_webhook(
+            url=cfg.WEBHOOK_URL + cfg.WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=cfg.WEBHOOK_WORKERS,
+        )
+        print(f"webhook listening on {cfg.WEBHOOK_LISTEN}:{cfg.WEBHOOK_PORT}{cfg.WEBHOOK_PATH}")
+        while not SHUTDOWN_EVENT.wait(1):
+            pass
+    finally:
+        try:
+            bot.remove_webhook()
+        except Exception as e:
+            print(f"remove webhook error: {e}")
+        server.shutdown()
+        server.server_close()
+        _WEBHOOK_POOL.shutdown(wait=True)
+
+def start_recording():
+    import core
+    import recorder
+    from api import SESSION
+    with core.STATE_LOCK:
+        admins = list(core.ADMIN_USERS)
+    recorder.install(
+        bot, SESSION, cfg.RECORD_FILE, cfg.API_BASE,
+        chat_fields=core.POSSIBLE_CHAT_FIELDS, admin_password=cfg.ADMIN_PASSWORD, admins=admins,
+    )
+
+def run_async():
+    # Движок на asyncio: свой поллер-задача и long polling AsyncTeleBot
+    import asyncio
+    import bot_async
+    if cfg.BOT_MODE == "webhook":
+        raise RuntimeError("BOT_ENGINE=async supports only BOT_MODE=polling")
+    if cfg.RECORD_FILE:
+        raise RuntimeError("RECORD_FILE is supported only for BOT_ENGINE=threaded")
+    asyncio.run(bot_async.run())
+
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, _handle_signal)
     signal.signal(signal.SIGTERM, _handle_signal)
-    start_background_poll()
+    start_metrics_server(cfg.METRICS_LISTEN, cfg.METRICS_PORT)
+    OUTBOX.start()
+    if cfg.BOT_ENGINE != "async":
+        UPDATE_LANES.install(bot)
+        UPDATE_LANES.start()
+        if cfg.RECORD_FILE:
+            start_recording()
+        start_background_poll()
     try:
-        run_polling()
+        if cfg.BOT_ENGINE == "async":
+            run_async()
+        elif cfg.BOT_MODE == "webhook":
+            run_webhook()
+        else:
+            run_polling()
     finally:
         _handle_signal("finalize", None)
@@ -0,0 +1,223 @@
+import time
+import bisect
+import inspect
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Метрики процесса в текстовом формате Prometheus (0.0.4), без внешних зависимостей.
+# Гистограммы и счётчики пишутся на горячем пути (одна блокировка на метрику),
+# значения "на момент опроса" (глубины очередей, кеши) отдают коллекторы,
+# которые регистрируют модули-владельцы: metrics ни от кого не зависит.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = list(self.values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        # метки -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self.values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            st = self.values.get(key)
+            if st is None:
+                st = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            st[0][i] += 1
+            st[1] += value
+            st[2] += 1
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = [(k, list(st[0]), st[1], st[2]) for k, st in self.values.items()]
+        lines = []
+        for key, counts, total, n in items:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="' + _num(le) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+_METRICS: List[Any] = []
+# Коллекторы: fn() -> [(имя, тип, описание, {метки}, значение)]
+_COLLECTORS: List[Callable[[], List[tuple]]] = []
+
+def counter(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    m = Counter(name, help_text, labelnames)
+    _METRICS.append(m)
+    return m
+
+def histogram(name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    m = Histogram(name, help_text, labelnames, buckets)
+    _METRICS.append(m)
+    return m
+
+def register_collector(fn: Callable[[], List[tuple]]) -> None:
+    _COLLECTORS.append(fn)
+
+API_SECONDS = histogram("startfit_api_call_seconds", "WP API client call latency", ("fn",))
+API_STALE = counter("startfit_api_stale_total", "WP API reads answered with the last good response", ("endpoint",))
+API_RESPONSES = counter("startfit_api_responses_total", "WP API HTTP responses by endpoint and status", ("endpoint", "code"))
+TG_SECONDS = histogram("startfit_telegram_call_seconds", "Telegram Bot API call latency", ("method",))
+TG_ERRORS = counter("startfit_telegram_errors_total", "Failed Telegram Bot API calls", ("method", "code"))
+HANDLER_SECONDS = histogram("startfit_handler_seconds", "Update handler latency", ("handler",))
+HANDLER_ERRORS = counter("startfit_handler_errors_total", "Update handlers that raised", ("handler",))
+UPDATE_WAIT_SECONDS = histogram("startfit_update_queue_seconds", "Time an update waited in its processing lane")
+UPDATES_SHED = counter("startfit_updates_shed_total", "Updates rejected by admission control", ("reason", "kind"))
+POLL_SECONDS = histogram("startfit_poll_cycle_seconds", "Coursework sync cycle duration", ("result",))
+
+def _error_code(e: BaseException) -> str:
+    return str(getattr(e, "error_code", None) or type(e).__name__)
+
+# Замер блока: длительность в гистограмму, исключение — в счётчик ошибок (и дальше)
+@contextmanager
+def track(hist: Histogram, errors: Optional[Counter] = None, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if errors is not None:
+            if "code" in errors.labelnames:
+                errors.inc(code=_error_code(e), **labels)
+            else:
+                errors.inc(**labels)
+        raise
+    finally:
+        hist.observe(time.perf_counter() - t0, **labels)
+
+def timed(hist: Histogram, errors: Optional[Counter] = None, **labels):
+    def deco(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def awrapper(*args, **kwargs):
+                with track(hist, errors, **labels):
+                    return await func(*args, **kwargs)
+            return awrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(hist, errors, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return deco
+
+# Функции клиента WP API (api, api_async) — метка по имени функции
+def api_timed(func):
+    return timed(API_SECONDS, fn=func.__name__)(func)
+
+# Обёртка транспорта Bot API (apihelper._make_request / asyncio_helper._process_request):
+# второй аргумент — имя метода, он же метка
+def metered_bot_api(fn):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def awrapper(token, method_name, *args, **kwargs):
+            with track(TG_SECONDS, TG_ERRORS, method=method_name):
+                return await fn(token, method_name, *args, **kwargs)
+        return awrapper
+
+    @functools.wraps(fn)
+    def wrapper(token, method_name, *args, **kwargs):
+        with track(TG_SECONDS, TG_ERRORS, method=method_name):
+            return fn(token, method_name, *args, **kwargs)
+    return wrapper
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _METRICS:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.render())
+    samples: Dict[str, list] = {}
+    for fn in _COLLECTORS:
+        try:
+            for name, kind, help_text, labels, value in fn():
+                if name not in samples:
+                    samples[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                names = tuple(labels)
+                samples[name].append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_num(value)}")
+        except Exception as e:
+            print(f"metrics collector error: {e}")
+    for block in samples.values():
+        lines.extend(block)
+    return "\n".join(lines) + "\n"
+
+# HTTP-эндпоинт /metrics: отдельный поток, по умолчанию только на localhost
+_SERVER: Optional[ThreadingHTTPServer] = None
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(listen: str, port: int) -> Optional[ThreadingHTTPServer]:
+    global _SERVER
+    if _SERVER is not None or port <= 0:
+        return _SERVER
+    _SERVER = ThreadingHTTPServer((listen, port), _MetricsHandler)
+    _SERVER.daemon_threads = True
+    threading.Thread(target=_SERVER.serve_forever, daemon=True, name="metrics-http").start()
+    print(f"metrics on http://{listen}:{port}/metrics")
+    return _SERVER
+
+def stop_metrics_server() -> None:
+    global _SERVER
+    if _SERVER is not None:
+        _SERVER.shutdown()
+        _SERVER.server_close()
+        _SERVER = None
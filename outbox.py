@@ -0,0 +1,222 @@
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+from core import bot, SEND_SCHEDULER, _persist, register_state_collection
+from api import update_coursework_status
+from store import COURSEWORK_STORE
+from metrics import register_collector
+from config import OUTBOX_RETRY_MAX, OUTBOX_MAX_ATTEMPTS
+from views import outbox_dropped_text
+
+# Отложенная запись статусов/оценок в WP (write-behind). Хендлер кладёт правку
+# в outbox и сразу отвечает; фоновый поток отправляет update_coursework_status с
+# повторами (экспоненциальная пауза до OUTBOX_RETRY_MAX). Несколько правок одной
+# курсовой до отправки сливаются в одну: при том же статусе поздние поля ложатся
+# поверх ранних, смена статуса заменяет правку целиком (оценка от "Проверено"
+# не уходит вместе с "Отклонено"). Очередь переживает перезапуск: коллекция
+# "outbox" в хранилище состояния. Пока правка не подтверждена, COURSEWORK_STORE
+# держит её поверх ответов API (hold/release), экраны видят новое значение.
+# Окончательный отказ API (4xx, кроме 401/403/408/429 — их чинит настройка или
+# время) или max_attempts неудач подряд отбрасывают правку: хранилище
+# возвращается к значению из API, вызывается on_drop (лог и сообщение в чат,
+# из которого правка пришла).
+# Порядок блокировок: persist_lock -> cond -> COURSEWORK_STORE.lock; запись в
+# хранилище — без cond (компакция берёт cond через snapshot()).
+_FIELDS = ("status", "grade", "comment")
+
+def _permanent(code: Optional[int]) -> bool:
+    return code is not None and 400 <= code < 500 and code not in (401, 403, 408, 429)
+
+class _Entry:
+    __slots__ = ("fields", "since", "chat_id", "seq", "attempts", "due")
+
+    def __init__(self, fields: Dict[str, Any], since: float, chat_id: Optional[int] = None):
+        self.fields = fields
+        self.since = since  # time.time() первой неотправленной правки
+        self.chat_id = chat_id  # куда сообщить, если правка будет отброшена
+        self.seq = 0        # растёт с каждой правкой: отправленная копия устарела?
+        self.attempts = 0
+        self.due = 0.0      # monotonic следующей попытки
+
+class CourseworkOutbox:
+    def __init__(self, send=update_coursework_status, store=COURSEWORK_STORE, retry_max: float = 300.0,
+                 max_attempts: int = 12, on_drop=None):
+        self.send = send
+        self.store = store
+        self.retry_max = retry_max
+        self.max_attempts = max(1, max_attempts)
+        self.on_drop = on_drop  # (cw_id, поля, chat_id, HTTP-код | None)
+        self.cond = threading.Condition()
+        self.persist_lock = threading.Lock()
+        self.entries: Dict[str, _Entry] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = False
+        self.flushed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    # Восстановление после перезапуска: {cw_id: {"status", "grade", "comment", "since", "chat_id"}}
+    def restore(self, saved: Dict[str, Any]) -> None:
+        for cw_id, rec in saved.items():
+            if not isinstance(rec, dict) or not rec.get("status"):
+                continue
+            fields = {k: rec[k] for k in _FIELDS if rec.get(k) is not None}
+            with self.cond:
+                self.entries[cw_id] = _Entry(fields, float(rec.get("since") or time.time()), rec.get("chat_id"))
+                self.store.hold(cw_id, **{k: v for k, v in fields.items() if k != "comment"})
+
+    @staticmethod
+    def _record(e: _Entry) -> Dict[str, Any]:
+        return dict(e.fields, since=e.since, chat_id=e.chat_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.cond:
+            return {cw_id: self._record(e) for cw_id, e in self.entries.items()}
+
+    def submit(self, cw_id: Any, status: str, grade: Optional[int] = None, comment: Optional[str] = None,
+               chat_id: Optional[int] = None) -> None:
+        key = str(cw_id)
+        change = {"status": status}
+        if grade is not None:
+            change["grade"] = grade
+        if comment:
+            change["comment"] = comment
+        with self.cond:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = _Entry({}, time.time())
+            replace = entry.fields.get("status") != status
+            if replace:
+                entry.fields = change
+            else:
+                entry.fields.update(change)
+            if chat_id is not None:
+                entry.chat_id = chat_id
+            entry.seq += 1
+            entry.attempts = 0
+            entry.due = 0.0
+            self.store.hold(key, replace=replace, **{k: v for k, v in change.items() if k != "comment"})
+            self.cond.notify()
+        self._save(key)
+
+    # В хранилище пишется текущее состояние записи: порядок конкурирующих
+    # put/delete не важен, последний пишущий видит последнюю правку
+    def _save(self, cw_id: str) -> None:
+        with self.persist_lock:
+            with self.cond:
+                e = self.entries.get(cw_id)
+                record = self._record(e) if e is not None else None
+            if record is None:
+                _persist("delete", "outbox", cw_id)
+            else:
+                _persist("put", "outbox", cw_id, record)
+
+    def pending(self, cw_id: Any) -> bool:
+        with self.cond:
+            return str(cw_id) in self.entries
+
+    # Очередная готовая к отправке правка: (cw_id, поля, seq) или None по остановке
+    def _next(self):
+        with self.cond:
+            while not self.stopping:
+                now = time.monotonic()
+                ready = [(e.due, cw_id) for cw_id, e in self.entries.items() if e.due <= now]
+                if ready:
+                    cw_id = min(ready)[1]
+                    e = self.entries[cw_id]
+                    return cw_id, dict(e.fields), e.seq
+                wait = min((e.due for e in self.entries.values()), default=now + 60) - now
+                self.cond.wait(timeout=max(0.05, wait))
+        return None
+
+    def _flush(self, cw_id: str, fields: Dict[str, Any], seq: int) -> None:
+        try:
+            code = self.send(cw_id, fields["status"], grade=fields.get("grade"), comment=fields.get("comment"))
+        except Exception as e:
+            print(f"outbox {cw_id} error: {e}")
+            code = None
+        ok = code is not None and 200 <= code < 300
+        with self.cond:
+            e = self.entries.get(cw_id)
+            if e is None:
+                return
+            if ok:
+                self.flushed += 1
+            else:
+                self.failed += 1
+            if e.seq != seq:
+                return  # пока шёл запрос, пришла новая правка — отправим её следующей
+            if not ok:
+                e.attempts += 1
+                if not _permanent(code) and e.attempts < self.max_attempts:
+                    e.due = time.monotonic() + min(self.retry_max, 2 ** e.attempts)
+                    return
+                self.dropped += 1
+            del self.entries[cw_id]
+            self.store.release(cw_id, revert=not ok)
+            chat_id, attempts = e.chat_id, e.attempts
+        self._save(cw_id)
+        if not ok:
+            print(f"outbox {cw_id} dropped after {attempts} attempt(s): http {code} {fields}")
+            if self.on_drop is not None:
+                try:
+                    self.on_drop(cw_id, fields, chat_id, code)
+                except Exception as err:
+                    print(f"outbox {cw_id} drop notify error: {err}")
+
+    def _run(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            self._flush(*item)
+
+    def start(self) -> None:
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, daemon=True, name="coursework-outbox")
+        self.thread.start()
+
+    # Неотправленное остаётся в хранилище и уйдёт после перезапуска
+    def stop(self, timeout: float = 5.0) -> None:
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        t = self.thread
+        if t and t.is_alive():
+            t.join(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            oldest = min((e.since for e in self.entries.values()), default=None)
+            return {
+                "pending": len(self.entries),
+                "oldest_age": time.time() - oldest if oldest is not None else 0.0,
+                "flushed": self.flushed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+# Отброшенная правка: преподаватель уже видел "сохранена" — сообщаем в тот же чат
+def _notify_dropped(cw_id: str, fields: Dict[str, Any], chat_id: Optional[int], code: Optional[int]) -> None:
+    if chat_id:
+        SEND_SCHEDULER.submit(chat_id, bot.send_message, chat_id, outbox_dropped_text(cw_id, fields, code))
+
+OUTBOX = CourseworkOutbox(
+    retry_max=OUTBOX_RETRY_MAX, max_attempts=OUTBOX_MAX_ATTEMPTS, on_drop=_notify_dropped,
+)
+OUTBOX.restore(register_state_collection("outbox", OUTBOX.snapshot))
+
+def _outbox_samples() -> List[tuple]:
+    st = OUTBOX.stats()
+    return [
+        ("startfit_outbox_pending", "gauge", "Coursework updates waiting to be written to WP", {}, st["pending"]),
+        ("startfit_outbox_oldest_seconds", "gauge", "Age of the oldest unconfirmed coursework update", {}, st["oldest_age"]),
+        ("startfit_outbox_flushed_total", "counter", "Coursework updates written to WP", {}, st["flushed"]),
+        ("startfit_outbox_failed_total", "counter", "Failed coursework update attempts", {}, st["failed"]),
+        ("startfit_outbox_dropped_total", "counter", "Coursework updates given up after a permanent error or too many attempts", {}, st["dropped"]),
+    ]
+
+register_collector(_outbox_samples)
@@ -0,0 +1,210 @@
+import time
+import threading
+from typing import Optional, Dict, Any, List
+from telebot.apihelper import ApiTelegramException
+
+from core import (
+    bot, SEND_SCHEDULER, PRIORITY_BULK, coursework_card_kb, extract_file_urls,
+    STATUS_NEW, STATUS_REVIEWING, SENT_COURSEWORK_IDS, STATE_LOCK, SHUTDOWN_EVENT,
+    mark_sent, prune_sent, teacher_chat_id_from_teacher,
+    cached_file_id, remember_file_id, forget_file_id,
+)
+from api import get_teacher, get_student, COURSEWORK_SYNC
+from store import COURSEWORK_STORE
+from files import (
+    DL_POOL, DownloadPostponed, SpooledDownload, probe_file, file_cache_key, download_file, send_document_stream,
+)
+from views import coursework_card_text
+from metrics import POLL_SECONDS
+
+# =========================
+# Фоновая рассылка курсовых
+# =========================
+
+_POLL_THREAD: Optional[threading.Thread] = None
+# Курсовые, которые не удалось доставить (нет chat_id у преподавателя или отправка
+# карточки провалилась) — повторяем каждый цикл
+_UNDELIVERED: Dict[str, Dict[str, Any]] = {}
+# Карточки в очереди планировщика: отправленными они считаются только после
+# ответа Telegram. Колбэки планировщика меняют оба словаря из своих потоков —
+# одиночные операции над dict атомарны, поллер берёт копию через list()
+_IN_FLIGHT: Dict[str, Dict[str, Any]] = {}
+# Вложения, не скачанные из-за исчерпанного бюджета загрузок (DownloadPostponed):
+# (cw_id, chat_id, url) -> (chat_id, cw_id, номер, всего, файл). Карточка уже
+# отправлена, поэтому повторяется только файл — каждый цикл, пока не уйдёт
+# или не провалится окончательно
+_POSTPONED_FILES: Dict[tuple, tuple] = {}
+
+def _on_file_uploaded(key: Optional[str], what: str, dl: SpooledDownload):
+    def _cb(fut):
+        dl.close()
+        e = fut.exception()
+        if e is not None:
+            print(f"{what}: {e}")
+            return
+        doc = getattr(fut.result(), "document", None)
+        if key and doc is not None and doc.file_id:
+            remember_file_id(key, doc.file_id)
+    return _cb
+
+def _on_cached_file_sent(key: str, what: str):
+    def _cb(fut):
+        e = fut.exception()
+        if e is not None:
+            print(f"{what} (cached file_id): {e}")
+            if isinstance(e, ApiTelegramException) and e.error_code == 400:
+                forget_file_id(key)  # file_id отвергнут — в следующий раз загрузим заново
+    return _cb
+
+# Карточка ушла — курсовая доставлена; не ушла (после всех повторов планировщика
+# или при его остановке) — обратно в недоставленные, следующий цикл повторит
+def _on_card_sent(cw: Dict[str, Any], what: str):
+    cw_id = str(cw.get("id") or "")
+
+    def _cb(fut):
+        _IN_FLIGHT.pop(cw_id, None)
+        e = fut.exception()
+        if e is not None:
+            print(f"{what}: {e}")
+            _UNDELIVERED[cw_id] = cw
+            return
+        mark_sent(cw_id)
+    return _cb
+
+def _send_coursework_to_chat(chat_id: int, cw: Dict[str, Any], student: Optional[Dict[str, Any]] = None):
+    cw_id = cw.get("id")
+    msg = coursework_card_text(cw, student)
+    # Рассылка идёт через планировщик в полосе bulk без ожидания: порядок
+    # внутри чата сохраняется, итог карточки разбирает _on_card_sent
+    SEND_SCHEDULER.submit(
+        chat_id, bot.send_message, chat_id, msg, reply_markup=coursework_card_kb(cw_id), priority=PRIORITY_BULK,
+    ).add_done_callback(_on_card_sent(cw, f"send card error cw {cw_id} chat {chat_id}"))
+    files = extract_file_urls(cw)
+    _send_files(chat_id, cw_id, [(i, len(files), f) for i, f in enumerate(files, 1)])
+
+# HEAD и загрузки всех файлов идут параллельно на DL_POOL, отправка — по
+# порядку, по мере готовности. files: (номер, всего, {"url", "name"})
+def _send_files(chat_id: int, cw_id: Any, files: List[tuple]) -> None:
+    probes = list(DL_POOL.map(lambda x: probe_file(x[2]["url"]), files))
+    plan = []
+    for (i, n, f), probe in zip(files, probes):
+        key = file_cache_key(f["url"], probe)
+        file_id = cached_file_id(key) if key else None
+        fut = None if file_id else DL_POOL.submit(download_file, f["url"], f["name"], probe=probe)
+        plan.append((i, n, f, key, file_id, fut))
+    for i, n, f, key, file_id, fut in plan:
+        url = f["url"]
+        caption = f"📎 Файл {i}/{n}"
+        retry_key = (str(cw_id), chat_id, url)
+        what = f"file send error {url} cw {cw_id} chat {chat_id}"
+        if file_id:
+            # уже загружали в Telegram — шлём по file_id без скачивания
+            SEND_SCHEDULER.submit(
+                chat_id, bot.send_document, chat_id, file_id, caption=caption, priority=PRIORITY_BULK,
+            ).add_done_callback(_on_cached_file_sent(key, what))
+            _POSTPONED_FILES.pop(retry_key, None)
+            continue
+        try:
+            dl = fut.result()
+        except DownloadPostponed as e:
+            print(f"[poll] file {i}/{n} cw {cw_id} chat {chat_id} postponed: {e}")
+            _POSTPONED_FILES[retry_key] = (chat_id, cw_id, i, n, f)
+            continue
+        _POSTPONED_FILES.pop(retry_key, None)
+        if not dl:
+            continue
+        SEND_SCHEDULER.submit(
+            chat_id, send_document_stream, bot.token, chat_id, dl,
+            caption=caption, filename=f["name"], priority=PRIORITY_BULK,
+        ).add_done_callback(_on_file_uploaded(key, what, dl))
+
+def _deliver_coursework(cw: Dict[str, Any]) -> None:
+    cw_id = str(cw.get("id") or "")
+    with STATE_LOCK:
+        if not cw_id or cw_id in SENT_COURSEWORK_IDS:
+            _UNDELIVERED.pop(cw_id, None)
+            return
+    if cw_id in _IN_FLIGHT:
+        return  # карточка уже в очереди, ждём её итога
+    status = cw.get("status", "")
+    if status not in (STATUS_NEW, STATUS_REVIEWING):
+        _UNDELIVERED.pop(cw_id, None)
+        mark_sent(cw_id)
+        return
+    teacher_id = cw.get("teacher_id")
+    teacher = get_teacher(teacher_id) if teacher_id else None
+    chat_id = teacher_chat_id_from_teacher(teacher)
+    if not chat_id:
+        _UNDELIVERED[cw_id] = cw
+        return
+    student = get_student(cw.get("student_id")) if cw.get("student_id") else None
+    _UNDELIVERED.pop(cw_id, None)
+    _IN_FLIGHT[cw_id] = cw
+    _send_coursework_to_chat(chat_id, cw, student=student)
+
+# Один цикл после синхронизации: снимок, учёт удалённых, рассылка новых и
+# недоставленных. Общий для потока _poll_loop и асинхронного поллера (bot_async)
+# Пропавшая из выдачи курсовая остаётся в SENT_COURSEWORK_IDS: один сбойный
+# ответ не должен приводить к повторной рассылке. Вычищаются только id,
+# которых нет несколько полных синхронизаций подряд (prune_sent)
+def process_delta(delta: Dict[str, Any]) -> None:
+    COURSEWORK_STORE.apply(delta)
+    for cw in delta["removed"]:
+        _UNDELIVERED.pop(str(cw.get("id") or ""), None)
+    # только по настоящему полному снимку: 304 и частичные ответы ничего не
+    # говорят об удалениях, а тихий цикл не должен обходить все id
+    if delta.get("snapshot"):
+        pruned = prune_sent(COURSEWORK_SYNC.ids())
+        if pruned:
+            print(f"[poll] pruned {pruned} sent ids missing upstream")
+    fresh = {str(cw.get("id") or ""): cw for cw in delta["added"] + delta["changed"]}
+    retry = [cw for cw_id, cw in list(_UNDELIVERED.items()) if cw_id not in fresh]
+    for cw in list(fresh.values()) + retry:
+        _deliver_coursework(cw)
+    _retry_postponed_files()
+
+def _retry_postponed_files() -> None:
+    groups: Dict[tuple, List[tuple]] = {}
+    for chat_id, cw_id, i, n, f in list(_POSTPONED_FILES.values()):
+        groups.setdefault((chat_id, cw_id), []).append((i, n, f))
+    for (chat_id, cw_id), files in groups.items():
+        _send_files(chat_id, cw_id, files)
+
+# Пауза перед следующим циклом: обычная или экспоненциальный бэкофф после ошибок
+POLL_INTERVAL = 20
+
+def poll_backoff(err: int) -> float:
+    return POLL_INTERVAL if err == 0 else min(POLL_INTERVAL * (2 ** min(err, 5)), 300)
+
+def _poll_loop():
+    err = 0
+    while not SHUTDOWN_EVENT.is_set():
+        t0 = time.perf_counter()
+        try:
+            delta = COURSEWORK_SYNC.poll()
+            if delta is None:
+                raise RuntimeError("courseworks sync failed")
+            process_delta(delta)
+            err = 0  # успешная итерация
+        except Exception as e:
+            err += 1
+            print(f"[poll] error (#{err}): {e}")
+        POLL_SECONDS.observe(time.perf_counter() - t0, result="error" if err else "ok")
+        sleep_s = poll_backoff(err)
+        for _ in range(int(sleep_s * 10)):
+            if SHUTDOWN_EVENT.is_set():
+                break
+            time.sleep(0.1)
+
+def start_background_poll():
+    global _POLL_THREAD
+    if _POLL_THREAD and _POLL_THREAD.is_alive():
+        return
+    _POLL_THREAD = threading.Thread(target=_poll_loop, daemon=True, name="poll-courseworks")
+    _POLL_THREAD.start()
+
+def stop_background_poll():
+    SHUTDOWN_EVENT.set()
+    t = _POLL_THREAD
+    if t and t.is_alive():
+        t.join(timeout=5)
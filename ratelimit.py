@@ -0,0 +1,114 @@
+import time
+import threading
+from array import array
+from typing import Any, Dict, List, Optional
+
+# Антифлуд: скользящее окно, как прежде ("не больше n событий за последние win
+# секунд", при превышении — блокировка на cooldown), но дешевле по памяти и
+# времени. Метки событий ключа лежат в array('d') (8 байт на метку вместо
+# объекта float в списке) и не длиннее n длинного окна: событие сверх лимита не
+# записывается. Метки идут по возрастанию (monotonic под блокировкой полосы),
+# поэтому истёкшие срезаются с головы, а короткое окно считается с хвоста и не
+# дальше n короткого окна — без пересборки списка на каждом вызове. Решения
+# совпадают с прежней реализацией (bench/bench_rate_limiter.py, semantics()).
+# Ключи разложены по полосам (stripes) с отдельными блокировками по uid; каждая
+# полоса раз в sweep_every секунд выбрасывает ключи, чьё состояние уже
+# неотличимо от пустого (все метки старше длинного окна, блокировка в прошлом),
+# и устаревшие записи антидубля.
+class _Key:
+    __slots__ = ("ts", "blocked_until")
+
+    def __init__(self):
+        self.ts = array("d")
+        self.blocked_until = 0.0
+
+class _Stripe:
+    __slots__ = ("lock", "state", "dups", "swept_at")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state: Dict[tuple, _Key] = {}
+        self.dups: Dict[int, tuple] = {}  # uid -> (hash текста, когда)
+        self.swept_at = 0.0
+
+class RateLimiter:
+    def __init__(self, limits: dict, stripes: int = 64, sweep_every: float = 30.0, dup_window: float = 2.0):
+        self.limits = limits
+        self.stripes: List[_Stripe] = [_Stripe() for _ in range(max(1, stripes))]
+        self.sweep_every = sweep_every
+        self.dup_window = dup_window
+
+    def _now(self) -> float:
+        return time.monotonic()
+
+    def _stripe(self, uid: int) -> _Stripe:
+        return self.stripes[hash(uid) % len(self.stripes)]
+
+    def _sweep(self, stripe: _Stripe, now: float) -> None:
+        stripe.swept_at = now
+        idle = [
+            key for key, st in stripe.state.items()
+            if st.blocked_until <= now and (not st.ts or now - st.ts[-1] > self.limits[key[1]]['long'][1])
+        ]
+        for key in idle:
+            del stripe.state[key]
+        stale = [u for u, (_, at) in stripe.dups.items() if now - at >= self.dup_window]
+        for u in stale:
+            del stripe.dups[u]
+
+    def allow(self, uid: int, kind: str) -> tuple[bool, int]:
+        uid = int(uid)
+        stripe = self._stripe(uid)
+        lim = self.limits[kind]
+        short_n, short_win = lim['short']
+        long_n, long_win = lim['long']
+        with stripe.lock:
+            now = self._now()
+            if now - stripe.swept_at >= self.sweep_every:
+                self._sweep(stripe, now)
+            key = (uid, kind)
+            st = stripe.state.get(key)
+            if st is None:
+                st = stripe.state[key] = _Key()
+
+            if now < st.blocked_until:
+                return False, int(st.blocked_until - now) + 1
+
+            ts = st.ts
+            expired = 0
+            while expired < len(ts) and now - ts[expired] > long_win:
+                expired += 1
+            if expired:
+                del ts[:expired]
+            recent = 0
+            for i in range(len(ts) - 1, -1, -1):
+                if now - ts[i] > short_win or recent >= short_n:
+                    break
+                recent += 1
+            if recent >= short_n or len(ts) >= long_n:
+                st.blocked_until = now + lim['cooldown']
+                return False, int(st.blocked_until - now) + 1
+            ts.append(now)
+            return True, 0
+
+    def is_duplicate(self, uid: int, text: Optional[str], window_sec: Optional[float] = None) -> bool:
+        if not text:
+            return False
+        window = self.dup_window if window_sec is None else window_sec
+        stripe = self._stripe(uid)
+        with stripe.lock:
+            now = self._now()
+            h = hash(text)
+            prev = stripe.dups.get(uid)
+            if prev and prev[0] == h and now - prev[1] < window:
+                return True
+            stripe.dups[uid] = (h, now)
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        keys = dups = 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                keys += len(stripe.state)
+                dups += len(stripe.dups)
+        return {"keys": keys, "dups": dups, "stripes": len(self.stripes)}
@@ -0,0 +1,189 @@
+import os
+import re
+import hmac
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+# Запись живого трафика для регрессионных прогонов (bench/replay.py): входящие
+# апдейты и ответы WP API в JSONL, по строке на событие:
+#   {"kind": "meta", "admins": [...]}                      — первая строка
+#   {"kind": "update", "t": с от старта, "update": {...}}
+#   {"kind": "api", "t": ..., "method", "path", "status", "headers", "body"}
+# Персональные данные обезличиваются: id пользователей/чатов (в апдейтах и в
+# полях chat_id ответов API) заменяются стабильными псевдонимами на ключе,
+# который живёт только в памяти процесса; имена, тексты, ссылки — солёными хешами.
+# Команды и callback_data сохраняются как есть — по ним идёт маршрутизация.
+_PERSON_KEYS = ("from", "chat", "user", "sender_chat", "forward_from", "via_bot")
+_NAME_KEYS = ("first_name", "last_name", "username", "name", "title", "email", "phone", "comment")
+_URL_KEYS = ("url", "file_url", "href")
+_DROP_KEYS = ("phone_number", "contact", "location", "photo", "document", "voice", "caption")
+_RESP_HEADERS = ("ETag", "Last-Modified", "Content-Type")
+ADMIN_PASSWORD_MARK = "<ADMIN_PASSWORD>"
+
+class Anonymizer:
+    def __init__(self, chat_fields=(), admin_password: str = ""):
+        self.key = os.urandom(16)
+        self.chat_fields = set(chat_fields)
+        self.admin_password = admin_password
+
+    def _digest(self, value: Any) -> str:
+        return hmac.new(self.key, str(value).encode("utf-8"), hashlib.sha256).hexdigest()
+
+    # Стабильный псевдоним числового id; знак сохраняется (группы отрицательные)
+    def pid(self, value: Any) -> Any:
+        try:
+            n = int(value)
+        except (TypeError, ValueError):
+            return value
+        alias = 10 ** 9 + int(self._digest(abs(n))[:12], 16) % (9 * 10 ** 9)
+        alias = -alias if n < 0 else alias
+        return alias if isinstance(value, int) else str(alias)
+
+    def text(self, value: Any) -> Any:
+        if not isinstance(value, str) or not value:
+            return value
+        if self.admin_password and value == self.admin_password:
+            return ADMIN_PASSWORD_MARK
+        if value.startswith("/"):
+            return value.split()[0]  # только команда, без аргументов
+        return "t" + self._digest(value)[:10]
+
+    def url(self, value: Any) -> Any:
+        if not isinstance(value, str) or not value:
+            return value
+        ext = os.path.splitext(value.split("?", 1)[0])[1][:8]
+        return f"https://files.invalid/{self._digest(value)[:16]}{ext}"
+
+    def update(self, obj: Any) -> Any:
+        if isinstance(obj, list):
+            return [self.update(x) for x in obj]
+        if not isinstance(obj, dict):
+            return obj
+        out = {}
+        for k, v in obj.items():
+            if k in _DROP_KEYS:
+                continue
+            if k in _PERSON_KEYS and isinstance(v, dict):
+                v = dict(self.update(v), id=self.pid(v.get("id")))
+            elif k in _NAME_KEYS or k == "text":
+                v = self.text(v)
+            elif k == "chat_id":
+                v = self.pid(v)
+            else:
+                v = self.update(v)
+            out[k] = v
+        return out
+
+    def api(self, obj: Any) -> Any:
+        if isinstance(obj, list):
+            return [self.api(x) for x in obj]
+        if not isinstance(obj, dict):
+            return obj
+        out = {}
+        for k, v in obj.items():
+            if k in self.chat_fields:
+                v = self.pid(v)
+            elif k in _NAME_KEYS:
+                v = self.text(v)
+            elif k in _URL_KEYS:
+                v = self.url(v)
+            else:
+                v = self.api(v)
+            out[k] = v
+        return out
+
+# Поля Update, которые telebot разбирает в объекты с исходным dict в .json
+_UPDATE_FIELDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post", "inline_query",
+    "chosen_inline_result", "callback_query", "shipping_query", "pre_checkout_query",
+    "poll", "poll_answer", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+def _raw_update(update) -> Dict[str, Any]:
+    raw: Dict[str, Any] = {"update_id": update.update_id}
+    for field in _UPDATE_FIELDS:
+        obj = getattr(update, field, None)
+        js = getattr(obj, "json", None)
+        if isinstance(js, dict):
+            raw[field] = js
+        elif isinstance(js, str):
+            raw[field] = json.loads(js)
+    return raw
+
+class TrafficRecorder:
+    def __init__(self, path: str, anonymizer: Anonymizer, api_base: str):
+        self.path = path
+        self.anon = anonymizer
+        self.api_base = api_base.rstrip("/")
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.fh = open(path, "a", encoding="utf-8")
+
+    def _write(self, rec: Dict[str, Any]) -> None:
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            if self.fh.closed:
+                return
+            self.fh.write(line + "\n")
+            self.fh.flush()
+
+    def _t(self) -> float:
+        return round(time.monotonic() - self.started, 4)
+
+    def meta(self, admins) -> None:
+        self._write({"kind": "meta", "t": 0.0, "admins": [self.anon.pid(a) for a in admins]})
+
+    def record_updates(self, updates) -> None:
+        t = self._t()
+        for u in updates:
+            try:
+                self._write({"kind": "update", "t": t, "update": self.anon.update(_raw_update(u))})
+            except Exception as e:
+                print(f"record update error: {e}")
+
+    # Хук ответа requests.Session: hooks["response"]
+    def on_response(self, r, *args, **kwargs):
+        try:
+            url = r.request.url or ""
+            if not url.startswith(self.api_base):
+                return r
+            body = None
+            if r.status_code == 200:
+                try:
+                    body = self.anon.api(r.json())
+                except ValueError:
+                    body = None
+            self._write({
+                "kind": "api", "t": self._t(), "method": r.request.method,
+                "path": re.sub(r"^/+", "", url[len(self.api_base):]), "status": r.status_code,
+                "headers": {h: r.headers[h] for h in _RESP_HEADERS if h in r.headers}, "body": body,
+            })
+        except Exception as e:
+            print(f"record response error: {e}")
+        return r
+
+    def close(self) -> None:
+        with self.lock:
+            self.fh.close()
+
+RECORDER: Optional[TrafficRecorder] = None
+
+# Точка входа main.py: перехватываем bot.process_new_updates (туда приходят и
+# long polling, и webhook) и ответы общей Session клиента WP API
+def install(tg_bot, session, path: str, api_base: str, chat_fields=(), admin_password: str = "", admins=()) -> TrafficRecorder:
+    global RECORDER
+    rec = RECORDER = TrafficRecorder(path, Anonymizer(chat_fields, admin_password), api_base)
+    rec.meta(admins)
+    process = tg_bot.process_new_updates
+
+    def process_new_updates(updates):
+        rec.record_updates(updates)
+        return process(updates)
+
+    tg_bot.process_new_updates = process_new_updates
+    session.hooks["response"].append(rec.on_response)
+    print(f"recording updates and API responses to {path}")
+    return rec
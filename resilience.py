@@ -0,0 +1,126 @@
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Optional
+
+# Устойчивость клиента WP API при деградации бэкенда, общая для api и api_async:
+#  - автомат (circuit breaker) на каждый эндпоинт: после failures подряд неудач
+#    запросы не уходят reset_after секунд, затем один пробный — и по его итогу
+#    автомат закрывается или снова открывается;
+#  - дедлайн на обработку апдейта (contextvar): таймауты и ретраи запросов
+#    укладываются в остаток, по истечении запросы не отправляются вовсе;
+#  - чтения при отказе отдают последний удачный ответ, помеченный как устаревший
+#    (is_stale), — бот отвечает за миллисекунды, а не висит на таймаутах.
+class CircuitOpen(Exception):
+    pass
+
+class DeadlineExceeded(Exception):
+    pass
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2  # значения — как в метрике startfit_api_breaker_state
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = 5, reset_after: float = 30.0):
+        self.name = name
+        self.failures = max(1, failures)
+        self.reset_after = reset_after
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.errors = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            # один пробный запрос; если он так и не отчитался — следующий через reset_after
+            if now - self.opened_at >= self.reset_after:
+                self.state = HALF_OPEN
+                self.opened_at = now
+                return True
+            return False
+
+    def success(self) -> None:
+        with self.lock:
+            self.state = CLOSED
+            self.errors = 0
+
+    def failure(self) -> None:
+        with self.lock:
+            self.errors += 1
+            if self.state == HALF_OPEN or self.errors >= self.failures:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+# Дедлайн текущего апдейта (monotonic); None — без ограничения (фоновые задачи)
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("api_deadline", default=None)
+
+@contextmanager
+def deadline(seconds: float):
+    if seconds <= 0:
+        yield
+        return
+    current = _DEADLINE.get()
+    until = time.monotonic() + seconds
+    token = _DEADLINE.set(until if current is None else min(current, until))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+def time_left() -> Optional[float]:
+    until = _DEADLINE.get()
+    return None if until is None else until - time.monotonic()
+
+# Таймаут запроса с учётом дедлайна; DeadlineExceeded, если времени не осталось
+def budget(timeout: float) -> float:
+    left = time_left()
+    if left is None:
+        return timeout
+    if left <= 0.05:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(timeout, left)
+
+# Пометка "устаревшие данные": те же list/dict, но с атрибутом stale
+class StaleList(list):
+    stale = True
+
+class StaleDict(dict):
+    stale = True
+
+def stale(value: Any) -> Any:
+    if isinstance(value, list):
+        return StaleList(value)
+    if isinstance(value, dict):
+        return StaleDict(value)
+    return value
+
+def is_stale(value: Any) -> bool:
+    return getattr(value, "stale", False)
+
+def stale_like(source: Any, value: Any) -> Any:
+    return stale(value) if is_stale(source) else value
+
+# Последние удачные ответы чтений (путь -> json), ограниченный LRU
+class LastGood:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.data: "OrderedDict[str, Any]" = OrderedDict()
+
+    def put(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            return stale(self.data.get(key))
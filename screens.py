@@ -0,0 +1,356 @@
+import functools
+from typing import Any, Callable, Dict, List, Tuple
+
+import config as cfg
+import views
+from core import (
+    RATE_LIMITER,
+    start_menu, back_kb, admin_main_menu, grade_menu_kb, coursework_card_kb, get_contextual_help,
+    STATUS_REVIEWING, STATUS_CHECKED, STATUS_REJECTED,
+    add_admin, is_admin, auto_delete_message,
+)
+from store import COURSEWORK_STORE, teacher_names
+from outbox import OUTBOX
+from metrics import HANDLER_SECONDS, HANDLER_ERRORS, track
+from resilience import deadline
+
+# Логика экранов — одна на оба движка (handlers: TeleBot в потоках, bot_async:
+# AsyncTeleBot). Экран — генератор: проверки доступа, антифлуд, выбор текста и
+# клавиатуры — здесь, а каждый ввод-вывод он отдаёт движку через yield:
+# io.edit(call, text, ...) — это запрос ("edit", args, kwargs), движок выполняет
+# его своим портом (port.edit(...), в async — с await) и возвращает результат
+# в генератор; исключение порта пробрасывается в генератор в точке yield.
+# Методы порта — PORT_METHODS: Bot API (send, reply, edit, answer, clear_markup,
+# delete; последние два глушат ошибки) и данные (teachers, teacher, student,
+# coursework, teacher_with_students, teacher_for_chat, store_ready).
+PORT_METHODS = frozenset((
+    "send", "reply", "edit", "answer", "clear_markup", "delete",
+    "teachers", "teacher", "student", "coursework", "teacher_with_students", "teacher_for_chat", "store_ready",
+))
+
+class _Requests:
+    def __getattr__(self, name: str) -> Callable[..., Tuple[str, tuple, dict]]:
+        if name not in PORT_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: (name, args, kwargs)
+
+io = _Requests()
+
+# Экраны в порядке регистрации: (фильтры message_handler, экран) и (шаблоны callback_data, экран)
+MESSAGE_SCREENS: List[Tuple[Dict[str, Any], Callable]] = []
+CALLBACK_SCREENS: List[Tuple[Tuple[str, ...], Callable]] = []
+
+def message(**filters):
+    def deco(screen):
+        MESSAGE_SCREENS.append((filters, screen))
+        return screen
+    return deco
+
+def callback(*patterns: str):
+    def deco(screen):
+        CALLBACK_SCREENS.append((patterns, screen))
+        return screen
+    return deco
+
+# =========================
+# Исполнение экранов
+# =========================
+
+def run_sync(gen, port):
+    result, error = None, None
+    while True:
+        try:
+            name, args, kwargs = gen.throw(error) if error is not None else gen.send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = getattr(port, name)(*args, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+
+async def run_async(gen, port):
+    result, error = None, None
+    while True:
+        try:
+            name, args, kwargs = gen.throw(error) if error is not None else gen.send(result)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = await getattr(port, name)(*args, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+
+# Антифлуд перед экраном: повтор того же текста и превышение лимитов RATE_LIMITER
+# получают короткий ответ; True — экран можно выполнять
+def flood_guard(obj, kind: str):
+    try:
+        uid = getattr(getattr(obj, "from_user", None), "id", None)
+        chat = getattr(obj, "chat", None) or getattr(getattr(obj, "message", None), "chat", None)
+        chat_id = getattr(chat, "id", None)
+    except Exception:
+        uid, chat_id = None, None
+
+    if kind == 'msg':
+        text = getattr(obj, 'text', None)
+        if uid is not None and RATE_LIMITER.is_duplicate(uid, text):
+            try:
+                m = yield io.send(chat_id, "⚠️ Повтор того же сообщения. Подождите немного.")
+                auto_delete_message(chat_id, m.message_id, delay=3)
+            except Exception:
+                pass
+            return False
+
+    if uid is not None:
+        allowed, retry = RATE_LIMITER.allow(uid, kind)
+        if not allowed:
+            try:
+                if kind == 'cb':
+                    yield io.answer(obj, f"⏳ Слишком часто. Подождите {retry} с.")
+                if chat_id is not None:
+                    m = yield io.send(chat_id, f"⏳ Слишком часто. Повторите через {retry} с.")
+                    auto_delete_message(chat_id, m.message_id, delay=min(6, retry + 1))
+            except Exception:
+                pass
+            return False
+    return True
+
+# Хендлер движка для экрана: антифлуд, затем сам экран с метриками и
+# дедлайном API_DEADLINE на запросы к API внутри
+def sync_handler(screen, kind: str, port):
+    @functools.wraps(screen)
+    def handler(obj, *args, **kwargs):
+        if not run_sync(flood_guard(obj, kind), port):
+            return
+        with track(HANDLER_SECONDS, HANDLER_ERRORS, handler=screen.__name__), deadline(cfg.API_DEADLINE):
+            run_sync(screen(obj, *args, **kwargs), port)
+    return handler
+
+def async_handler(screen, kind: str, port):
+    @functools.wraps(screen)
+    async def handler(obj, *args, **kwargs):
+        if not await run_async(flood_guard(obj, kind), port):
+            return
+        with track(HANDLER_SECONDS, HANDLER_ERRORS, handler=screen.__name__), deadline(cfg.API_DEADLINE):
+            await run_async(screen(obj, *args, **kwargs), port)
+    return handler
+
+# Регистрирует все экраны на боте (TeleBot или AsyncTeleBot) и его CallbackRouter
+def install(tg_bot, router, port, wrap) -> None:
+    for filters, screen in MESSAGE_SCREENS:
+        tg_bot.message_handler(**filters)(wrap(screen, 'msg', port))
+    for patterns, screen in CALLBACK_SCREENS:
+        handler = wrap(screen, 'cb', port)
+        for pattern in patterns:
+            router.route(pattern)(handler)
+
+# =========================
+# Проверки доступа
+# =========================
+
+def _admin_only(call):
+    if is_admin(call.from_user.id):
+        return True
+    yield io.answer(call, "❌ Доступ запрещён")
+    return False
+
+def _registered_teacher(call):
+    teacher = yield io.teacher_for_chat(call.from_user.id)
+    if not teacher:
+        yield io.answer(call, "❌ Нет регистрации преподавателя")
+    return teacher
+
+def _store_loaded(call):
+    if (yield io.store_ready()):
+        return True
+    yield io.edit(call, "❌ Не удалось загрузить данные", reply_markup=back_kb("admin_main"))
+    yield io.answer(call, "Ошибка загрузки данных")
+    return False
+
+# =========================
+# Команды
+# =========================
+
+@message(commands=["start"])
+def cmd_start(msg):
+    yield io.send(msg.chat.id, views.WELCOME_TEXT, reply_markup=start_menu())
+
+@message(commands=["help"])
+def cmd_help(msg):
+    yield io.send(msg.chat.id, views.HELP_TEXT, reply_markup=back_kb())
+
+@message(commands=["admin"])
+def cmd_admin(msg):
+    if not is_admin(msg.from_user.id):
+        yield io.send(msg.chat.id, views.ADMIN_DENIED_TEXT, reply_markup=back_kb())
+        return
+    yield io.send(msg.chat.id, views.ADMIN_PANEL_TEXT, reply_markup=admin_main_menu())
+
+@message(func=lambda m: cfg.ADMIN_PASSWORD and m.text == cfg.ADMIN_PASSWORD)
+def admin_auth(msg):
+    add_admin(msg.from_user.id)
+    yield io.delete(msg.chat.id, msg.message_id)
+    text, kb = views.admin_granted_view()
+    yield io.send(msg.chat.id, text, reply_markup=kb)
+
+# =========================
+# Общие callback'и
+# =========================
+
+@callback("start")
+def on_start_cb(call):
+    yield io.edit(call, views.WELCOME_TEXT, reply_markup=start_menu())
+    yield io.answer(call)
+
+@callback("get_id")
+def on_get_id(call):
+    yield io.edit(call, views.chat_id_text(call.from_user.id), reply_markup=back_kb())
+    yield io.answer(call, "ID готов к копированию!")
+
+@callback("help_{ctx:rest}")
+def on_help_cb(call, ctx):
+    yield io.answer(call, get_contextual_help(ctx), show_alert=True)
+
+# =========================
+# Админ-панель
+# =========================
+
+@callback("admin_main")
+def on_admin_main(call):
+    if not (yield from _admin_only(call)):
+        return
+    yield io.edit(call, views.ADMIN_PANEL_TEXT, reply_markup=admin_main_menu())
+    yield io.answer(call)
+
+@callback("admin_pending")
+def on_admin_pending(call):
+    if not (yield from _admin_only(call)) or not (yield from _store_loaded(call)):
+        return
+    pending = COURSEWORK_STORE.teachers_in_status(STATUS_REVIEWING)
+    text = views.pending_text(pending, teacher_names(pending))
+    yield io.edit(call, text, reply_markup=back_kb("admin_main"))
+    yield io.answer(call, f"Найдено {sum(pending.values())} курсовых на проверке")
+
+@callback("admin_stats")
+def on_admin_stats(call):
+    if not (yield from _admin_only(call)) or not (yield from _store_loaded(call)):
+        return
+    text = views.stats_text(COURSEWORK_STORE.status_breakdown(), COURSEWORK_STORE.grade_breakdown())
+    yield io.edit(call, text, reply_markup=back_kb("admin_main"))
+    yield io.answer(call)
+
+@callback("admin_search")
+def on_admin_search(call):
+    if not (yield from _admin_only(call)):
+        return
+    yield io.edit(call, views.ADMIN_SEARCH_TEXT, reply_markup=back_kb("admin_main"))
+    yield io.answer(call, "Введите имя или ID преподавателя")
+
+@message(func=lambda m: is_admin(m.from_user.id))
+def admin_free_search(msg):
+    q = (msg.text or "").strip().lower()
+    if not q:
+        return
+    teachers = yield io.teachers()
+    found = views.search_teachers(teachers, q)
+    if not found:
+        yield io.reply(msg, "Ничего не найдено" + views.stale_note(teachers))
+        return
+    yield io.reply(msg, f"Найдено преподавателей: {len(found)}" + views.stale_note(teachers), reply_markup=views.search_results_kb(found))
+
+# Списки курсовых листаются страницами по PAGE_SIZE: "<экран>_next_<id>" / "<экран>_prev_<id>"
+@callback("view_{tid}", "view_{tid}_{move}_{cursor}")
+def on_view_teacher(call, tid, move=None, cursor=None):
+    if not (yield from _admin_only(call)):
+        return
+    yield io.store_ready()
+    cws, skipped, total = COURSEWORK_STORE.page(tid, cursor=cursor, backward=move == "prev", limit=cfg.PAGE_SIZE)
+    # студенты — только для строк этой страницы
+    teacher, students = yield io.teacher_with_students(tid, [cw.get("student_id") for cw in cws])
+    text, kb = views.teacher_courseworks_view(tid, teacher, cws, students, skipped, total)
+    yield io.edit(call, text, reply_markup=kb)
+    yield io.answer(call, f"Показано курсовых: {len(cws)} из {total}")
+
+# =========================
+# Курсовые: статусы/оценки
+# =========================
+
+@callback("status_reviewing_{cid}")
+def on_status_reviewing(call, cid):
+    # запись в WP — фоном через OUTBOX, экраны сразу видят новый статус
+    OUTBOX.submit(cid, STATUS_REVIEWING, chat_id=call.message.chat.id)
+    yield io.answer(call, "✅ Статус изменен на 'На проверке'!")
+    yield io.clear_markup(call)
+    sent = yield io.send(call.message.chat.id, "✅ Обновлено: На проверке")
+    auto_delete_message(call.message.chat.id, sent.message_id, delay=3)
+
+@callback("grade_menu_{cid}")
+def on_grade_menu(call, cid):
+    new_text = (call.message.text or "") + "\n\n📝 Выберите оценку:"
+    yield io.edit(call, new_text, reply_markup=grade_menu_kb(cid))
+    yield io.answer(call, "Выберите оценку 2–5")
+
+@callback("set_grade_{cid}_{grade:int}")
+def on_set_grade(call, cid, grade):
+    OUTBOX.submit(cid, STATUS_CHECKED, grade=grade, chat_id=call.message.chat.id)
+    yield io.answer(call, f"✅ Оценка {grade} сохранена, статус 'Проверено'!")
+    yield io.clear_markup(call)
+    sent = yield io.send(call.message.chat.id, f"✅ Проверено! Оценка: {grade}")
+    auto_delete_message(call.message.chat.id, sent.message_id, delay=5)
+
+@callback("set_grade_{raw:rest}")
+def on_bad_grade(call, raw):
+    yield io.answer(call, "❌ Некорректная оценка")
+
+@callback("cancel_{cid}")
+def on_cancel(call, cid):
+    orig = (call.message.text or "").split("\n\n📝")[0]
+    yield io.edit(call, orig, reply_markup=coursework_card_kb(cid))
+    yield io.answer(call, "❌ Выбор оценки отменён")
+
+# =========================
+# Преподаватель
+# =========================
+
+@callback("teacher_main")
+def on_teacher_main(call):
+    teacher = yield from _registered_teacher(call)
+    if not teacher:
+        return
+    yield io.edit(call, views.teacher_main_text(teacher), reply_markup=views.teacher_main_menu())
+    yield io.answer(call)
+
+@callback("my_students")
+def on_my_students(call):
+    teacher = yield io.teacher_for_chat(call.from_user.id)
+    yield io.edit(call, views.my_students_text(teacher), reply_markup=back_kb("teacher_main"))
+    yield io.answer(call)
+
+@callback("manual_review_list", "manual_review_list_{move}_{cursor}")
+def on_manual_review_list(call, move=None, cursor=None):
+    teacher = yield from _registered_teacher(call)
+    if not teacher:
+        return
+    yield io.store_ready()
+    to_review, skipped, total = COURSEWORK_STORE.page(
+        teacher.get("id"), STATUS_REVIEWING, cursor=cursor, backward=move == "prev", limit=cfg.PAGE_SIZE,
+    )
+    text, kb = views.manual_review_view(to_review, skipped, total)
+    yield io.edit(call, text, reply_markup=kb)
+    yield io.answer(call)
+
+@callback("t_manual_{cw_id}")
+def on_teacher_manual(call, cw_id):
+    cw = COURSEWORK_STORE.get(cw_id) or (yield io.coursework(cw_id))
+    if not cw:
+        yield io.answer(call, "❌ Курсовая не найдена")
+        return
+    student = yield io.student(cw.get("student_id"))
+    text, kb = views.manual_card_view(cw_id, cw, student)
+    yield io.edit(call, text, reply_markup=kb)
+    yield io.answer(call)
+
+@callback("set_reject_{cw_id}")
+def on_set_reject(call, cw_id):
+    OUTBOX.submit(cw_id, STATUS_REJECTED, chat_id=call.message.chat.id)
+    yield io.answer(call, "✅ Курсовая отклонена")
+    yield io.clear_markup(call)
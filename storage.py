@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import os
+import json
+import sqlite3
+import heapq
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+# Хранилище состояния бота. Состояние — набор именованных коллекций key -> value
+# ("sent", "teachers", "admins", ...). Каждое изменение — одна O(1)-операция put/delete;
+# полный снимок пишется только при компакции.
+Collections = Dict[str, Dict[str, Any]]
+SnapshotFn = Callable[[], Collections]
+
+# Раскладка state.json до появления коллекций
+def _from_legacy(data: Dict[str, Any]) -> Collections:
+    return {
+        "sent_packed": {"v": CompactIdSet(data.get("sent_coursework_ids", [])).pack()},
+        "teachers": {str(k): v for k, v in (data.get("teacher_cache_by_chat") or {}).items() if isinstance(v, dict)},
+        "admins": {str(int(x)): True for x in data.get("admin_users", [])},
+    }
+
+def _read_snapshot(path: str) -> Collections:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "collections" in data:
+        return {str(c): dict(items) for c, items in data["collections"].items()}
+    return _from_legacy(data)
+
+def _write_snapshot(path: str, collections: Collections) -> None:
+    fd, tmp_path = tempfile.mkstemp(prefix="state.", suffix=".json", dir=os.path.dirname(path) or ".")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"collections": collections}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# Снимок state.json + append-only журнал рядом (state.json.journal, JSON на строку).
+# Каждые compact_every записей журнал сворачивается в новый снимок и обнуляется.
+class JournalStateBackend:
+    def __init__(self, path: str, compact_every: int = 1000):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self._fh = None
+        self._records = 0
+        self._snapshot_fn: SnapshotFn | None = None
+
+    def load(self) -> Collections:
+        data = _read_snapshot(self.path)
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break  # недописанный хвост после аварийной остановки
+                    coll = data.setdefault(rec["c"], {})
+                    if rec.get("d"):
+                        coll.pop(rec["k"], None)
+                    else:
+                        coll[rec["k"]] = rec.get("v")
+                    replayed += 1
+        if replayed:
+            with self.lock:
+                _write_snapshot(self.path, data)
+                self._truncate()
+        return data
+
+    def bind(self, snapshot_fn: SnapshotFn) -> None:
+        self._snapshot_fn = snapshot_fn
+
+    def _truncate(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        self._fh = open(self.journal_path, "w", encoding="utf-8")
+        self._records = 0
+
+    def _append(self, rec: Dict[str, Any]) -> None:
+        with self.lock:
+            if self._fh is None:
+                self._fh = open(self.journal_path, "a", encoding="utf-8")
+            self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            self._records += 1
+            due = self._records >= self.compact_every
+        if due:
+            self.compact()
+
+    def put(self, collection: str, key: str, value: Any = True) -> None:
+        self._append({"c": collection, "k": key, "v": value})
+
+    def delete(self, collection: str, key: str) -> None:
+        self._append({"c": collection, "k": key, "d": 1})
+
+    def compact(self) -> None:
+        if self._snapshot_fn is None:
+            return
+        with self.lock:
+            _write_snapshot(self.path, self._snapshot_fn())
+            self._truncate()
+
+    def close(self) -> None:
+        self.compact()
+        with self.lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+# SQLite в режиме WAL: одна таблица kv(collection, key, value), каждая операция —
+# отдельная autocommit-транзакция. При первом запуске подхватывает старый state.json.
+class SqliteStateBackend:
+    def __init__(self, path: str, legacy_json: str | None = None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT,"
+            " PRIMARY KEY (collection, key)) WITHOUT ROWID"
+        )
+
+    def load(self) -> Collections:
+        with self.lock:
+            rows = self.conn.execute("SELECT collection, key, value FROM kv").fetchall()
+        if not rows and self.legacy_json and os.path.exists(self.legacy_json):
+            data = _read_snapshot(self.legacy_json)
+            with self.lock:
+                self.conn.execute("BEGIN")
+                for coll, items in data.items():
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+                        [(coll, k, json.dumps(v, ensure_ascii=False)) for k, v in items.items()],
+                    )
+                self.conn.execute("COMMIT")
+            return data
+        data: Collections = {}
+        for coll, key, value in rows:
+            data.setdefault(coll, {})[key] = json.loads(value) if value is not None else None
+        return data
+
+    def bind(self, snapshot_fn: SnapshotFn) -> None:
+        pass  # снимки не нужны
+
+    def put(self, collection: str, key: str, value: Any = True) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+                (collection, key, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def delete(self, collection: str, key: str) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key))
+
+    def compact(self) -> None:
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        self.compact()
+        with self.lock:
+            self.conn.close()
+
+# Компактное множество id курсовых. Числовые id WordPress лежат в отсортированном
+# array('q') (8 байт на id, поиск бинарный) плюс небольшой буфер свежих вставок,
+# который вливается слиянием за O(n) раз в MERGE_AT добавлений. Нечисловые id —
+# в обычном set. В снимок пишется RLE-кодировка: [[начало, длина], ...].
+class CompactIdSet:
+    MERGE_AT = 1024
+
+    def __init__(self, ids: Iterable[Any] = ()):
+        self._sorted = array("q")
+        self._pending: Set[int] = set()
+        self._other: Set[str] = set()
+        for x in ids:
+            self.add(x)
+
+    @staticmethod
+    def _num(x: Any) -> Optional[int]:
+        s = str(x)
+        if s.isascii() and s.isdigit() and len(s) < 19 and (s == "0" or s[0] != "0"):
+            return int(s)
+        return None
+
+    def _in_sorted(self, n: int) -> bool:
+        i = bisect_left(self._sorted, n)
+        return i < len(self._sorted) and self._sorted[i] == n
+
+    def _merge(self) -> None:
+        if self._pending:
+            self._sorted = array("q", heapq.merge(self._sorted, sorted(self._pending)))
+            self._pending.clear()
+
+    def __contains__(self, x: Any) -> bool:
+        n = self._num(x)
+        if n is None:
+            return str(x) in self._other
+        return n in self._pending or self._in_sorted(n)
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._pending) + len(self._other)
+
+    def __iter__(self) -> Iterator[str]:
+        self._merge()
+        for n in self._sorted:
+            yield str(n)
+        yield from self._other
+
+    def add(self, x: Any) -> None:
+        n = self._num(x)
+        if n is None:
+            self._other.add(str(x))
+        elif n not in self._pending and not self._in_sorted(n):
+            self._pending.add(n)
+            if len(self._pending) >= self.MERGE_AT:
+                self._merge()
+
+    def discard(self, x: Any) -> None:
+        n = self._num(x)
+        if n is None:
+            self._other.discard(str(x))
+            return
+        if n in self._pending:
+            self._pending.discard(n)
+            return
+        i = bisect_left(self._sorted, n)
+        if i < len(self._sorted) and self._sorted[i] == n:
+            del self._sorted[i]
+
+    # Оставить только id из alive; возвращает удалённые
+    def prune(self, alive: Iterable[Any]) -> List[str]:
+        self._merge()
+        keep_nums: Set[int] = set()
+        keep_other: Set[str] = set()
+        for x in alive:
+            n = self._num(x)
+            if n is None:
+                keep_other.add(str(x))
+            else:
+                keep_nums.add(n)
+        removed = [str(n) for n in self._sorted if n not in keep_nums]
+        removed += [x for x in self._other if x not in keep_other]
+        if removed:
+            self._sorted = array("q", (n for n in self._sorted if n in keep_nums))
+            self._other &= keep_other
+        return removed
+
+    def pack(self) -> Dict[str, Any]:
+        self._merge()
+        runs: List[List[int]] = []
+        for n in self._sorted:
+            if runs and runs[-1][0] + runs[-1][1] == n:
+                runs[-1][1] += 1
+            else:
+                runs.append([n, 1])
+        return {"runs": runs, "other": sorted(self._other)}
+
+    @classmethod
+    def unpack(cls, packed: Optional[Dict[str, Any]]) -> "CompactIdSet":
+        ids = cls()
+        if packed:
+            ids._sorted = array("q", (start + i for start, length in packed.get("runs", []) for i in range(length)))
+            ids._other = set(map(str, packed.get("other", [])))
+        return ids
+
+def make_backend(kind: str, json_path: str, db_path: str):
+    if kind == "sqlite":
+        return SqliteStateBackend(db_path, legacy_json=json_path)
+    return JournalStateBackend(json_path)
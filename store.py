@@ -0,0 +1,365 @@
+import time
+import heapq
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from api import get_courseworks, get_teachers, TEACHER_CACHE, FETCH_POOL
+from core import STATE_LOCK, TEACHER_CACHE_BY_CHAT, POSSIBLE_CHAT_FIELDS, cache_teacher
+from config import TEACHER_INDEX_TTL, TEACHER_NEGATIVE_TTL
+
+# Общий снимок курсовых в памяти с хеш-индексами по teacher_id, status и (teacher_id, status).
+# Обновляется фоновым поллером дельтами от api.CourseworkSync, хендлеры читают только отсюда.
+# Счётчики для админ-отчётов (статусы, статусы по преподавателям, оценки) ведутся
+# там же, в _index/_unindex, так что их видят и дельты поллера, и hold() для
+# собственных правок из outbox; отчёт — копия словаря без обхода курсовых.
+class CourseworkStore:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ready = threading.Event()
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.by_teacher_idx: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.by_status_idx: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.by_pair_idx: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self.status_counts: Dict[str, int] = {}
+        self.teacher_counts: Dict[str, Dict[str, int]] = {}  # статус -> teacher_id -> число
+        self.grade_counts: Dict[str, int] = {}
+        # Неподтверждённые правки из outbox: cw_id -> поля поверх ответа API,
+        # и сам ответ API для таких курсовых (к нему откатывает release(revert=True))
+        self.overlay: Dict[str, Dict[str, Any]] = {}
+        self.base: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _keys(cw: Dict[str, Any]) -> Tuple[str, str]:
+        return str(cw.get("teacher_id") or ""), str(cw.get("status") or "")
+
+    @staticmethod
+    def _bump(counts: Dict[str, int], key: str, d: int) -> None:
+        n = counts.get(key, 0) + d
+        if n > 0:
+            counts[key] = n
+        else:
+            counts.pop(key, None)
+
+    def _count(self, cw: Dict[str, Any], tid: str, status: str, d: int) -> None:
+        self._bump(self.status_counts, status, d)
+        per_teacher = self.teacher_counts.setdefault(status, {})
+        self._bump(per_teacher, tid, d)
+        if not per_teacher:
+            del self.teacher_counts[status]
+        grade = cw.get("grade")
+        if grade not in (None, ""):
+            self._bump(self.grade_counts, str(grade), d)
+
+    def _index(self, cw_id: str, cw: Dict[str, Any]) -> None:
+        tid, status = self._keys(cw)
+        self.by_teacher_idx.setdefault(tid, {})[cw_id] = cw
+        self.by_status_idx.setdefault(status, {})[cw_id] = cw
+        self.by_pair_idx.setdefault((tid, status), {})[cw_id] = cw
+        self._count(cw, tid, status, 1)
+
+    def _unindex(self, cw_id: str, cw: Dict[str, Any]) -> None:
+        tid, status = self._keys(cw)
+        if cw_id in self.by_teacher_idx.get(tid, {}):
+            self._count(cw, tid, status, -1)
+        for idx, key in ((self.by_teacher_idx, tid), (self.by_status_idx, status), (self.by_pair_idx, (tid, status))):
+            bucket = idx.get(key)
+            if bucket is None:
+                continue
+            bucket.pop(cw_id, None)
+            if not bucket:
+                del idx[key]
+
+    def _upsert(self, cw: Dict[str, Any]) -> None:
+        cw_id = str(cw.get("id") or "")
+        if not cw_id:
+            return
+        pending = self.overlay.get(cw_id)
+        if pending:
+            self.base[cw_id] = cw
+            cw = {**cw, **pending}
+        prev = self.items.get(cw_id)
+        if prev is not None:
+            self._unindex(cw_id, prev)
+        self.items[cw_id] = cw
+        self._index(cw_id, cw)
+
+    def _remove(self, cw_id: str) -> None:
+        prev = self.items.pop(cw_id, None)
+        self.base.pop(cw_id, None)
+        if prev is not None:
+            self._unindex(cw_id, prev)
+
+    def load(self, cws: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            self.items.clear()
+            self.base.clear()
+            self.by_teacher_idx.clear()
+            self.by_status_idx.clear()
+            self.by_pair_idx.clear()
+            self.status_counts.clear()
+            self.teacher_counts.clear()
+            self.grade_counts.clear()
+            for cw in cws:
+                self._upsert(cw)
+        self.ready.set()
+
+    def prime(self, cws: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            if not self.ready.is_set():
+                self.load(cws)
+
+    def apply(self, delta: Dict[str, Any]) -> None:
+        with self.lock:
+            for cw in delta.get("removed", []):
+                self._remove(str(cw.get("id") or ""))
+            for cw in delta.get("added", []) + delta.get("changed", []):
+                self._upsert(cw)
+        self.ready.set()
+
+    # Правка, ещё не подтверждённая API: держится поверх дельт поллера до release().
+    # replace — поля заменяют прежнюю неподтверждённую правку, а не дополняют её
+    def hold(self, cw_id: Any, replace: bool = False, **fields: Any) -> None:
+        key = str(cw_id)
+        with self.lock:
+            if key not in self.overlay and key in self.items:
+                self.base[key] = self.items[key]
+            if replace:
+                self.overlay[key] = dict(fields)
+            else:
+                self.overlay.setdefault(key, {}).update(fields)
+            raw = self.base.get(key)
+            if raw is not None:
+                self._upsert(raw)
+
+    # revert — правка отброшена: курсовая снова показывается такой, какой её отдал API
+    def release(self, cw_id: Any, revert: bool = False) -> None:
+        key = str(cw_id)
+        with self.lock:
+            self.overlay.pop(key, None)
+            raw = self.base.pop(key, None)
+            if revert and raw is not None and key in self.items:
+                self._upsert(raw)
+
+    def get(self, cw_id: Any) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.items.get(str(cw_id))
+
+    def by_teacher(self, teacher_id: Any) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.by_teacher_idx.get(str(teacher_id), {}).values())
+
+    def by_status(self, status: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.by_status_idx.get(status, {}).values())
+
+    def by_teacher_status(self, teacher_id: Any, status: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.by_pair_idx.get((str(teacher_id), status), {}).values())
+
+    # Отчёты: status -> число, teacher_id -> число в статусе, оценка -> число
+    def status_breakdown(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.status_counts)
+
+    def teachers_in_status(self, status: str) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.teacher_counts.get(status, {}))
+
+    def grade_breakdown(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.grade_counts)
+
+    @staticmethod
+    def _order(cw_id: str) -> Tuple[int, int, str]:
+        return (0, int(cw_id), "") if cw_id.isdigit() else (1, 0, cw_id)
+
+    # Страница курсовых преподавателя (и статуса) по курсору — id курсовой, на
+    # которой закончилась/началась соседняя страница: limit записей после cursor
+    # или перед ним (backward). Вся выборка не сортируется: heapq за O(n log limit).
+    # Курсор на исчезнувшую границу даёт первую страницу.
+    # -> (записи страницы, сколько записей до неё, всего)
+    def page(self, teacher_id: Any, status: Optional[str] = None, cursor: Optional[str] = None,
+             backward: bool = False, limit: int = 10) -> Tuple[List[Dict[str, Any]], int, int]:
+        tid = str(teacher_id)
+        with self.lock:
+            bucket = self.by_pair_idx.get((tid, status)) if status is not None else self.by_teacher_idx.get(tid)
+            rows = dict(bucket or {})
+        order = self._order
+        keys = {cw_id: order(cw_id) for cw_id in rows}
+        picked: List[str] = []
+        if cursor is not None:
+            edge = order(str(cursor))
+            if backward:
+                picked = heapq.nlargest(limit, (k for k, o in keys.items() if o < edge), key=keys.__getitem__)[::-1]
+            else:
+                picked = heapq.nsmallest(limit, (k for k, o in keys.items() if o > edge), key=keys.__getitem__)
+        if not picked:
+            picked = heapq.nsmallest(limit, keys, key=keys.__getitem__)
+        if not picked:
+            return [], 0, 0
+        first = keys[picked[0]]
+        skipped = sum(1 for o in keys.values() if o < first)
+        return [rows[k] for k in picked], skipped, len(rows)
+
+    def count(self, teacher_id: Any = None, status: Optional[str] = None) -> int:
+        with self.lock:
+            if teacher_id is not None and status is not None:
+                return len(self.by_pair_idx.get((str(teacher_id), status), {}))
+            if teacher_id is not None:
+                return len(self.by_teacher_idx.get(str(teacher_id), {}))
+            if status is not None:
+                return len(self.by_status_idx.get(status, {}))
+            return len(self.items)
+
+COURSEWORK_STORE = CourseworkStore()
+
+def ensure_store_ready(timeout: float = 3.0) -> bool:
+    # Поллер наполняет снимок первым циклом; если он ещё не успел — грузим список сами
+    if COURSEWORK_STORE.ready.wait(timeout):
+        return True
+    cws = get_courseworks()
+    if not cws:
+        return False
+    COURSEWORK_STORE.prime(cws)
+    return True
+
+# Индекс chat_id -> преподаватель по всем полям чата. Перестраивается целиком из
+# get_teachers() раз в ttl секунд; промах по свежему индексу запоминается в
+# негативном кеше на negative_ttl, чтобы повторные клики незарегистрированных
+# пользователей не качали список заново. lookup() -> (определено, преподаватель):
+# False значит, что индекс построить не удалось (API недоступно).
+class TeacherChatIndex:
+    def __init__(self, fields: Sequence[str], ttl: float = 300.0, negative_ttl: float = 120.0, min_rebuild: float = 30.0):
+        self.fields = tuple(fields)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.min_rebuild = min_rebuild
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+        self.index: Dict[str, Dict[str, Any]] = {}
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.negative: Dict[str, float] = {}
+        self.built_at: Optional[float] = None
+
+    def _age(self, now: float) -> float:
+        return float("inf") if self.built_at is None else now - self.built_at
+
+    def rebuild(self) -> bool:
+        return self.rebuild_from(get_teachers())
+
+    def rebuild_from(self, teachers: List[Dict[str, Any]]) -> bool:
+        if not teachers:
+            return False
+        idx: Dict[str, Dict[str, Any]] = {}
+        by_id = {str(t.get("id")): t for t in teachers if t.get("id") is not None}
+        for t in teachers:
+            for fld in self.fields:
+                val = t.get(fld)
+                if val is not None and str(val) != "":
+                    idx.setdefault(str(val), t)
+        with self.lock:
+            self.index = idx
+            self.by_id = by_id
+            self.negative.clear()
+            self.built_at = time.monotonic()
+        return True
+
+    # Ответ без перестройки индекса; None — нужна перестройка
+    def cached(self, chat_id: Any) -> Optional[Tuple[bool, Optional[Dict[str, Any]]]]:
+        key = str(chat_id)
+        with self.lock:
+            now = time.monotonic()
+            age = self._age(now)
+            if age < self.ttl:
+                if key in self.index:
+                    return True, self.index[key]
+                if self.negative.get(key, 0.0) > now:
+                    return True, None
+                if age < self.min_rebuild:
+                    self.negative[key] = now + self.negative_ttl
+                    return True, None
+        return None
+
+    # Ответ по только что перестроенному индексу (промах уходит в негативный кеш)
+    def settle(self, chat_id: Any) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        key = str(chat_id)
+        with self.lock:
+            teacher = self.index.get(key)
+            if teacher is None:
+                self.negative[key] = time.monotonic() + self.negative_ttl
+            return True, teacher
+
+    def lookup(self, chat_id: Any) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        hit = self.cached(chat_id)
+        if hit is not None:
+            return hit
+        seen = self.built_at
+        with self.rebuild_lock:
+            if self.built_at == seen and not self.rebuild():
+                return False, None
+        return self.settle(chat_id)
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.built_at = None
+            self.negative.clear()
+
+    # Перестройка в пуле, не дожидаясь результата (не чаще min_rebuild)
+    def refresh_in_background(self, pool) -> None:
+        if self._age(time.monotonic()) < self.min_rebuild or self.rebuild_lock.locked():
+            return
+
+        def run():
+            if not self.rebuild_lock.acquire(blocking=False):
+                return
+            try:
+                self.rebuild()
+            finally:
+                self.rebuild_lock.release()
+        pool.submit(run)
+
+TEACHER_INDEX = TeacherChatIndex(POSSIBLE_CHAT_FIELDS, ttl=TEACHER_INDEX_TTL, negative_ttl=TEACHER_NEGATIVE_TTL)
+# Когда запись TEACHER_CACHE_BY_CHAT подтверждалась индексом (monotonic); загруженные из файла — устаревшие
+_TEACHER_CACHED_AT: Dict[str, float] = {}
+
+# Имена преподавателей для админ-отчётов без запросов к API: из последнего
+# списка TEACHER_INDEX и кеша get_teacher; неизвестные — фоновая перестройка индекса
+def teacher_names(teacher_ids) -> Dict[str, str]:
+    ids = [str(t) for t in teacher_ids]
+    with TEACHER_INDEX.lock:
+        known = {tid: TEACHER_INDEX.by_id[tid] for tid in ids if tid in TEACHER_INDEX.by_id}
+    cached, missing = TEACHER_CACHE.get_many([tid for tid in ids if tid not in known])
+    known.update(cached)
+    if missing:
+        TEACHER_INDEX.refresh_in_background(FETCH_POOL)
+    return {tid: t["name"] for tid, t in known.items() if t.get("name")}
+
+# Преподаватель из TEACHER_CACHE_BY_CHAT: (свежий ли, запись)
+def cached_teacher_for_chat(chat_id: Any) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    key = str(chat_id)
+    with STATE_LOCK:
+        cached = TEACHER_CACHE_BY_CHAT.get(key)
+        at = _TEACHER_CACHED_AT.get(key)
+    fresh = cached is not None and at is not None and time.monotonic() - at < TEACHER_INDEX_TTL
+    return fresh, cached
+
+# Запомнить результат TEACHER_INDEX.lookup() для чата
+def settle_teacher_for_chat(chat_id: Any, resolved: bool, teacher: Optional[Dict[str, Any]],
+                            cached: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    key = str(chat_id)
+    if not resolved:
+        return cached  # API недоступно — отдаём то, что было
+    with STATE_LOCK:
+        if teacher is not None:
+            _TEACHER_CACHED_AT[key] = time.monotonic()
+        else:
+            _TEACHER_CACHED_AT.pop(key, None)
+    cache_teacher(key, teacher)
+    return teacher
+
+def teacher_from_chat(chat_id: int) -> Optional[Dict[str, Any]]:
+    fresh, cached = cached_teacher_for_chat(chat_id)
+    if fresh:
+        return cached
+    resolved, teacher = TEACHER_INDEX.lookup(chat_id)
+    return settle_teacher_for_chat(chat_id, resolved, teacher, cached)
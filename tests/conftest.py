@@ -0,0 +1,42 @@
+# Общая обвязка тестов: модули бота читают окружение при импорте, поэтому
+# заглушки WordPress и Bot API (bench/fakes.py) поднимаются и окружение
+# выставляется здесь, до первого импорта core/api. Состояние — во временном каталоге.
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from fakes import FakeBotAPI, FakeWordPress  # noqa: E402
+
+WP = FakeWordPress(teachers=5, students=50, courseworks=40).start()
+TG = FakeBotAPI().start()
+STATE_DIR = tempfile.mkdtemp(prefix="startfit-tests-")
+
+os.environ.update(
+    BOT_TOKEN="1:test",
+    API_BASE=WP.url,
+    STATE_FILE=os.path.join(STATE_DIR, "state.json"),
+    STATE_DB=os.path.join(STATE_DIR, "state.db"),
+)
+
+from telebot import apihelper  # noqa: E402
+
+apihelper.API_URL = TG.url + "/bot{0}/{1}"
+
+@pytest.fixture
+def wp():
+    return WP
+
+@pytest.fixture
+def tg():
+    TG.reset()
+    return TG
+
+def pytest_sessionfinish(session, exitstatus):
+    import core
+    core.SEND_SCHEDULER.stop()
@@ -0,0 +1,39 @@
+from collections import deque
+
+import lanes
+from lanes import _pop
+
+def _queue(*items):
+    # (когда поставлен, вид, чат, апдейт)
+    return deque((i, kind, chat, f"{kind[0]}{i}") for i, (kind, chat) in enumerate(items))
+
+def _drain(queue):
+    out = []
+    while queue:
+        out.append(_pop(queue)[3])
+    return out
+
+def test_callback_overtakes_other_chats():
+    q = _queue(("message", 1), ("message", 2), ("callback", 3))
+    assert _drain(q) == ["c2", "m0", "m1"]
+
+def test_callback_never_overtakes_its_own_chat():
+    q = _queue(("message", 1), ("callback", 1), ("message", 2), ("callback", 2), ("callback", 3))
+    # c4 (чат 3) — первым; колбэки чатов 1 и 2 ждут свои сообщения
+    assert _drain(q) == ["c4", "m0", "c1", "m2", "c3"]
+
+def test_per_chat_order_is_fifo():
+    items = [("message", 1), ("callback", 2), ("callback", 1), ("message", 2), ("callback", 1), ("message", 1)]
+    order = _drain(_queue(*items))
+    for chat in (1, 2):
+        mine = [f"{k[0]}{i}" for i, (k, c) in enumerate(items) if c == chat]
+        assert [u for u in order if u in mine] == mine
+
+def test_without_callbacks_pops_head():
+    q = _queue(("message", 1), ("message", 2), ("other", 3))
+    assert _drain(q) == ["m0", "m1", "o2"]
+
+def test_scan_is_bounded(monkeypatch):
+    monkeypatch.setattr(lanes, "_SCAN_LIMIT", 3)
+    q = _queue(("message", 1), ("message", 2), ("message", 3), ("callback", 4))
+    assert _pop(q)[3] == "m0"
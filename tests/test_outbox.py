@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from outbox import CourseworkOutbox, _permanent
+from store import CourseworkStore
+
+class _Api:
+    def __init__(self, *codes):
+        self.codes = list(codes)
+        self.sent = []
+
+    def __call__(self, cw_id, status, grade=None, comment=None):
+        self.sent.append((cw_id, status, grade, comment))
+        return self.codes.pop(0) if self.codes else 200
+
+def _outbox(api, **kwargs):
+    store = CourseworkStore()
+    store.load([{"id": 1, "status": "Новая", "teacher_id": 7, "grade": None}])
+    dropped = []
+    outbox = CourseworkOutbox(send=api, store=store, on_drop=lambda *args: dropped.append(args), **kwargs)
+    return outbox, store, dropped
+
+def _flush_next(outbox):
+    item = outbox._next()
+    assert item is not None
+    outbox._flush(*item)
+
+@pytest.mark.parametrize("code, permanent", [
+    (None, False), (200, False), (400, True), (404, True), (422, True),
+    (401, False), (403, False), (408, False), (429, False), (500, False), (503, False),
+])
+def test_permanent(code, permanent):
+    assert _permanent(code) is permanent
+
+def test_same_status_merges_fields():
+    outbox, store, _ = _outbox(_Api())
+    outbox.submit(1, "Проверено", grade=4, chat_id=100)
+    outbox.submit(1, "Проверено", comment="ok")
+    assert outbox.entries["1"].fields == {"status": "Проверено", "grade": 4, "comment": "ok"}
+    assert store.get(1)["status"] == "Проверено" and store.get(1)["grade"] == 4
+
+def test_status_change_replaces_fields():
+    outbox, store, _ = _outbox(_Api())
+    outbox.submit(1, "Проверено", grade=5, chat_id=100)
+    outbox.submit(1, "Отклонено")
+    assert outbox.entries["1"].fields == {"status": "Отклонено"}
+    assert outbox.entries["1"].chat_id == 100
+    assert store.get(1)["status"] == "Отклонено" and store.get(1)["grade"] is None
+
+def test_success_releases_with_new_value():
+    api = _Api(200)
+    outbox, store, dropped = _outbox(api)
+    outbox.submit(1, "Проверено", grade=5)
+    _flush_next(outbox)
+    assert api.sent == [("1", "Проверено", 5, None)]
+    assert not outbox.pending(1) and dropped == []
+    assert store.get(1)["status"] == "Проверено"
+    assert not store.overlay and not store.base
+
+def test_permanent_error_drops_and_reverts():
+    outbox, store, dropped = _outbox(_Api(422))
+    outbox.submit(1, "Проверено", grade=5, chat_id=100)
+    _flush_next(outbox)
+    assert not outbox.pending(1)
+    assert dropped == [("1", {"status": "Проверено", "grade": 5}, 100, 422)]
+    assert store.get(1)["status"] == "Новая" and store.get(1)["grade"] is None
+    assert outbox.stats()["dropped"] == 1
+
+def test_transient_errors_retry_then_drop_after_max_attempts():
+    outbox, store, dropped = _outbox(_Api(503, None, 503), max_attempts=3)
+    outbox.submit(1, "Отклонено", chat_id=100)
+    for attempt in (1, 2):
+        _flush_next(outbox)
+        entry = outbox.entries["1"]
+        assert entry.attempts == attempt and entry.due > time.monotonic()
+        assert store.get(1)["status"] == "Отклонено"
+        entry.due = 0.0  # не ждать паузу между повторами
+    _flush_next(outbox)
+    assert not outbox.pending(1)
+    assert dropped == [("1", {"status": "Отклонено"}, 100, 503)]
+    assert store.get(1)["status"] == "Новая"
+
+def test_newer_edit_during_send_is_kept():
+    outbox, store, dropped = _outbox(_Api(422))
+    outbox.submit(1, "Проверено", grade=3)
+    item = outbox._next()
+    outbox.submit(1, "Проверено", grade=4)  # пришла, пока шёл запрос
+    outbox._flush(*item)
+    assert outbox.pending(1) and dropped == []
+    assert outbox.entries["1"].fields["grade"] == 4
+    assert store.get(1)["grade"] == 4
@@ -0,0 +1,73 @@
+from bench_rate_limiter import LIMITS, semantics
+from ratelimit import RateLimiter
+
+def _limiter(**kwargs):
+    clock = [1000.0]
+    limiter = RateLimiter(LIMITS, **kwargs)
+    limiter._now = lambda: clock[0]
+    return limiter, clock
+
+def test_short_window_blocks_for_cooldown():
+    limiter, clock = _limiter()
+    for _ in range(5):
+        assert limiter.allow(1, 'msg') == (True, 0)
+        clock[0] += 1.0
+    assert limiter.allow(1, 'msg') == (False, 31)
+    clock[0] += 29.5
+    assert limiter.allow(1, 'msg') == (False, 1)
+    clock[0] += 1.0
+    assert limiter.allow(1, 'msg') == (True, 0)
+
+def test_window_slides_instead_of_refilling():
+    limiter, clock = _limiter()
+    for _ in range(5):
+        assert limiter.allow(1, 'msg')[0]
+    clock[0] += 5.0  # все пять ещё в 10-секундном окне
+    assert not limiter.allow(1, 'msg')[0]
+
+def test_long_window():
+    limiter, clock = _limiter()
+    for i in range(20):
+        assert limiter.allow(1, 'msg')[0], i
+        clock[0] += 2.5  # 4 за 10 с — короткое окно не срабатывает
+    assert not limiter.allow(1, 'msg')[0]
+
+def test_keys_are_per_user_and_kind():
+    limiter, _ = _limiter()
+    for _ in range(5):
+        limiter.allow(1, 'msg')
+    assert not limiter.allow(1, 'msg')[0]
+    assert limiter.allow(2, 'msg')[0]
+    assert limiter.allow(1, 'cb')[0]
+
+def test_duplicates():
+    limiter, clock = _limiter()
+    assert not limiter.is_duplicate(1, "/start")
+    assert limiter.is_duplicate(1, "/start")
+    assert not limiter.is_duplicate(2, "/start")
+    assert not limiter.is_duplicate(1, None)
+    clock[0] += 2.0
+    assert not limiter.is_duplicate(1, "/start")
+
+def test_idle_keys_are_evicted():
+    limiter, clock = _limiter(stripes=1, sweep_every=30.0)
+    for uid in range(100):
+        limiter.allow(uid, 'msg')
+        limiter.is_duplicate(uid, "hi")
+    assert limiter.stats()["keys"] == 100
+    clock[0] += 61.0
+    limiter.allow(1000, 'cb')
+    assert limiter.stats() == {"keys": 1, "dups": 0, "stripes": 1}
+
+def test_blocked_key_is_not_evicted():
+    limiter, clock = _limiter(stripes=1, sweep_every=1.0)
+    for _ in range(6):
+        limiter.allow(1, 'msg')
+    clock[0] += 2.0
+    limiter.allow(2, 'msg')  # проход полосы
+    assert not limiter.allow(1, 'msg')[0]
+
+def test_decisions_match_legacy_sliding_window():
+    compared, looser, stricter = semantics(200)
+    assert compared == 200 * 120
+    assert (looser, stricter) == (0, 0)
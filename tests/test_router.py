@@ -0,0 +1,53 @@
+from core import CallbackRouter
+
+def _router():
+    router = CallbackRouter()
+    for pattern in ("start", "admin_main", "view_{tid}", "view_{tid}_{move}_{cursor}",
+                    "set_grade_{cid}_{grade:int}", "set_grade_{raw:rest}", "help_{ctx:rest}"):
+        router.route(pattern)(pattern)  # обработчик — сам шаблон, чтобы видеть, что совпало
+    return router
+
+def test_exact_routes():
+    router = _router()
+    assert router.match("start") == ("start", {})
+    assert router.match("admin_main") == ("admin_main", {})
+
+def test_params_are_split_on_underscore():
+    router = _router()
+    assert router.match("view_7") == ("view_{tid}", {"tid": "7"})
+    assert router.match("view_7_next_42") == ("view_{tid}_{move}_{cursor}", {"tid": "7", "move": "next", "cursor": "42"})
+
+def test_typed_params_are_converted():
+    router = _router()
+    func, kwargs = router.match("set_grade_15_5")
+    assert func == "set_grade_{cid}_{grade:int}"
+    assert kwargs == {"cid": "15", "grade": 5}
+
+def test_failed_type_falls_through_to_next_route():
+    router = _router()
+    assert router.match("set_grade_15_x") == ("set_grade_{raw:rest}", {"raw": "15_x"})
+
+def test_rest_param_takes_underscores():
+    router = _router()
+    assert router.match("help_admin_view") == ("help_{ctx:rest}", {"ctx": "admin_view"})
+
+def test_no_match():
+    router = _router()
+    assert router.match("") == (None, None)
+    assert router.match("unknown") == (None, None)
+    assert router.match("view_") == (None, None)
+    assert router.match("start_") == (None, None)
+
+def test_dispatch_passes_params():
+    router = CallbackRouter()
+    seen = []
+    router.route("set_reject_{cw_id}")(lambda call, cw_id: seen.append((call, cw_id)))
+
+    class Call:
+        data = "set_reject_12"
+
+    call = Call()
+    router.dispatch(call)
+    assert seen == [(call, "12")]
+    call.data = "nothing"
+    assert router.dispatch(call) is None
@@ -0,0 +1,143 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import core
+import screens
+from ratelimit import RateLimiter
+
+class _Port:
+    def __init__(self, teacher=None, ready=True):
+        self.calls = []
+        self._teacher = teacher
+        self._ready = ready
+
+    def _record(self, name, *args):
+        self.calls.append((name,) + args)
+
+    def send(self, chat_id, text, **kwargs):
+        self._record("send", chat_id, text)
+        return SimpleNamespace(message_id=1)
+
+    def reply(self, msg, text, **kwargs):
+        self._record("reply", text)
+
+    def edit(self, call, text, **kwargs):
+        self._record("edit", text)
+
+    def answer(self, call, text=None, **kwargs):
+        self._record("answer", text)
+
+    def clear_markup(self, call):
+        self._record("clear_markup")
+
+    def delete(self, chat_id, message_id):
+        self._record("delete", message_id)
+
+    def teachers(self):
+        return [{"id": 7, "name": "Ivanov"}]
+
+    def teacher(self, tid):
+        return {"id": tid, "name": "Ivanov"}
+
+    def student(self, sid):
+        return {"id": sid, "name": "Petrov"}
+
+    def coursework(self, cw_id):
+        return None
+
+    def teacher_with_students(self, tid, student_ids):
+        return self.teacher(tid), {str(s): self.student(s) for s in student_ids}
+
+    def teacher_for_chat(self, chat_id):
+        return self._teacher
+
+    def store_ready(self):
+        return self._ready
+
+class _AsyncPort:
+    def __init__(self, port):
+        self.port = port
+
+    def __getattr__(self, name):
+        fn = getattr(self.port, name)
+
+        async def call(*args, **kwargs):
+            return fn(*args, **kwargs)
+        return call
+
+def _call(uid, data=""):
+    return SimpleNamespace(id="c1", data=data, from_user=SimpleNamespace(id=uid),
+                           message=SimpleNamespace(message_id=9, text="card", chat=SimpleNamespace(id=uid)))
+
+@pytest.fixture(autouse=True)
+def _admins(monkeypatch):
+    monkeypatch.setattr(core, "ADMIN_USERS", {1})
+
+def test_every_port_request_is_a_port_method():
+    for name in screens.PORT_METHODS:
+        assert callable(getattr(_Port(), name))
+    with pytest.raises(AttributeError):
+        screens.io.edit_message_text
+
+@pytest.mark.parametrize("screen", [
+    screens.on_admin_main, screens.on_admin_pending, screens.on_admin_stats, screens.on_admin_search,
+])
+def test_admin_screens_deny_non_admins(screen):
+    port = _Port()
+    screens.run_sync(screen(_call(2)), port)
+    assert port.calls == [("answer", "❌ Доступ запрещён")]
+
+def test_view_teacher_denies_before_loading_data():
+    port = _Port()
+    screens.run_sync(screens.on_view_teacher(_call(2), "7"), port)
+    assert port.calls == [("answer", "❌ Доступ запрещён")]
+
+def test_admin_screen_reports_unloaded_store():
+    port = _Port(ready=False)
+    screens.run_sync(screens.on_admin_pending(_call(1)), port)
+    assert port.calls == [("edit", "❌ Не удалось загрузить данные"), ("answer", "Ошибка загрузки данных")]
+
+def test_teacher_screens_require_registration():
+    port = _Port(teacher=None)
+    screens.run_sync(screens.on_teacher_main(_call(5)), port)
+    screens.run_sync(screens.on_manual_review_list(_call(5)), port)
+    assert port.calls == [("answer", "❌ Нет регистрации преподавателя")] * 2
+
+def test_teacher_main_for_registered_teacher():
+    port = _Port(teacher={"id": 7, "name": "Ivanov"})
+    screens.run_sync(screens.on_teacher_main(_call(5)), port)
+    assert [c[0] for c in port.calls] == ["edit", "answer"]
+    assert "Ivanov" in port.calls[0][1]
+
+def test_port_errors_reach_the_screen():
+    class Failing(_Port):
+        def edit(self, call, text, **kwargs):
+            raise RuntimeError("telegram is down")
+
+    with pytest.raises(RuntimeError):
+        screens.run_sync(screens.on_start_cb(_call(1)), Failing())
+
+@pytest.mark.parametrize("uid", [1, 2])
+@pytest.mark.parametrize("screen", [screens.on_admin_main, screens.on_teacher_main, screens.on_start_cb])
+def test_sync_and_async_drivers_agree(screen, uid):
+    sync_port, async_port = _Port(teacher={"id": 7}), _Port(teacher={"id": 7})
+    screens.run_sync(screen(_call(uid)), sync_port)
+    asyncio.run(screens.run_async(screen(_call(uid)), _AsyncPort(async_port)))
+    assert sync_port.calls and sync_port.calls == async_port.calls
+
+def test_flood_guard_answers_throttled_callbacks_and_messages(monkeypatch):
+    monkeypatch.setattr(screens, "RATE_LIMITER", RateLimiter(core.LIMITS))
+    monkeypatch.setattr(screens, "auto_delete_message", lambda *args, **kwargs: None)
+    port = _Port()
+    allowed = [screens.run_sync(screens.flood_guard(_call(3), 'cb'), port) for _ in range(11)]
+    assert allowed == [True] * 10 + [False]
+    assert port.calls[0][0] == "answer" and port.calls[0][1].startswith("⏳")
+    assert port.calls[1][0] == "send" and port.calls[1][2].startswith("⏳")
+
+    port = _Port()
+    msg = SimpleNamespace(id=11, text="hi", from_user=SimpleNamespace(id=4), chat=SimpleNamespace(id=4))
+    assert screens.run_sync(screens.flood_guard(msg, 'msg'), port)
+    assert not screens.run_sync(screens.flood_guard(msg, 'msg'), port)
+    assert port.calls == [("send", 4, "⚠️ Повтор того же сообщения. Подождите немного.")]
@@ -0,0 +1,72 @@
+import json
+
+from storage import CompactIdSet, JournalStateBackend
+
+def test_compact_id_set_pack_unpack_roundtrip():
+    ids = CompactIdSet(["1", "2", "3", "7", 8, "10", "abc", "007"])
+    packed = ids.pack()
+    assert packed == {"runs": [[1, 3], [7, 2], [10, 1]], "other": ["007", "abc"]}
+    restored = CompactIdSet.unpack(json.loads(json.dumps(packed)))
+    assert sorted(restored) == sorted(ids)
+    assert "8" in restored and 8 in restored
+    assert "007" in restored and "7" in restored
+    assert "4" not in restored and "abc " not in restored
+    assert len(restored) == 8
+
+def test_compact_id_set_merges_pending_inserts():
+    ids = CompactIdSet()
+    for n in range(CompactIdSet.MERGE_AT + 10, 0, -1):
+        ids.add(n)
+    ids.add(5)  # повтор не добавляется
+    assert len(ids) == CompactIdSet.MERGE_AT + 10
+    assert ids.pack()["runs"] == [[1, CompactIdSet.MERGE_AT + 10]]
+
+def test_compact_id_set_prune_and_discard():
+    ids = CompactIdSet(["1", "2", "3", "x", "y"])
+    removed = ids.prune(["2", "3", "y", "99"])
+    assert sorted(removed) == ["1", "x"]
+    assert sorted(ids) == ["2", "3", "y"]
+    ids.discard("2")
+    ids.discard("y")
+    ids.discard("404")
+    assert list(ids) == ["3"]
+
+def test_unpack_empty():
+    assert len(CompactIdSet.unpack(None)) == 0
+    assert len(CompactIdSet.unpack({})) == 0
+
+def test_journal_replays_into_snapshot(tmp_path):
+    path = str(tmp_path / "state.json")
+    backend = JournalStateBackend(path)
+    backend.put("admins", "1")
+    backend.put("teachers", "100", {"id": 7})
+    backend.put("admins", "2")
+    backend.delete("admins", "1")
+    backend._fh.close()
+
+    # недописанная последняя строка (аварийная остановка) не ломает загрузку
+    with open(path + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"c": "admins", "k": "3", "v"')
+
+    data = JournalStateBackend(path).load()
+    assert data == {"admins": {"2": True}, "teachers": {"100": {"id": 7}}}
+    # после воспроизведения журнал свёрнут в снимок
+    assert open(path + ".journal", encoding="utf-8").read() == ""
+    assert JournalStateBackend(path).load() == data
+
+def test_journal_compacts_every_n_records(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = {"sent": {}}
+    backend = JournalStateBackend(path, compact_every=3)
+    backend.bind(lambda: {c: dict(items) for c, items in state.items()})
+    for k in ("1", "2", "3"):
+        state["sent"][k] = True
+        backend.put("sent", k)
+    assert open(path + ".journal", encoding="utf-8").read() == ""
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"collections": {"sent": {"1": True, "2": True, "3": True}}}
+
+    state["sent"]["4"] = True
+    backend.put("sent", "4")
+    backend.close()
+    assert JournalStateBackend(path).load() == {"sent": {"1": True, "2": True, "3": True, "4": True}}
@@ -0,0 +1,96 @@
+import time
+
+import api
+import poller
+from api import CourseworkSync
+from store import CourseworkStore
+
+def _cw(cw_id, status="Новая", modified="1"):
+    return {"id": cw_id, "status": status, "teacher_id": 1, "student_id": 1, "modified": modified}
+
+def test_absorb_full_snapshot():
+    sync = CourseworkSync()
+    full, headers, params = sync.prepare()
+    assert full and "If-None-Match" not in headers and params == {}
+    delta = sync.absorb(True, 200, {"ETag": '"a"'}, [_cw(1), _cw(2)])
+    assert [cw["id"] for cw in delta["added"]] == [1, 2]
+    assert delta["changed"] == [] and delta["removed"] == []
+    assert delta["snapshot"] is True
+    assert sorted(sync.ids()) == ["1", "2"]
+    _, headers, _ = sync.prepare()
+    assert headers["If-None-Match"] == '"a"'
+
+def test_absorb_304_is_empty_and_not_a_snapshot():
+    sync = CourseworkSync()
+    sync.absorb(True, 200, {}, [_cw(1)])
+    delta = sync.absorb(True, 304, {}, None)
+    assert delta == {"added": [], "changed": [], "removed": [], "full": True, "snapshot": False}
+    assert sync.ids() == ["1"]
+
+def test_absorb_reports_changes_and_removals():
+    sync = CourseworkSync()
+    sync.absorb(True, 200, {}, [_cw(1), _cw(2), _cw(3)])
+    delta = sync.absorb(True, 200, {}, [_cw(1), _cw(2, status="На проверке", modified="2")])
+    assert delta["added"] == []
+    assert [cw["id"] for cw in delta["changed"]] == [2]
+    assert [cw["id"] for cw in delta["removed"]] == [3]
+    assert sorted(sync.ids()) == ["1", "2"]
+
+def test_partial_response_does_not_remove(monkeypatch):
+    monkeypatch.setattr(api, "WP_DELTA_PARAM", "modified_after")
+    sync = CourseworkSync(full_every=10)
+    full, _, _ = sync.prepare()
+    sync.absorb(full, 200, {}, [_cw(1, modified="5"), _cw(2, modified="7")])
+    full, _, params = sync.prepare()
+    assert not full and params == {"modified_after": "7"}
+    delta = sync.absorb(full, 200, {}, [_cw(2, status="Проверено", modified="8")])
+    assert delta["snapshot"] is False and delta["removed"] == []
+    assert [cw["id"] for cw in delta["changed"]] == [2]
+    assert sorted(sync.ids()) == ["1", "2"]
+
+def test_failed_or_malformed_response_is_none():
+    sync = CourseworkSync()
+    sync.absorb(True, 200, {}, [_cw(1)])
+    assert sync.absorb(True, 500, {}, None) is None
+    assert sync.absorb(True, 200, {}, {"code": "rest_forbidden"}) is None
+    assert sync.absorb(True, 200, {}, {}) is None
+    assert sync.ids() == ["1"]
+
+def test_poll_against_fake_wordpress_uses_conditional_get(wp):
+    sync = CourseworkSync()
+    first = sync.poll()
+    assert first["snapshot"] and len(first["added"]) == len(wp.courseworks)
+    second = sync.poll()
+    assert second["snapshot"] is False and not (second["added"] or second["changed"] or second["removed"])
+    wp.churn(0.1)
+    third = sync.poll()
+    assert third["snapshot"] and third["changed"] and not third["removed"]
+
+# Регрессия: тихий цикл (304) не делает работы на курсовую — не обходит снимок,
+# не чистит SENT_COURSEWORK_IDS и укладывается в порог даже на большом снимке
+def test_quiet_poll_cycle_does_no_per_item_work(monkeypatch):
+    store = CourseworkStore()
+    store.load([_cw(i) for i in range(1, 20001)])
+    monkeypatch.setattr(poller, "COURSEWORK_STORE", store)
+    calls = {"deliver": 0, "prune": 0, "upsert": 0}
+
+    def counter(name):
+        def count(*args, **kwargs):
+            calls[name] += 1
+            return 0
+        return count
+
+    monkeypatch.setattr(poller, "_deliver_coursework", counter("deliver"))
+    monkeypatch.setattr(poller, "prune_sent", counter("prune"))
+    monkeypatch.setattr(store, "_upsert", counter("upsert"))
+    monkeypatch.setattr(poller, "_UNDELIVERED", {})
+    monkeypatch.setattr(poller, "_POSTPONED_FILES", {})
+
+    quiet = CourseworkSync().absorb(True, 304, {}, None)
+    t0 = time.perf_counter()
+    for _ in range(100):
+        poller.process_delta(quiet)
+    per_cycle_ms = (time.perf_counter() - t0) * 1000 / 100
+
+    assert calls == {"deliver": 0, "prune": 0, "upsert": 0}
+    assert per_cycle_ms < 2.0
@@ -0,0 +1,216 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from telebot import types
+
+from resilience import is_stale
+from core import add_back_button, back_kb, STATUS_NEW, STATUS_REVIEWING, STATUS_CHECKED, STATUS_REJECTED
+
+# Тексты и клавиатуры экранов. Чистые функции от уже загруженных данных —
+# общие для синхронного (handlers) и асинхронного (bot_async) движков.
+View = Tuple[str, types.InlineKeyboardMarkup]
+
+WELCOME_TEXT = (
+    "👋 Добро пожаловать в StartFit Bot!\n\n"
+    "🤖 Помощь в работе с курсовыми.\n"
+    "📱 Используйте кнопку ниже для получения ID.\n\n"
+    "👨💼 Для админ-доступа отправьте кодовое слово."
+)
+HELP_TEXT = (
+    "📖 Доступные команды:\n\n"
+    "🔸 /start - Главное меню\n"
+    "🔸 /help - Эта справка\n"
+    "🔸 /admin - Админ-панель (после авторизации)\n\n"
+    "🔐 Для админ-доступа отправьте кодовое слово."
+)
+ADMIN_DENIED_TEXT = "❌ Доступ запрещён!\n\nОтправьте кодовое слово для получения админ-доступа."
+ADMIN_PANEL_TEXT = "👨💼 Админ-панель:\n\nВыберите действие:"
+# Ответы допуска апдейтов (lanes.py): очередь переполнена / апдейт прождал дольше дедлайна
+BUSY_CALLBACK_TEXT = "⏳ Бот сейчас перегружен. Повторите через минуту."
+LATE_CALLBACK_TEXT = "⏳ Запрос ждал слишком долго. Нажмите кнопку ещё раз."
+BUSY_MESSAGE_TEXT = "⏳ Бот сейчас перегружен, сообщение не обработано. Отправьте его ещё раз через минуту."
+LATE_MESSAGE_TEXT = "⏳ Бот был перегружен, сообщение не обработано. Отправьте его ещё раз."
+ADMIN_SEARCH_TEXT = "🔍 Поиск преподавателя:\n\nВведите имя или ID преподавателя обычным сообщением.\nНапример: Иванов или 123"
+
+# (callback_query | None, chat_id | None, текст) короткого ответа на отклонённый апдейт
+def shed_reply(update, reason: str) -> Tuple[Any, Optional[int], str]:
+    cb = getattr(update, "callback_query", None)
+    if cb is not None:
+        return cb, None, BUSY_CALLBACK_TEXT if reason == "busy" else LATE_CALLBACK_TEXT
+    msg = getattr(update, "message", None)
+    if msg is not None:
+        return None, msg.chat.id, BUSY_MESSAGE_TEXT if reason == "busy" else LATE_MESSAGE_TEXT
+    return None, None, ""
+
+# Правка курсовой из outbox отброшена: отклонена API или не ушла за все попытки
+def outbox_dropped_text(cw_id: Any, fields: Dict[str, Any], code: Optional[int]) -> str:
+    what = fields.get("status") or ""
+    if fields.get("grade") is not None:
+        what += f", оценка {fields['grade']}"
+    reason = f"сервер ответил {code}" if code else "сервер недоступен"
+    return f"⚠️ Изменение курсовой #{cw_id} ({what}) не сохранено: {reason}.\nОткройте курсовую и повторите действие."
+
+def admin_granted_view() -> View:
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(
+        types.InlineKeyboardButton("👨💼 Открыть админ-панель", callback_data="admin_main"),
+        types.InlineKeyboardButton("🔙 Главное меню", callback_data="start"),
+    )
+    return "🔓 Админ-доступ получен!\n👨💼 Добро пожаловать в панель управления:", kb
+
+def chat_id_text(uid: int) -> str:
+    return (
+        "🆔 Ваш Telegram chat_id:\n\n"
+        f"{uid}\n\n"
+        "📋 Передайте этот ID администратору для добавления в систему.\n"
+        "💡 Чтобы скопировать ID, нажмите на него."
+    )
+
+# Отчёты админ-панели строятся по счётчикам COURSEWORK_STORE (без обхода курсовых)
+def pending_text(counts: Dict[str, int], names: Dict[str, str]) -> str:
+    lines = ["⏳ Курсовые в ожидании проверки:\n"]
+    for tid, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])):
+        lines.append(f"👨🏫 {names.get(tid, f'ID: {tid}')}: {n}")
+    if not counts:
+        lines.append("Нет курсовых на проверке")
+    lines.append(f"\n📊 Всего на проверке: {sum(counts.values())}")
+    return "\n".join(lines)
+
+STATUS_ORDER = (STATUS_NEW, STATUS_REVIEWING, STATUS_CHECKED, STATUS_REJECTED)
+
+def stats_text(statuses: Dict[str, int], grades: Dict[str, int]) -> str:
+    lines = ["📊 Курсовые по статусам:\n"]
+    order = [s for s in STATUS_ORDER if s in statuses] + sorted(s for s in statuses if s not in STATUS_ORDER)
+    for status in order:
+        lines.append(f"🔸 {status or 'без статуса'}: {statuses[status]}")
+    lines.append(f"Всего: {sum(statuses.values())}")
+    lines.append("\n⭐ Оценки:\n")
+    graded = 0
+    weighted = 0.0
+    for grade in sorted(grades, key=lambda g: (not g.isdigit(), g)):
+        lines.append(f"⭐ {grade}: {grades[grade]}")
+        if grade.isdigit():
+            graded += grades[grade]
+            weighted += int(grade) * grades[grade]
+    if graded:
+        lines.append(f"\nСредняя оценка: {weighted / graded:.2f}")
+    elif not grades:
+        lines.append("Оценок пока нет")
+    return "\n".join(lines)
+
+# Данные из последнего удачного ответа API (бэкенд недоступен)
+def stale_note(data: Any) -> str:
+    return "\n⚠️ API недоступно, показаны последние полученные данные" if is_stale(data) else ""
+
+def search_teachers(teachers: List[Dict[str, Any]], q: str) -> List[Dict[str, Any]]:
+    found: List[Dict[str, Any]] = []
+    for t in teachers:
+        tid = str(t.get("id", ""))
+        name = (t.get("name") or "").lower()
+        if q == tid or q in name:
+            found.append(t)
+    return found
+
+def search_results_kb(found: List[Dict[str, Any]]) -> types.InlineKeyboardMarkup:
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    for t in found[:50]:
+        tid = t.get("id")
+        name = t.get("name", f"ID: {tid}")
+        kb.add(types.InlineKeyboardButton(f"👨🏫 {name}", callback_data=f"view_{tid}"))
+    return kb
+
+# Кнопки листания страницы: курсор — id первой/последней курсовой на экране
+def _page_nav(kb: types.InlineKeyboardMarkup, base: str, rows: List[Dict[str, Any]], skipped: int, total: int) -> None:
+    nav = []
+    if skipped > 0:
+        nav.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"{base}_prev_{rows[0].get('id')}"))
+    if skipped + len(rows) < total:
+        nav.append(types.InlineKeyboardButton("Вперёд ▶️", callback_data=f"{base}_next_{rows[-1].get('id')}"))
+    if nav:
+        kb.row(*nav)
+
+def _page_range(rows: List[Dict[str, Any]], skipped: int, total: int) -> str:
+    if len(rows) >= total:
+        return ""
+    return f" (показаны {skipped + 1}–{skipped + len(rows)})"
+
+def teacher_courseworks_view(tid: str, teacher: Optional[Dict[str, Any]], cws: List[Dict[str, Any]],
+                             students: Dict[str, Optional[Dict[str, Any]]], skipped: int = 0,
+                             total: Optional[int] = None) -> View:
+    name = teacher.get("name", f"ID: {tid}") if teacher else f"ID: {tid}"
+    total = len(cws) if total is None else total
+    if not cws:
+        return f"👨🏫 {name}\n\n📋 Курсовых работ не найдено", back_kb("admin_main")
+    kb = types.InlineKeyboardMarkup()
+    lines = [f"👨🏫 {name}\n\n📊 Всего курсовых: {total}{_page_range(cws, skipped, total)}\n"]
+    for i, cw in enumerate(cws, skipped + 1):
+        sid = cw.get("student_id")
+        student = students.get(str(sid)) if sid else None
+        sname = student.get("name", f"ID:{sid}") if student else "Неизвестен"
+        status = cw.get("status", "?")
+        grade = cw.get("grade")
+        line = f"{i}. {cw.get('title','')} — {sname} — {status}"
+        if grade:
+            line += f" (⭐{grade})"
+        lines.append(line)
+    _page_nav(kb, f"view_{tid}", cws, skipped, total)
+    add_back_button(kb, "admin_main")
+    return "\n".join(lines) + "\n", kb
+
+def teacher_main_menu() -> types.InlineKeyboardMarkup:
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(
+        types.InlineKeyboardButton("👥 Мои ученики", callback_data="my_students"),
+        types.InlineKeyboardButton("✍️ Ручная проверка", callback_data="manual_review_list"),
+        types.InlineKeyboardButton("🔙 Главное меню", callback_data="start"),
+    )
+    return kb
+
+def teacher_main_text(teacher: Dict[str, Any]) -> str:
+    return f"👨🏫 Преподаватель: {teacher.get('name')}\n\nВыберите действие:"
+
+def my_students_text(teacher: Optional[Dict[str, Any]]) -> str:
+    students = teacher.get("students", []) if teacher else []
+    if not students:
+        return "👥 Ваши ученики не найдены."
+    return "👥 Ваши ученики:\n\n" + "\n".join(f"• {s.get('name')} (ID: {s.get('id')})" for s in students)
+
+def manual_review_view(to_review: List[Dict[str, Any]], skipped: int = 0, total: Optional[int] = None) -> View:
+    if not to_review:
+        return "✍️ Курсовых для ручной проверки не найдено.", back_kb("teacher_main")
+    total = len(to_review) if total is None else total
+    text = (
+        f"✍️ Курсовые для ручной проверки: {total}{_page_range(to_review, skipped, total)}\n\n"
+        + "\n".join(f"• {cw.get('title')} (ID: {cw.get('id')})" for cw in to_review)
+    )
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    for cw in to_review:
+        kb.add(types.InlineKeyboardButton(f"{cw.get('title')}", callback_data=f"t_manual_{cw.get('id')}"))
+    _page_nav(kb, "manual_review_list", to_review, skipped, total)
+    add_back_button(kb, "teacher_main")
+    return text, kb
+
+def manual_card_view(cw_id: str, cw: Dict[str, Any], student: Optional[Dict[str, Any]]) -> View:
+    text = (
+        "✍️ Ручная проверка:\n\n"
+        f"📋 Название: {cw.get('title')}\n"
+        f"👤 Студент: {student.get('name') if student else 'Неизвестен'}\n"
+        f"🆔 ID: {cw_id}\n\n"
+        "Выберите действие:"
+    )
+    kb = types.InlineKeyboardMarkup(row_width=2)
+    kb.add(
+        types.InlineKeyboardButton("✅ Принять (На проверке)", callback_data=f"status_reviewing_{cw_id}"),
+        types.InlineKeyboardButton("❌ Отклонить", callback_data=f"set_reject_{cw_id}"),
+    )
+    kb.add(types.InlineKeyboardButton("🔙 Назад", callback_data="manual_review_list"))
+    return text, kb
+
+def coursework_card_text(cw: Dict[str, Any], student: Optional[Dict[str, Any]]) -> str:
+    sname = student.get("name") if student else "Неизвестен"
+    return (
+        "📚 Курсовая работа\n"
+        f"📋 Название: {cw.get('title', 'Без названия')}\n"
+        f"👤 Студент: {sname}\n"
+        f"🆔 ID: {cw.get('id')}\n"
+        f"📊 Статус: {cw.get('status', STATUS_NEW)}"
+    )